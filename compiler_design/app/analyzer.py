@@ -1,143 +1,217 @@
 import ast
 import re
-import astor
+from context import AnalysisContext
+from lexer import IDENT, lex, matches, significant
 
 def detect_syntax_errors(code, language):
-    if not code.strip():
+    return detect_syntax_errors_ctx(AnalysisContext(code, language))
+
+def detect_syntax_errors_ctx(ctx):
+    if ctx.is_empty():
         return 'Please enter some code.'
 
+    language = ctx.language
     if language == 'Python':
-        try:
-            ast.parse(code)
-            return 'No syntax errors detected.'
-        except SyntaxError as e:
-            return f'Syntax Error: {str(e)}'
+        if ctx.syntax_error is not None:
+            return f'Syntax Error: {str(ctx.syntax_error)}'
+        return 'No syntax errors detected.'
     
     elif language in ['C++', 'Java']:
-        errors = []
-        
-        # Check for missing semicolons only in appropriate lines
-        lines = code.split('\n')
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            # Skip empty lines, preprocessor directives, and control structures
-            if (not line or 
-                line.startswith('#') or 
-                line.endswith('{') or 
-                line.endswith('}') or
-                line.startswith('if') or
-                line.startswith('while') or
-                line.startswith('for') or
-                line.startswith('else') or
-                line.startswith('class') or
-                line.startswith('struct') or
-                line.startswith('namespace') or
-                line.startswith('public:') or
-                line.startswith('private:') or
-                line.startswith('protected:') or
-                line.startswith('//') or
-                line.startswith('/*') or
-                line.startswith('using') or
-                'return' in line or
-                line.endswith(';') or  # Already has semicolon
-                line.endswith(':') or  # Class/struct/namespace declaration
-                line.endswith(')') or  # Function declaration
-                line.endswith('{')):   # Block start
-                continue
-                
-            # Check for missing semicolon in statements
-            if (line and 
-                not line.endswith(';') and 
-                not line.endswith('{') and 
-                not line.endswith('}') and
-                not line.startswith('//') and
-                not line.startswith('/*') and
-                not line.endswith(':') and
-                not line.endswith(')') and
-                not line.endswith('{')):
-                errors.append(f'Line {i}: Missing semicolon')
-        
-        # Check for unmatched braces
-        if code.count('{') != code.count('}'):
-            errors.append('Unmatched braces detected')
-        
-        # Check for common syntax errors
-        if language == 'C++':
-            if 'cout' in code and '#include <iostream>' not in code and '#include <bits/stdc++.h>' not in code:
-                errors.append('Missing iostream include')
-            # Check for unterminated string literals
-            if code.count('"') % 2 != 0:
-                errors.append('Unterminated string literal detected')
-            # Check for missing return type in function declarations
-            if re.search(r'\b(?:void|int|double|float|char|bool|string|vector|map|set|list|deque|queue|stack|priority_queue)\s+\w+\s*\([^)]*\)\s*\{', code):
-                pass  # Valid function declaration
-            elif re.search(r'\b\w+\s*\([^)]*\)\s*\{', code):
-                errors.append('Missing return type in function declaration')
-        elif language == 'Java':
-            if 'System.out.println' in code and 'public class' not in code:
-                errors.append('Missing class declaration')
-        
+        errors = check_cpp_java_syntax(ctx.lexed, language)
         return '\n'.join(errors) if errors else 'No syntax errors detected.'
     
     return 'Unsupported language'
 
+SEMICOLON_EXEMPT_STARTS = ('if', 'while', 'for', 'else', 'class', 'struct', 'namespace', 'using', '@')
+STATEMENT_ENDINGS = (';', '{', '}', ':', ')')
+IOSTREAM_INCLUDE = re.compile(r'#\s*include\s*<(?:iostream|bits/stdc\+\+\.h)>')
+# Longest token pattern a syntax or logic rule matches
+TOKEN_WINDOW = 6
+
+def check_cpp_java_syntax(lexed, language):
+    return format_cpp_java_syntax(cpp_java_syntax_facts(lexed, language), language)
+
+def cpp_java_syntax_facts(lexed, language):
+    # Line numbers of line-level problems and flags for file-level ones.
+    # Facts of separately lexed parts of a file combine by shifting the
+    # lines and or-ing the flags (see incremental.py).
+    facts = {'semicolons': [], 'unbalanced': lexed.unbalanced_braces, 'return_types': []}
+
+    # Check for missing semicolons only in appropriate lines
+    for line_tokens in lexed.lines:
+        line = missing_semicolon(line_tokens)
+        if line is not None:
+            facts['semicolons'].append(line)
+
+    facts.update(syntax_token_facts(lexed.tokens, language))
+    if language == 'C++':
+        # Function declarations without a return type
+        facts['return_types'] = [block.line for block in lexed.functions() if missing_return_type(block)]
+    return facts
+
+def missing_semicolon(line_tokens):
+    # Line number of a line that looks like an unterminated statement
+    code_tokens = significant(line_tokens)
+    # Skip empty and comment-only lines, preprocessor directives,
+    # control structures and lines that already end a statement or block
+    if (not code_tokens or
+        code_tokens[0].kind == 'preprocessor' or
+        code_tokens[0].text in SEMICOLON_EXEMPT_STARTS or
+        code_tokens[-1].text in STATEMENT_ENDINGS or
+        any(t.text == 'return' for t in code_tokens)):
+        return None
+    return code_tokens[0].line
+
+def missing_return_type(block):
+    return block.parent.kind in ('root', 'namespace') and len(block.header) > 1 and block.header[1].text == '('
+
+def syntax_token_facts(tokens, language):
+    # File-level flags from the significant tokens. Every flag is an any()
+    # over patterns of at most TOKEN_WINDOW tokens, so the flags of a token
+    # stream are those of overlapping windows or-ed together.
+    if language == 'C++':
+        return {
+            'uses_cout': any(t.text == 'cout' for t in tokens),
+            'has_iostream': any(t.kind == 'preprocessor' and IOSTREAM_INCLUDE.match(t.text) for t in tokens),
+            'unterminated': any(t.kind == 'unterminated' for t in tokens),
+        }
+    if language == 'Java':
+        return {
+            'prints': any(t.text == 'System' and matches(tokens, i, ('System', '.', 'out', '.', 'println'))
+                          for i, t in enumerate(tokens)),
+            'has_class': any(t.text == 'public' and matches(tokens, i, ('public', 'class'))
+                             for i, t in enumerate(tokens)),
+        }
+    return {}
+
+def format_cpp_java_syntax(facts, language):
+    errors = [f'Line {line}: Missing semicolon' for line in facts['semicolons']]
+
+    # Check for unmatched braces
+    if facts['unbalanced']:
+        errors.append('Unmatched braces detected')
+
+    # Check for common syntax errors
+    if language == 'C++':
+        if facts['uses_cout'] and not facts['has_iostream']:
+            errors.append('Missing iostream include')
+        # Check for unterminated string literals
+        if facts['unterminated']:
+            errors.append('Unterminated string literal detected')
+        # Check for missing return type in function declarations
+        errors.extend(f'Line {line}: Missing return type in function declaration'
+                      for line in facts['return_types'])
+    elif language == 'Java':
+        if facts['prints'] and not facts['has_class']:
+            errors.append('Missing class declaration')
+
+    return errors
+
 # ---------------- Logical Error Detection ----------------
 def detect_logical_errors(code, language):
-    if not code.strip():
+    return detect_logical_errors_ctx(AnalysisContext(code, language))
+
+def detect_logical_errors_ctx(ctx):
+    if ctx.is_empty():
         return 'Please enter some code.'
 
     errors = []
     
-    if language == 'Python':
-        try:
-            tree = ast.parse(code)
-            errors.extend(check_python_logic(tree))
-        except SyntaxError:
+    if ctx.language == 'Python':
+        if ctx.syntax_error is not None:
             return 'Unable to analyze due to syntax errors'
+        errors.extend(check_python_logic_ctx(ctx))
     
-    elif language in ['C++', 'Java']:
-        errors.extend(check_cpp_java_logic(code, language))
+    elif ctx.language in ['C++', 'Java']:
+        errors.extend(check_cpp_java_logic_tokens(ctx.lexed.tokens, ctx.language))
     
     return '\n'.join(errors) if errors else 'No logical errors detected'
 
 def check_python_logic(tree):
-    errors = []
-    
-    for node in ast.walk(tree):
+    return check_python_logic_ctx(AnalysisContext.from_tree(tree))
+
+def check_python_logic_ctx(ctx):
+    return combine_python_logic([python_logic_facts(ctx)])
+
+def python_logic_facts(ctx):
+    # Findings in ast.walk order as (depth, message, name). Unused-variable
+    # findings for module-level bindings keep the name: whether it is read
+    # is only known once the reads of the whole file are in, so they are
+    # settled in combine_python_logic together with the module reads.
+    findings = []
+    symbols = ctx.symbols
+
+    for node in ctx.nodes(ast.While, ast.Assign, ast.BinOp):
+        depth = ctx.depth(node)
         # Check for infinite loops
         if isinstance(node, ast.While):
             if isinstance(node.test, ast.Constant) and node.test.value is True:
-                errors.append('Infinite loop detected: while True')
+                findings.append((depth, 'Infinite loop detected: while True', None))
         
         # Check for unused variables
         if isinstance(node, ast.Assign):
             for target in node.targets:
                 if isinstance(target, ast.Name):
-                    # Check if variable is used later
-                    if not is_variable_used(tree, target.id):
-                        errors.append(f'Unused variable: {target.id}')
+                    # Check if this binding is ever read in its scope
+                    if symbols.binding_scope(target) is symbols.module:
+                        findings.append((depth, f'Unused variable: {target.id}', target.id))
+                    elif not symbols.is_read(target):
+                        findings.append((depth, f'Unused variable: {target.id}', None))
         
         # Check for potential division by zero
         if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div):
             if isinstance(node.right, ast.Num) and node.right.n == 0:
-                errors.append('Potential division by zero')
+                findings.append((depth, 'Potential division by zero', None))
     
-    return errors
+    return findings, symbols.module.reads
+
+def combine_python_logic(parts):
+    # parts: (findings, module reads) of the top-level units of one file, in
+    # source order. Sorting by depth first restores ast.walk order.
+    reads = set().union(*(part_reads for _, part_reads in parts))
+    ordered = sorted(
+        (depth, unit, seq, message, name)
+        for unit, (findings, _) in enumerate(parts)
+        for seq, (depth, message, name) in enumerate(findings)
+    )
+    return [message for _, _, _, message, name in ordered if name is None or name not in reads]
 
 def check_cpp_java_logic(code, language):
+    return check_cpp_java_logic_tokens(lex(code, language).tokens, language)
+
+def check_cpp_java_logic_tokens(tokens, language):
+    return format_cpp_java_logic(cpp_java_logic_facts(tokens), language)
+
+def cpp_java_logic_facts(tokens):
+    facts = dict.fromkeys(('infinite_loop', 'calls_method', 'null_checked', 'declared_bare', 'declared_init'), False)
+
+    for i, token in enumerate(tokens):
+        text = token.text
+        # Check for infinite loops
+        if text == 'while':
+            facts['infinite_loop'] = facts['infinite_loop'] or matches(tokens, i, ('while', '(', 'true', ')'))
+        # Method calls through '.' and explicit null checks
+        elif text == '.':
+            facts['calls_method'] = facts['calls_method'] or matches(tokens, i, ('.', IDENT, '('))
+        elif text == 'if':
+            facts['null_checked'] = facts['null_checked'] or matches(tokens, i, ('if', '(', IDENT, '!=', 'null', ')'))
+        # Declarations with and without an initializer
+        elif text == 'int':
+            facts['declared_bare'] = facts['declared_bare'] or matches(tokens, i, ('int', IDENT, ';'))
+            facts['declared_init'] = facts['declared_init'] or matches(tokens, i, ('int', IDENT, '='))
+    return facts
+
+def format_cpp_java_logic(facts, language):
     errors = []
-    
-    # Check for infinite loops
-    if re.search(r'while\s*\(\s*true\s*\)', code):
+    if facts['infinite_loop']:
         errors.append('Infinite loop detected: while(true)')
     
     # Check for potential null pointer dereference
-    if language == 'Java':
-        if re.search(r'\.\s*\w+\s*\([^)]*\)', code) and not re.search(r'if\s*\(\s*\w+\s*!=\s*null\s*\)', code):
-            errors.append('Potential null pointer dereference')
+    if language == 'Java' and facts['calls_method'] and not facts['null_checked']:
+        errors.append('Potential null pointer dereference')
     
     # Check for uninitialized variables
-    if re.search(r'int\s+\w+\s*;', code) and not re.search(r'int\s+\w+\s*=', code):
+    if facts['declared_bare'] and not facts['declared_init']:
         errors.append('Potential uninitialized variable')
     
     return errors
@@ -149,6 +223,8 @@ def is_variable_used(tree, var_name):
     return False
 
 # ---------------- Code Validation ----------------
+LETTER = re.compile(r'[a-zA-Z]')
+
 def is_valid_code(code):
     # Check if the input is numeric or empty
-    return bool(re.search(r'[a-zA-Z]', code))
\ No newline at end of file
+    return LETTER.search(code) is not None
\ No newline at end of file
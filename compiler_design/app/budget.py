@@ -0,0 +1,294 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from cache import cache_key
+from context import AnalysisContext
+from pipeline import ANALYZER_VERSION, STAGES, PipelineTimeout, empty_results, run_stage, time_limit
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ---------------- Execution Budgets ----------------
+# Time and memory limits per pipeline stage. A stage that runs out of its
+# budget is abandoned, the fields it did not get to are marked "Budget
+# exceeded", and the stages after it still run. Within a process the limits
+# rely on SIGALRM and RLIMIT_AS, which cannot stop a long call into C (a
+# regex match, parsing pathological input) and do not survive a native
+# stack overflow. BudgetedAnalysis therefore runs the stages in a worker
+# subprocess, which is killed when a stage overruns or the caller cancels.
+
+EXCEEDED = 'budget exceeded'
+DEFAULT_SECONDS = 10.0
+DEFAULT_MEMORY_MB = 1024
+
+# What each stage fills in, and what is left when it does not finish
+STAGE_FIELDS = {
+    'syntax': ('syntax',),
+    'logic': ('logic',),
+    'complexity': ('time_complexity', 'space_complexity', 'functions'),
+    'optimize': ('optimized_code', 'optimization_passes', 'complexity_changes'),
+}
+
+class BudgetExceeded(PipelineTimeout):
+    pass
+
+class Budget:
+    def __init__(self, seconds=DEFAULT_SECONDS, memory_mb=DEFAULT_MEMORY_MB, stages=None):
+        # seconds and memory_mb apply to every stage, stages overrides them
+        # for some: {'optimize': {'seconds': 30}}. None means no limit.
+        self.seconds = _limit(seconds, 'seconds')
+        self.memory_mb = _limit(memory_mb, 'memory_mb')
+        self.stages = {}
+        for name, limits in (stages or {}).items():
+            if name not in STAGES:
+                raise ValueError(f'Unknown stage {name!r}, expected one of {", ".join(STAGES)}')
+            if not isinstance(limits, dict) or set(limits) - {'seconds', 'memory_mb'}:
+                raise ValueError(f'Limits of stage {name!r} must be an object with seconds and/or memory_mb')
+            self.stages[name] = {key: _limit(value, key) for key, value in limits.items()}
+
+    def limits(self, name):
+        # (seconds, memory_mb) for one stage
+        override = self.stages.get(name, {})
+        return override.get('seconds', self.seconds), override.get('memory_mb', self.memory_mb)
+
+    def as_dict(self):
+        return {'seconds': self.seconds, 'memory_mb': self.memory_mb, 'stages': self.stages}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict) or set(data) - {'seconds', 'memory_mb', 'stages'}:
+            raise ValueError('A budget is an object with seconds, memory_mb and/or stages')
+        return cls(data.get('seconds', DEFAULT_SECONDS), data.get('memory_mb', DEFAULT_MEMORY_MB),
+                   data.get('stages'))
+
+def _limit(value, name):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError(f'{name} must be a positive number or null')
+    return value
+
+# ---- Limits within a process ----
+@contextmanager
+def memory_limit(megabytes):
+    # Lowers RLIMIT_AS to what the process maps already plus the allowance,
+    # so allocations past it raise MemoryError. The limit is per process, so
+    # it is only set when no other thread is running; finding the current
+    # size needs /proc (Linux).
+    if (not megabytes or resource is None or threading.active_count() > 1 or
+            not os.path.exists('/proc/self/statm')):
+        yield
+        return
+    with open('/proc/self/statm') as f:
+        mapped = int(f.read().split()[0]) * resource.getpagesize()
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = mapped + int(megabytes * 1024 * 1024)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    if soft != resource.RLIM_INFINITY and soft <= limit:
+        yield
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+@contextmanager
+def stage_budget(name, seconds, memory_mb):
+    # Every way a stage can run out of resources becomes BudgetExceeded
+    try:
+        with time_limit(seconds, BudgetExceeded, f'the {name} stage ran over {seconds}s'):
+            with memory_limit(memory_mb):
+                yield
+    except MemoryError:
+        raise BudgetExceeded(f'the {name} stage ran over {memory_mb} MB')
+    except RecursionError:
+        raise BudgetExceeded(f'the {name} stage ran over the recursion limit')
+
+def mark_stage(results, name, note, code):
+    # Fills what a stage left empty. The optimizer's stand-in is the
+    # unchanged source, so there is always code to show and download.
+    for field in STAGE_FIELDS[name]:
+        if field == 'optimized_code' and results[field] is None:
+            results[field] = code
+        elif field in ('time_complexity', 'space_complexity', 'syntax', 'logic') and results[field] is None:
+            results[field] = note
+
+def budget_report(budget, records, cancelled=False):
+    return {
+        'limits': budget.as_dict(),
+        'exceeded': [r['stage'] for r in records if r['status'] == EXCEEDED],
+        'cancelled': cancelled,
+        'stages': records,
+    }
+
+def run_budgeted(code, language, budget=None, stages=STAGES, emit=None):
+    # run_pipeline's results under a budget, plus a 'budget' report. emit,
+    # when given, sees a 'start' event before every stage and an 'end' event
+    # with the stage's record and fields after it.
+    budget = budget or Budget()
+    ctx = AnalysisContext(code, language)
+    results = empty_results()
+    records = []
+    for name in stages:
+        seconds, memory_mb = budget.limits(name)
+        if emit:
+            emit({'event': 'start', 'stage': name})
+        record = {'stage': name, 'status': 'ok', 'reason': None}
+        start = time.perf_counter()
+        try:
+            with stage_budget(name, seconds, memory_mb):
+                run_stage(name, ctx, results)
+        except BudgetExceeded as e:
+            record.update(status=EXCEEDED, reason=str(e))
+            mark_stage(results, name, f'Budget exceeded: {e}', code)
+            # Whatever the stage was building may be half done
+            ctx = AnalysisContext(code, language)
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        records.append(record)
+        if emit:
+            emit({'event': 'end', 'record': record,
+                  'fields': {field: results[field] for field in STAGE_FIELDS[name]}})
+    results['budget'] = budget_report(budget, records)
+    return results
+
+def is_complete(results):
+    report = results.get('budget')
+    return report is None or not (report['exceeded'] or report['cancelled'])
+
+def run_cached_budgeted(cache, code, language, compute):
+    # Like run_cached_pipeline, but a partial result is not cached: it says
+    # more about the budget than about the code
+    if cache is None:
+        return compute(code, language)
+    key = cache_key(code, language, ANALYZER_VERSION)
+    results = cache.get(key)
+    if results is None:
+        results = compute(code, language)
+        if is_complete(results):
+            cache.put(key, {field: value for field, value in results.items() if field != 'budget'})
+    return results
+
+# ---- Worker subprocess ----
+class BudgetedAnalysis:
+    # run_budgeted in a worker subprocess; the stage results stream back as
+    # each stage ends. The worker is killed when a stage runs past its time
+    # limit plus grace (stuck where the alarm cannot reach it) or when
+    # cancel() is called from any thread, and the result keeps what the
+    # finished stages produced.
+    POLL = 0.1
+
+    def __init__(self, code, language, budget=None, grace=2.0):
+        self.code = code
+        self.language = language
+        self.budget = budget or Budget()
+        self.grace = grace
+        self._cancelled = threading.Event()
+        self._events = queue.Queue()
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        threading.Thread(target=self._feed, daemon=True).start()
+
+    def _feed(self):
+        payload = json.dumps({'code': self.code, 'language': self.language, 'budget': self.budget.as_dict()})
+        try:
+            with self._process.stdin:
+                self._process.stdin.write(payload)
+        except OSError:
+            # The worker is gone already; reading its output tells how
+            pass
+        for line in self._process.stdout:
+            self._events.put(json.loads(line))
+        self._events.put(None)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def result(self, progress=None):
+        # progress(stage, seconds) is called while a stage runs, every POLL
+        # seconds; the UI uses it to show where the analysis is (and to get
+        # a chance to be stopped itself)
+        results = empty_results()
+        records = []
+        pending = list(STAGES)
+        current = started = None
+        reason = None
+        try:
+            while pending:
+                if self._cancelled.is_set():
+                    reason = 'cancelled'
+                    break
+                if current is not None:
+                    elapsed = time.monotonic() - started
+                    seconds = self.budget.limits(current)[0]
+                    if seconds and elapsed > seconds + self.grace:
+                        reason = f'the {current} stage did not stop within {seconds + self.grace}s'
+                        break
+                    if progress:
+                        progress(current, elapsed)
+                try:
+                    event = self._events.get(timeout=self.POLL)
+                except queue.Empty:
+                    continue
+                if event is None:
+                    self._process.wait()
+                    reason = f'the worker process died (exit status {self._process.returncode})'
+                    break
+                if event['event'] == 'error':
+                    raise RuntimeError(event['error'])
+                if event['event'] == 'start':
+                    current, started = event['stage'], time.monotonic()
+                else:
+                    results.update(event['fields'])
+                    records.append(event['record'])
+                    pending.remove(event['record']['stage'])
+                    current = None
+        finally:
+            self._process.kill()
+            self._process.wait()
+
+        cancelled = reason == 'cancelled'
+        for name in pending:
+            if cancelled:
+                record = {'stage': name, 'status': 'cancelled', 'reason': 'cancelled', 'seconds': None}
+                mark_stage(results, name, 'Cancelled', self.code)
+            elif name == current:
+                record = {'stage': name, 'status': EXCEEDED, 'reason': reason,
+                          'seconds': round(time.monotonic() - started, 4)}
+                mark_stage(results, name, f'Budget exceeded: {reason}', self.code)
+            else:
+                record = {'stage': name, 'status': 'skipped', 'reason': reason, 'seconds': None}
+                mark_stage(results, name, f'Not analyzed: {reason}', self.code)
+            records.append(record)
+        results['budget'] = budget_report(self.budget, records, cancelled)
+        return results
+
+def run_in_worker(code, language, budget=None, grace=2.0, progress=None):
+    # Same arguments and results as run_budgeted, so it can be handed to
+    # run_cached_budgeted as the compute function
+    return BudgetedAnalysis(code, language, budget, grace).result(progress)
+
+def worker_main():
+    payload = json.loads(sys.stdin.read())
+
+    def emit(event):
+        sys.stdout.write(json.dumps(event) + '\n')
+        sys.stdout.flush()
+
+    try:
+        run_budgeted(payload['code'], payload['language'], Budget.from_dict(payload['budget']), emit=emit)
+    except Exception as e:
+        emit({'event': 'error', 'error': f'{type(e).__name__}: {e}'})
+
+if __name__ == '__main__':
+    worker_main()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------- Result Cache ----------------
+# Results are addressed by (source hash, language, analyzer version). An
+# in-memory LRU sits in front of an optional SQLite file, which survives
+# restarts and is trimmed by total size, least recently used first. Both
+# tiers keep results as JSON, so every caller gets a copy of its own.
+
+def cache_key(code, language, version):
+    digest = hashlib.sha256(code.encode('utf-8')).hexdigest()
+    return f'{digest}:{language}:{version}'
+
+class ResultCache:
+    # shared: the memory tier hands out the stored objects themselves, which
+    # then need not be JSON. Only for callers that never change them.
+    def __init__(self, max_entries=256, path=None, max_bytes=64 * 1024 * 1024, shared=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # Streamlit serves every session from its own thread
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'size INTEGER NOT NULL, accessed REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            # Running total of the sizes, kept by triggers so that every
+            # process sharing the file sees it without summing the table
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS totals ('
+                'id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)'
+            )
+            self._db.execute('INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM results')
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS results_inserted AFTER INSERT ON results BEGIN '
+                'UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END'
+            )
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS results_updated AFTER UPDATE OF size ON results BEGIN '
+                'UPDATE totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END'
+            )
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS results_deleted AFTER DELETE ON results BEGIN '
+                'UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END'
+            )
+            self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                stored = self._memory[key]
+                return stored if self.shared else json.loads(stored)
+            data = self._disk_get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value = json.loads(data)
+            self._memory_put(key, value if self.shared else data)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            data = None if self.shared and self._db is None else json.dumps(value)
+            self._memory_put(key, value if self.shared else data)
+            self._disk_put(key, data)
+
+    def get_or_compute(self, code, language, version, compute):
+        key = cache_key(code, language, version)
+        value = self.get(key)
+        if value is None:
+            value = compute(code, language)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._db.commit()
+
+    # ---- Memory tier ----
+    def _memory_put(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ---- Disk tier ----
+    def _disk_get(self, key):
+        if self._db is None:
+            return None
+        row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._db.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        self._db.commit()
+        return row[0]
+
+    def _disk_put(self, key, data):
+        if self._db is None:
+            return
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete
+        # would not fire the trigger that keeps the total
+        self._db.execute(
+            'INSERT INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+            'accessed = excluded.accessed',
+            (key, data, len(data), time.time())
+        )
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute('SELECT bytes FROM totals WHERE id = 0').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._db.execute('SELECT key, size FROM results ORDER BY accessed'):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany('DELETE FROM results WHERE key = ?', stale)
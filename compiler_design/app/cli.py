@@ -0,0 +1,214 @@
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from budget import Budget, run_budgeted, run_cached_budgeted
+from cache import ResultCache
+from pipeline import PipelineTimeout, run_cached_pipeline, time_limit
+from streaming import analyze_stream
+
+# ---------------- Batch Command Line ----------------
+# python app/cli.py [options] PATH...
+# Walks files or directories (or the files tracked by git), analyzes every
+# supported source file in a process pool and prints one JSON object per
+# file as soon as it is done.
+
+EXTENSIONS = {
+    '.py': 'Python',
+    '.cpp': 'C++', '.cc': 'C++', '.cxx': 'C++', '.c++': 'C++',
+    '.hpp': 'C++', '.hh': 'C++', '.hxx': 'C++', '.h': 'C++',
+    '.java': 'Java',
+}
+SKIP_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv', '.tox', '.nox'}
+
+CLEAN_SYNTAX = 'No syntax errors detected.'
+CLEAN_LOGIC = 'No logical errors detected'
+
+class SourceListError(Exception):
+    pass
+
+def language_for(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+def iter_source_files(paths, use_git=False):
+    for root in paths:
+        if os.path.isfile(root):
+            if language_for(root):
+                yield root
+        elif use_git:
+            try:
+                listing = subprocess.run(
+                    ['git', '-C', root, 'ls-files', '-z'],
+                    check=True, capture_output=True
+                ).stdout.decode('utf-8', 'replace')
+            except FileNotFoundError:
+                raise SourceListError('--git needs the git command, which was not found')
+            except subprocess.CalledProcessError as e:
+                lines = e.stderr.decode('utf-8', 'replace').strip().splitlines()
+                raise SourceListError(f"git ls-files failed in {root}: {lines[-1] if lines else e}")
+            for name in listing.split('\0'):
+                if name and language_for(name):
+                    yield os.path.join(root, name)
+        else:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+                for name in sorted(filenames):
+                    if language_for(name):
+                        yield os.path.join(dirpath, name)
+
+# ---- Worker side ----
+_worker_cache = None
+
+def _init_worker(cache_path):
+    global _worker_cache
+    if cache_path:
+        _worker_cache = ResultCache(path=cache_path)
+
+def analyze_file(path, timeout, include_optimized, stream_above=None, budget=None):
+    language = language_for(path)
+    record = {'path': path, 'language': language}
+    start = time.perf_counter()
+    try:
+        if stream_above is not None and language in ('C++', 'Java') and os.path.getsize(path) > stream_above:
+            # Read and analyzed line by line; no complexity in this mode
+            out = io.StringIO() if include_optimized else None
+            with time_limit(timeout):
+                results = analyze_stream(path, language, out)
+            record.update(status='ok', mode='stream', **results)
+            if out is not None:
+                record['optimized_code'] = out.getvalue()
+        else:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                code = f.read()
+            with time_limit(timeout):
+                if budget is not None:
+                    # Stages that run out of their budget are reported, not fatal
+                    results = run_cached_budgeted(_worker_cache, code, language,
+                                                  partial(run_budgeted, budget=budget))
+                else:
+                    results = run_cached_pipeline(_worker_cache, code, language)
+            record['status'] = 'ok'
+            record.update(results)
+            if not include_optimized:
+                record.pop('optimized_code', None)
+    except PipelineTimeout as e:
+        record['status'] = 'timeout'
+        record['error'] = str(e)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+# ---- Driver ----
+def is_failure(record, fail_on):
+    if record['status'] != 'ok':
+        return 'error' in fail_on
+    if 'budget' in fail_on and record.get('budget') and record['budget']['exceeded']:
+        return True
+    if 'syntax' in fail_on and record['syntax'] != CLEAN_SYNTAX:
+        return True
+    if 'logic' in fail_on and record['logic'] not in (CLEAN_LOGIC, 'Unable to analyze due to syntax errors'):
+        return True
+    return False
+
+def run_batch(paths, workers=None, timeout=30, use_git=False, cache_path=None,
+              include_optimized=False, stream_above=None, budget=None):
+    # Generator of result records in completion order. Only a bounded number
+    # of files is in flight, so memory stays flat on very large trees.
+    workers = workers or os.cpu_count() or 1
+    files = iter_source_files(paths, use_git)
+    max_in_flight = workers * 4
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_path,))
+
+    pool = new_pool()
+    pending = {}
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                path = next(files, None)
+                if path is None:
+                    exhausted = True
+                    break
+                future = pool.submit(analyze_file, path, timeout, include_optimized, stream_above, budget)
+                pending[future] = path
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. native stack overflow); report the
+                    # files that were in flight and carry on with a new pool
+                    yield {'path': path, 'language': language_for(path), 'status': 'error',
+                           'error': 'Worker process crashed'}
+                    for other, other_path in pending.items():
+                        # Some may have finished before the pool broke
+                        if other.done() and not other.cancelled() and other.exception() is None:
+                            yield other.result()
+                        else:
+                            yield {'path': other_path, 'language': language_for(other_path),
+                                   'status': 'error', 'error': 'Worker process crashed'}
+                    pending.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = new_pool()
+                    break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze source trees and stream JSON-lines results.')
+    parser.add_argument('paths', nargs='+', help='Files or directories to analyze')
+    parser.add_argument('--git', action='store_true', help='Only analyze files tracked by git')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-file time limit in seconds')
+    parser.add_argument('--cache', default=None, help='SQLite file for the shared result cache')
+    parser.add_argument('--include-optimized', action='store_true', help='Include optimized code in the output')
+    parser.add_argument('--stream-above', type=float, default=None, metavar='MB',
+                        help='Analyze C++/Java files larger than this line by line in bounded memory '
+                             '(syntax and logic only)')
+    parser.add_argument('--stage-timeout', type=float, default=None, metavar='SECONDS',
+                        help='Time limit per pipeline stage; a stage over it is reported as budget exceeded')
+    parser.add_argument('--stage-memory', type=float, default=None, metavar='MB',
+                        help='Memory limit per pipeline stage (Linux)')
+    parser.add_argument('--fail-on', default='', help='Comma separated: syntax, logic, error, budget')
+    parser.add_argument('-o', '--output', default=None, help='Write JSON lines here instead of stdout')
+    args = parser.parse_args(argv)
+
+    fail_on = {item.strip() for item in args.fail_on.split(',') if item.strip()}
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    total = failed = 0
+    try:
+        stream_above = args.stream_above * 1024 * 1024 if args.stream_above is not None else None
+        budget = None
+        if args.stage_timeout is not None or args.stage_memory is not None:
+            budget = Budget(args.stage_timeout, args.stage_memory)
+        for record in run_batch(args.paths, args.workers, args.timeout, args.git,
+                                args.cache, args.include_optimized, stream_above, budget):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            total += 1
+            if is_failure(record, fail_on):
+                failed += 1
+    except SourceListError as e:
+        parser.error(str(e))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f'{total} files analyzed, {failed} failed', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,143 +1,556 @@
 import ast
-import re
+from context import AnalysisContext
+from lexer import IDENT, NUMBER, lex, matches
+from recurrence import SLICE_CALLS, Recurrence, cpp_java_self_calls, loop_depths, python_self_calls, tail_call_form
 
 def analyze_time_complexity(code, language):
-    if not code.strip():
+    return analyze_time_complexity_ctx(AnalysisContext(code, language))
+
+def analyze_time_complexity_ctx(ctx):
+    if ctx.is_empty():
         return "No code provided"
     
-    if language == 'Python':
-        try:
-            tree = ast.parse(code)
-            return analyze_python_complexity(tree)
-        except SyntaxError:
+    if ctx.language == 'Python':
+        if ctx.syntax_error is not None:
             return "Unable to analyze due to syntax errors"
-    elif language in ['C++', 'Java']:
-        return analyze_cpp_java_complexity(code, language)
+        return complexity_report_ctx(ctx).time
+    elif ctx.language in ['C++', 'Java']:
+        return complexity_report_ctx(ctx).time
     else:
         return "Unsupported language"
 
 def analyze_space_complexity(code, language):
-    if not code.strip():
+    return analyze_space_complexity_ctx(AnalysisContext(code, language))
+
+def analyze_space_complexity_ctx(ctx):
+    if ctx.is_empty():
         return "No code provided"
     
-    if language == 'Python':
-        try:
-            tree = ast.parse(code)
-            return analyze_python_space_complexity(tree)
-        except SyntaxError:
+    if ctx.language == 'Python':
+        if ctx.syntax_error is not None:
             return "Unable to analyze due to syntax errors"
-    elif language in ['C++', 'Java']:
-        return analyze_cpp_java_space_complexity(code, language)
+        return complexity_report_ctx(ctx).space
+    elif ctx.language in ['C++', 'Java']:
+        return complexity_report_ctx(ctx).space
     else:
         return "Unsupported language"
 
 def analyze_python_complexity(tree):
-    # Check for binary search pattern
-    for node in ast.walk(tree):
-        if isinstance(node, ast.While):
-            if isinstance(node.test, ast.Compare):
-                if isinstance(node.test.left, ast.Name) and isinstance(node.test.comparators[0], ast.Name):
-                    # Check for mid calculation in the loop body
-                    for child in ast.walk(node):
-                        if isinstance(child, ast.Assign):
-                            if isinstance(child.targets[0], ast.Name) and child.targets[0].id == 'mid':
-                                return "O(log n) - Logarithmic (Binary Search)"
-    
-    # Check for nested loops
-    nested_loops = 0
-    for node in ast.walk(tree):
-        if isinstance(node, ast.For):
-            for child in ast.walk(node):
-                if isinstance(child, ast.For):
-                    nested_loops += 1
-    
-    if nested_loops > 0:
-        return f"O(n^{nested_loops + 1}) - Polynomial (Nested Loops)"
-    
-    # Check for single loop
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.For, ast.While)):
-            return "O(n) - Linear"
-    
-    # Check for recursion
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            for child in ast.walk(node):
-                if isinstance(child, ast.Call) and isinstance(child.func, ast.Name):
-                    if child.func.id == node.name:
-                        return "O(2^n) - Exponential (Recursive)"
-    
-    return "O(1) - Constant"
+    return analyze_python(tree).time
 
 def analyze_python_space_complexity(tree):
-    # Check for binary search pattern
-    for node in ast.walk(tree):
-        if isinstance(node, ast.While):
-            if isinstance(node.test, ast.Compare):
-                if isinstance(node.test.left, ast.Name) and isinstance(node.test.comparators[0], ast.Name):
-                    # Check for mid calculation in the loop body
-                    for child in ast.walk(node):
-                        if isinstance(child, ast.Assign):
-                            if isinstance(child.targets[0], ast.Name) and child.targets[0].id == 'mid':
-                                return "O(1) - Constant (Binary Search)"
-    
-    # Check for recursion
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            for child in ast.walk(node):
-                if isinstance(child, ast.Call) and isinstance(child.func, ast.Name):
-                    if child.func.id == node.name:
-                        return "O(n) - Linear (Recursive Stack)"
-    
-    # Check for list/dict operations
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.List, ast.Dict)):
-            return "O(n) - Linear (Data Structure)"
-    
-    return "O(1) - Constant"
+    return analyze_python(tree).space
+
+def analyze_python(tree):
+    visitor = ComplexityVisitor()
+    visitor.visit(tree)
+    return visitor.report()
+
+def complexity_report_ctx(ctx):
+    # Time and space come out of the same pass, so compute it once
+    if ctx.language == 'Python':
+        return ctx.cached('complexity', lambda ctx: analyze_python(ctx.tree))
+    return ctx.cached('complexity', lambda ctx: analyze_cpp_java(ctx.lexed))
+
+# ---------------- Python Complexity Visitor ----------------
+# Loop costs are (exponential base, polynomial degree, log power) tuples so
+# that nesting is addition and "worse" is plain tuple comparison. Recursive
+# functions get theirs from a recurrence (recurrence.py); one that cannot be
+# solved is taken to be exponential.
+CONSTANT = (0, 0, 0)
+LOGARITHMIC = (0, 0, 1)
+LINEAR = (0, 1, 0)
+EXPONENTIAL = (2, 0, 0)
+
+# Work of a builtin applied to one whole sequence, for the cost of a call
+BUILTIN_WORK = {
+    'sum': LINEAR, 'min': LINEAR, 'max': LINEAR, 'any': LINEAR, 'all': LINEAR,
+    'list': LINEAR, 'tuple': LINEAR, 'set': LINEAR, 'sorted': (0, 1, 1),
+}
+
+SPACE_RANKS = {
+    "O(1) - Constant": 0,
+    "O(1) - Constant (Binary Search)": 1,
+    "O(log n) - Logarithmic (Recursive Stack)": 2,
+    "O(n) - Linear (Data Structure)": 3,
+    "O(n) - Linear (Array/List)": 3,
+    "O(n) - Linear (Recursive Stack)": 4,
+    "O(n) - Linear (Memo Table)": 4,
+}
+
+def add_costs(a, b):
+    # Exponential bases multiply: 2^n inside 2^n is 4^n
+    exponential = a[0] * b[0] if a[0] and b[0] else a[0] + b[0]
+    return (exponential, a[1] + b[1], a[2] + b[2])
+
+def format_time_cost(cost, pattern=None):
+    # pattern: what the analysis saw produce a logarithmic bound (a binary
+    # search loop); other bounds are named by their shape alone
+    exponential, degree, logs = cost
+    if exponential:
+        return f"O({exponential:.4g}^n) - Exponential (Recursive)"
+    if degree == 0 and logs == 0:
+        return "O(1) - Constant"
+    if degree == 0:
+        if logs == 1:
+            return f"O(log n) - Logarithmic ({pattern})" if pattern else "O(log n) - Logarithmic"
+        return f"O(log^{logs} n) - Polylogarithmic"
+    n_part = "n" if degree == 1 else f"n^{degree:.3g}"
+    # Fractional degrees only come out of divide-and-conquer recurrences
+    kind = "Nested Loops" if degree == int(degree) else "Divide and Conquer"
+    if logs == 0:
+        if degree == 1:
+            return "O(n) - Linear"
+        return f"O({n_part}) - Polynomial ({kind})"
+    log_part = "log n" if logs == 1 else f"log^{logs} n"
+    if degree == 1 and logs == 1:
+        return "O(n log n) - Linearithmic"
+    return f"O({n_part} {log_part}) - Polynomial ({kind})"
+
+class FunctionComplexity:
+    def __init__(self, name, lineno, time_cost, space, recurrence=None, pattern=None):
+        # time_cost of a recursive function is the fallback until the report
+        # it ends up in solves its recurrence (see resolve)
+        self.name = name
+        self.lineno = lineno
+        self.base_cost = time_cost
+        self.time_cost = time_cost
+        self.base_pattern = pattern
+        self.pattern = pattern
+        self.time = format_time_cost(time_cost, pattern)
+        self.space = space
+        self.recurrence = recurrence
+        self.derivation = None
+
+    def resolve(self, helpers):
+        solved = self.recurrence.resolve(helpers) if self.recurrence is not None else None
+        if solved is not None:
+            # The derivation explains the bound; a loop's pattern no longer does
+            self.time_cost, self.derivation = solved
+            self.pattern = None
+            self.time = format_time_cost(self.time_cost)
+
+class ComplexityReport:
+    def __init__(self, module_cost, module_space, functions):
+        # Module-level work is kept apart so reports of the parts of one
+        # file can be recombined (see combine_reports)
+        self.module_cost = module_cost
+        self.module_space = module_space
+        self.functions = functions
+        resolve_recurrences(functions)
+        time_cost = max([module_cost] + [f.time_cost for f in functions])
+        # Named after a pattern only when everything this slow agrees on it
+        patterns = {f.pattern for f in functions if f.time_cost == time_cost}
+        if module_cost == time_cost:
+            patterns.add(None)
+        self.time = format_time_cost(time_cost, patterns.pop() if len(patterns) == 1 else None)
+        self.space = max([module_space] + [f.space for f in functions], key=SPACE_RANKS.get)
+
+def resolve_recurrences(functions):
+    # Recurrences add the cost of the helpers they call, looked up by name
+    # among the other functions of the file
+    helpers = {}
+    for f in functions:
+        if f.recurrence is None:
+            name = f.name.rsplit('.', 1)[-1]
+            helpers[name] = max(helpers.get(name, CONSTANT), f.time_cost)
+    for f in functions:
+        f.resolve(helpers)
+
+def combine_reports(parts):
+    # parts: (line offset, report) of the top-level units of one file
+    functions = []
+    for offset, report in parts:
+        functions.extend(FunctionComplexity(f.name, f.lineno + offset, f.base_cost, f.space, f.recurrence,
+                                            f.base_pattern)
+                         for f in report.functions)
+    module_cost = max(report.module_cost for _, report in parts)
+    module_space = max((report.module_space for _, report in parts), key=SPACE_RANKS.get)
+    return ComplexityReport(module_cost, module_space, functions)
+
+class _Scope:
+    def __init__(self, name, qualname, node):
+        self.name = name
+        self.qualname = qualname
+        self.node = node
+        self.cost = CONSTANT
+        self.loops = []
+        self.recursive = False
+        # Tail recursion written as a loop: timed by its recurrence, but
+        # without a call stack
+        self.iterative = False
+        self._memoized = None
+        self.allocates = False
+        self.binary_search = False
+        self.allocation_verdict = "O(n) - Linear (Data Structure)"
+        # For the recurrence: slices copied, the largest builtin call and
+        # (name, loops around the call) of every other call
+        self.copies = False
+        self.builtin_work = CONSTANT
+        self.calls = []
+        self.self_calls = []
+        self.recurrence = None
+
+    @property
+    def memoized(self):
+        # Only asked about recursive functions, and finding a memo table
+        # walks the whole body, so it is looked for on first use
+        if self._memoized is None:
+            self._memoized = is_memoized(self.node)
+        return self._memoized
+
+    @memoized.setter
+    def memoized(self, value):
+        self._memoized = value
+
+    def time_cost(self):
+        # Without a solved recurrence, a tail loop is still a loop
+        if self.iterative:
+            return add_costs(LINEAR, self.cost)
+        # A memoized function does its own work once per distinct argument
+        if self.recursive and self.memoized:
+            return add_costs(LINEAR, self.cost)
+        return EXPONENTIAL if self.recursive else self.cost
+
+    def pattern(self):
+        return 'Binary Search' if self.binary_search else None
+
+    def work(self):
+        # What one call costs besides its self-calls and helper calls
+        return max(self.cost, LINEAR if self.copies else CONSTANT, self.builtin_work)
+
+    def space(self):
+        recursive = self.recursive and not self.iterative
+        if recursive and self.memoized:
+            return "O(n) - Linear (Memo Table)"
+        if recursive and self.recurrence is not None and self.recurrence.depth() == 'log':
+            if self.allocates or self.copies:
+                return self.allocation_verdict
+            return "O(log n) - Logarithmic (Recursive Stack)"
+        if recursive:
+            return "O(n) - Linear (Recursive Stack)"
+        if self.allocates:
+            return self.allocation_verdict
+        if self.binary_search:
+            return "O(1) - Constant (Binary Search)"
+        return "O(1) - Constant"
+
+def is_memoized(node):
+    for decorator in getattr(node, 'decorator_list', ()):
+        if isinstance(decorator, ast.Call):
+            decorator = decorator.func
+        if isinstance(decorator, ast.Attribute) and decorator.attr in ('lru_cache', 'cache'):
+            return True
+        if isinstance(decorator, ast.Name) and decorator.id in ('lru_cache', 'cache'):
+            return True
+    return isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _has_memo_table(node)
+
+def _table_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return f'{node.value.id}.{node.attr}'
+    return None
+
+def _has_memo_table(node):
+    # A table that is looked up ("n in memo", "memo[n] != -1") and stored
+    # into ("memo[n] = ...") in the same function
+    looked_up, stored = set(), set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Compare):
+            if any(isinstance(op, (ast.In, ast.NotIn)) for op in child.ops):
+                looked_up.update(_table_name(c) for c in child.comparators)
+            if isinstance(child.left, ast.Subscript):
+                looked_up.add(_table_name(child.left.value))
+        elif isinstance(child, (ast.Assign, ast.AugAssign)):
+            for target in getattr(child, 'targets', None) or [child.target]:
+                if isinstance(target, ast.Subscript):
+                    stored.add(_table_name(target.value))
+    return bool((looked_up & stored) - {None})
+
+class _Loop:
+    def __init__(self, halving_candidate):
+        self.halving_candidate = halving_candidate
+        self.halving = False
+        self.inner = CONSTANT
+        # A loop the function calls itself from is a traversal of children,
+        # whose count the recurrence accounts for
+        self.recursive = False
+
+class ComplexityVisitor(ast.NodeVisitor):
+    # One pass over the tree. Each function (and the module body) keeps a
+    # stack of open loops; a loop's cost is its own step plus the worst of
+    # what is nested in it, and it is folded into its parent when it closes.
+    def __init__(self):
+        self.scopes = []
+        self.finished = []
+        self.names = []
+
+    def report(self):
+        module = self.finished[-1]
+        for scope in self.finished[:-1]:
+            if scope.recursive and not scope.memoized:
+                paths = python_self_calls(scope.node)
+                if paths is not None:
+                    scope.recurrence = Recurrence(paths, scope.work(), scope.calls)
+        functions = [
+            FunctionComplexity(scope.qualname, scope.node.lineno, scope.time_cost(), scope.space(),
+                               scope.recurrence, scope.pattern())
+            for scope in self.finished[:-1]
+        ]
+        functions.sort(key=lambda f: f.lineno)
+        return ComplexityReport(module.time_cost(), module.space(), functions)
+
+    def _enter(self, name, node):
+        scope = _Scope(name, '.'.join(self.names + [name]), node)
+        self.scopes.append(scope)
+        return scope
+
+    def _leave(self):
+        self.finished.append(self.scopes.pop())
+
+    def visit_Module(self, node):
+        self._enter('<module>', node)
+        self.generic_visit(node)
+        self._leave()
+
+    def visit_FunctionDef(self, node):
+        recursion = tail_call_form(node)
+        scope = self._enter(node.name, recursion or node)
+        scope.iterative = recursion is not None
+        self.names.append(node.name)
+        self.generic_visit(recursion or node)
+        self.names.pop()
+        self._leave()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        # Class bodies run as part of the enclosing scope
+        self.names.append(node.name)
+        self.generic_visit(node)
+        self.names.pop()
+
+    def _visit_loop(self, node, step, halving_candidate=False):
+        scope = self.scopes[-1]
+        loop = _Loop(halving_candidate)
+        scope.loops.append(loop)
+        self.generic_visit(node)
+        scope.loops.pop()
+
+        if loop.halving:
+            scope.binary_search = True
+            step = LOGARITHMIC
+        if loop.recursive and not scope.memoized:
+            step = CONSTANT
+        cost = add_costs(step, loop.inner)
+        if scope.loops:
+            scope.loops[-1].inner = max(scope.loops[-1].inner, cost)
+        else:
+            scope.cost = max(scope.cost, cost)
+
+    def visit_For(self, node):
+        self._visit_loop(node, LINEAR)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        test = node.test
+        halving_candidate = (
+            isinstance(test, ast.Compare) and
+            isinstance(test.left, ast.Name) and
+            isinstance(test.comparators[0], ast.Name)
+        )
+        self._visit_loop(node, LINEAR, halving_candidate)
+
+    def visit_ListComp(self, node):
+        self.scopes[-1].allocates = True
+        self._visit_loop(node, (0, len(node.generators), 0))
+
+    visit_SetComp = visit_ListComp
+    visit_DictComp = visit_ListComp
+
+    def visit_GeneratorExp(self, node):
+        self._visit_loop(node, (0, len(node.generators), 0))
+
+    def visit_Assign(self, node):
+        # A "mid" assignment inside a while loop marks it as a binary search
+        target = node.targets[0]
+        if isinstance(target, ast.Name) and target.id == 'mid':
+            for loop in self.scopes[-1].loops:
+                if loop.halving_candidate:
+                    loop.halving = True
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        scope = self.scopes[-1]
+        func = node.func
+        if isinstance(func, ast.Name):
+            called = func.id
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id in ('self', 'cls'):
+            called = func.attr
+        else:
+            called = None
+        if called is not None and called == scope.name:
+            scope.recursive = True
+            for loop in scope.loops:
+                loop.recursive = True
+        elif called is not None:
+            around = (0, len(scope.loops), 0)
+            if called in BUILTIN_WORK and len(node.args) == 1 and not node.keywords:
+                scope.builtin_work = max(scope.builtin_work, add_costs(around, BUILTIN_WORK[called]))
+            else:
+                scope.calls.append((called, around))
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        if isinstance(node.slice, ast.Slice) and isinstance(node.ctx, ast.Load):
+            self.scopes[-1].copies = True
+        self.generic_visit(node)
+
+    def visit_List(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.scopes[-1].allocates = True
+        self.generic_visit(node)
+
+    def visit_Dict(self, node):
+        self.scopes[-1].allocates = True
+        self.generic_visit(node)
+
+    visit_Set = visit_Dict
 
 def analyze_cpp_java_complexity(code, language):
-    # Check for binary search pattern
-    binary_search_pattern = r'while\s*\(\s*(?:low|left|start)\s*<=\s*(?:high|right|end)\s*\)'
-    if re.search(binary_search_pattern, code):
-        # Check for mid calculation
-        mid_pattern = r'(?:mid|middle)\s*=\s*(?:low|left|start)\s*\+\s*(?:high|right|end)\s*/\s*2'
-        if re.search(mid_pattern, code):
-            return "O(log n) - Logarithmic (Binary Search)"
-    
-    # Check for nested loops
-    nested_loops = len(re.findall(r'for\s*\(.*\{.*for\s*\(', code, re.DOTALL))
-    if nested_loops > 0:
-        return f"O(n^{nested_loops + 1}) - Polynomial (Nested Loops)"
-    
-    # Check for single loop
-    single_loop = bool(re.search(r'for\s*\(|while\s*\(', code))
-    if single_loop:
-        return "O(n) - Linear"
-    
-    # Check for recursion
-    recursion_pattern = r'(\w+)\s*\([^)]*\)\s*\{[^}]*\1\s*\('
-    if re.search(recursion_pattern, code):
-        return "O(2^n) - Exponential (Recursive)"
-    
-    return "O(1) - Constant"
+    return analyze_cpp_java(lex(code, language)).time
 
 def analyze_cpp_java_space_complexity(code, language):
-    # Check for binary search pattern
-    binary_search_pattern = r'while\s*\(\s*(?:low|left|start)\s*<=\s*(?:high|right|end)\s*\)'
-    if re.search(binary_search_pattern, code):
-        # Check for mid calculation
-        mid_pattern = r'(?:mid|middle)\s*=\s*(?:low|left|start)\s*\+\s*(?:high|right|end)\s*/\s*2'
-        if re.search(mid_pattern, code):
-            return "O(1) - Constant (Binary Search)"
-    
-    # Check for recursion
-    recursion_pattern = r'(\w+)\s*\([^)]*\)\s*\{[^}]*\1\s*\('
-    if re.search(recursion_pattern, code):
-        return "O(n) - Linear (Recursive Stack)"
-    
-    # Check for array/list operations
-    if re.search(r'\[\s*\d+\s*\]', code):
-        return "O(n) - Linear (Array/List)"
-    
-    return "O(1) - Constant"
\ No newline at end of file
+    return analyze_cpp_java(lex(code, language)).space
+
+# ---------------- C++/Java Complexity ----------------
+CONTAINER_TYPES = (
+    'vector', 'deque', 'list', 'map', 'set', 'unordered_map', 'unordered_set',
+    'ArrayList', 'LinkedList', 'HashMap', 'HashSet', 'TreeMap', 'TreeSet', 'ArrayDeque',
+)
+MID_NAMES = ('mid', 'middle')
+COMPARISONS = ('<', '<=', '>', '>=')
+
+def analyze_cpp_java(lexed):
+    # Works on the shared brace tree: every function block is a scope, and
+    # whatever is not inside a function (pasted snippets) is the module scope.
+    module = _Scope('<module>', '<module>', lexed.root)
+    module.cost = _block_cost(lexed, lexed.root, module)
+    functions = []
+    for block in lexed.functions():
+        scope = _Scope(block.name, _qualified_name(block), block)
+        scope.allocation_verdict = "O(n) - Linear (Array/List)"
+        _scan_function_tokens(lexed, block, scope)
+        scope.cost = _block_cost(lexed, block, scope)
+        if scope.recursive and not scope.memoized:
+            paths = cpp_java_self_calls(lexed, block)
+            if paths is not None:
+                scope.recurrence = Recurrence(paths, scope.work(), scope.calls)
+        functions.append(FunctionComplexity(scope.qualname, block.line, scope.time_cost(), scope.space(),
+                                            scope.recurrence, scope.pattern()))
+    return ComplexityReport(module.time_cost(), module.space(), functions)
+
+def _qualified_name(block):
+    names = [block.name]
+    parent = block.parent
+    while parent is not None:
+        if parent.kind in ('class', 'function', 'namespace') and parent.name:
+            names.append(parent.name)
+        parent = parent.parent
+    return '.'.join(reversed(names))
+
+def _block_cost(lexed, block, scope):
+    # Post-order over the block tree without recursion, so deeply nested
+    # input cannot blow the Python stack. Nested functions are their own scope.
+    costs = {}
+    stack = [(block, False)]
+    while stack:
+        current, done = stack.pop()
+        if not done:
+            stack.append((current, True))
+            stack.extend((child, False) for child in current.children if child.kind != 'function')
+            continue
+        inner = max((costs.pop(child) for child in current.children if child in costs), default=CONSTANT)
+        # Loops the function calls itself from are traversals of children,
+        # which the recurrence accounts for
+        if current is not block and current.is_loop() and not _calls_itself(current, scope):
+            if current.kind == 'while' and _is_binary_search(lexed, current):
+                scope.binary_search = True
+                inner = add_costs(LOGARITHMIC, inner)
+            else:
+                inner = add_costs(LINEAR, inner)
+        costs[current] = inner
+    return costs[block]
+
+def _is_binary_search(lexed, block):
+    # while (lo <= hi) { ... mid = ... / 2 ... }
+    header = [t.text for t in block.header]
+    if not (len(header) == 6 and block.header[2].kind == 'ident' and
+            header[3] in COMPARISONS and block.header[4].kind == 'ident'):
+        return False
+    tokens = lexed.block_tokens(block)
+    for i, token in enumerate(tokens):
+        if token.text in MID_NAMES and i + 1 < len(tokens) and tokens[i + 1].text == '=':
+            j = i + 2
+            while j < len(tokens) and tokens[j].text != ';':
+                if matches(tokens, j, ('/', '2')) or matches(tokens, j, ('>', '>', '1')):
+                    return True
+                j += 1
+    return False
+
+def _calls_itself(block, scope):
+    if scope.memoized:
+        return False
+    end = block.end if block.end is not None else float('inf')
+    return any(block.start <= index < end for index in scope.self_calls)
+
+def _scan_function_tokens(lexed, block, scope):
+    tokens = lexed.block_tokens(block)
+    depth = loop_depths([b for b in block.walk() if b is not block and b.is_loop()])
+    looked_up, stored = set(), set()
+    for i, token in enumerate(tokens):
+        text = token.text
+        if token.kind == 'ident' and i + 1 < len(tokens) and tokens[i + 1].text == '(':
+            # Calls through another object are not self-calls, this.f() is
+            own = i == 0 or tokens[i - 1].text not in ('.', '->', '::') or (i > 1 and tokens[i - 2].text == 'this')
+            if text == block.name and own:
+                scope.recursive = True
+                scope.self_calls.append(block.start + i)
+            elif own:
+                scope.calls.append((text, (0, depth(block.start + i), 0)))
+            elif text in SLICE_CALLS:
+                scope.copies = True
+        if (text in CONTAINER_TYPES or
+                (text == '[' and matches(tokens, i, ('[', NUMBER, ']'))) or
+                (text == 'new' and matches(tokens, i + 1, (IDENT, '[')))):
+            scope.allocates = True
+        # Memo tables: "return memo[n]" / "memo.get(n)" next to
+        # "memo[n] = ..." / "memo.put(n, ...)"
+        following = tokens[i + 1].text if token.kind == 'ident' and i + 1 < len(tokens) else None
+        if following is None:
+            continue
+        if text == 'return':
+            if matches(tokens, i + 1, (IDENT, '[')) or matches(tokens, i + 1, (IDENT, '.', 'get', '(')):
+                looked_up.add(following)
+        elif following == '.' and matches(tokens, i + 2, ('put', '(')):
+            stored.add(text)
+        elif following == '[' and _stored_into(tokens, i + 1):
+            stored.add(text)
+    if looked_up & stored:
+        scope.memoized = True
+
+def _stored_into(tokens, open_index):
+    # True for name[...] = ..., given the index of the '['
+    depth = 0
+    for j in range(open_index, len(tokens)):
+        if tokens[j].text == '[':
+            depth += 1
+        elif tokens[j].text == ']':
+            depth -= 1
+            if depth == 0:
+                return j + 1 < len(tokens) and tokens[j + 1].text == '='
+        elif tokens[j].text == ';':
+            return False
+    return False
@@ -0,0 +1,139 @@
+import ast
+import heapq
+from symbols import SymbolTable
+from lexer import lex
+
+# ---------------- Shared Analysis Context ----------------
+# One context is built per submission and handed to every analyzer. The
+# source is parsed at most once, and the node index (nodes by type, parent
+# links) is only built the first time somebody asks for it.
+class AnalysisContext:
+    def __init__(self, code, language, tree=None):
+        self.code = code
+        self.language = language
+        self.lines = code.split('\n')
+        self._tree = tree
+        self._syntax_error = None
+        self._parsed = tree is not None
+        self._order = None
+        self._positions = None
+        self._parents = None
+        self._depths = None
+        self._symbols = None
+        self._lexed = None
+        self._results = {}
+
+    @classmethod
+    def from_tree(cls, tree):
+        return cls('', 'Python', tree=tree)
+
+    def is_empty(self):
+        return not self.code.strip() and self._tree is None
+
+    # ---- Python syntax tree ----
+    def _parse(self):
+        if not self._parsed:
+            self._parsed = True
+            try:
+                self._tree = ast.parse(self.code)
+            except SyntaxError as e:
+                self._syntax_error = e
+
+    @property
+    def syntax_error(self):
+        self._parse()
+        return self._syntax_error
+
+    @property
+    def tree(self):
+        # Raises the original SyntaxError when the source does not parse
+        self._parse()
+        if self._syntax_error is not None:
+            raise self._syntax_error
+        return self._tree
+
+    def detach_tree(self):
+        # Hand the tree over to a consumer that mutates it (the optimizer).
+        # Later readers of this context get a freshly parsed tree.
+        tree = self.tree
+        self._tree = None
+        self._parsed = False
+        self._order = self._positions = self._parents = self._depths = None
+        self._symbols = None
+        return tree
+
+    # ---- C++/Java token stream ----
+    @property
+    def lexed(self):
+        # Tokens and brace tree shared by every C++/Java analysis
+        if self._lexed is None:
+            self._lexed = lex(self.code, self.language)
+        return self._lexed
+
+    # ---- Node index ----
+    def _build_index(self):
+        if self._order is not None:
+            return
+        order = []
+        positions = {}
+        parents = {}
+        depths = {self.tree: 0}
+        todo = [self.tree]
+        i = 0
+        # Breadth-first, same order as ast.walk
+        while i < len(todo):
+            node = todo[i]
+            i += 1
+            positions.setdefault(type(node), []).append(len(order))
+            order.append(node)
+            depth = depths[node] + 1
+            for child in ast.iter_child_nodes(node):
+                parents[child] = node
+                depths[child] = depth
+                todo.append(child)
+        self._order = order
+        self._positions = positions
+        self._parents = parents
+        self._depths = depths
+
+    def walk(self):
+        self._build_index()
+        return self._order
+
+    def nodes(self, *types):
+        # All nodes of the given types, in ast.walk order
+        self._build_index()
+        order = self._order
+        if len(types) == 1:
+            return [order[i] for i in self._positions.get(types[0], ())]
+        merged = heapq.merge(*(self._positions.get(t, ()) for t in types))
+        return [order[i] for i in merged]
+
+    def parent(self, node):
+        self._build_index()
+        return self._parents.get(node)
+
+    def depth(self, node):
+        # Number of ancestors, 0 for the root
+        self._build_index()
+        return self._depths[node]
+
+    def ancestors(self, node):
+        self._build_index()
+        node = self._parents.get(node)
+        while node is not None:
+            yield node
+            node = self._parents.get(node)
+
+    @property
+    def symbols(self):
+        # Scope-aware def/use index, see symbols.py
+        if self._symbols is None:
+            self._symbols = SymbolTable(self.tree)
+        return self._symbols
+
+    def cached(self, key, compute):
+        # Per-submission memo for results several analyzers want to share
+        if key not in self._results:
+            self._results[key] = compute(self)
+        return self._results[key]
@@ -0,0 +1,206 @@
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+# ---------------- Empirical Complexity ----------------
+# Calls a Python function on inputs of growing size in a sandboxed
+# subprocess, records runtime and peak traced memory per size and fits the
+# measurements against the usual complexity classes with least squares.
+
+MODELS = [
+    ("O(1) - Constant", lambda n: np.zeros_like(n)),
+    ("O(log n) - Logarithmic", lambda n: np.log2(n)),
+    ("O(n) - Linear", lambda n: n),
+    ("O(n log n) - Linearithmic", lambda n: n * np.log2(n)),
+    ("O(n^2) - Quadratic", lambda n: n ** 2),
+    ("O(n^3) - Cubic", lambda n: n ** 3),
+    ("O(2^n) - Exponential", lambda n: np.exp2(np.minimum(n, 1000))),
+]
+
+# Small evenly spaced sizes first so exponential growth still yields enough
+# points before the budget runs out, then doubling for everything else
+DEFAULT_SIZES = list(range(2, 24, 2)) + [32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384]
+INT_NAMES = {'n', 'k', 'm', 'size', 'count', 'num', 'number', 'limit', 'depth', 'steps', 'times'}
+
+RUNNER = r'''
+import json, random, sys, time, tracemalloc
+payload = json.loads(sys.stdin.read())
+try:
+    import resource
+    limit = payload['memory_mb'] * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+except (ImportError, ValueError, OSError):
+    pass
+
+namespace = {'__name__': '__sandbox__'}
+exec(compile(payload['code'], '<submission>', 'exec'), namespace)
+function = namespace[payload['function']]
+
+def build(n):
+    random.seed(n)
+    if payload['inputs']:
+        args = eval(payload['inputs'], {'n': n, 'random': random})
+        return args if isinstance(args, tuple) else (args,)
+    args = []
+    for kind in payload['kinds']:
+        if kind == 'int':
+            args.append(n)
+        elif kind == 'str':
+            args.append(''.join(random.choice('abcdefgh') for _ in range(n)))
+        elif kind == 'sorted':
+            args.append(sorted(random.randrange(4 * n) for _ in range(n)))
+        else:
+            args.append([random.randrange(4 * n) for _ in range(n)])
+    return tuple(args)
+
+def measure(n):
+    args = build(n)
+    # Inputs are rebuilt per call so functions that mutate them stay comparable
+    calls, elapsed = 0, 0.0
+    while elapsed < payload['min_time'] and calls < 1000:
+        fresh = build(n) if calls else args
+        start = time.perf_counter()
+        function(*fresh)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    fresh = build(n)
+    tracemalloc.start()
+    function(*fresh)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed / calls, peak
+
+for n in payload['sizes']:
+    started = time.perf_counter()
+    seconds, peak = measure(n)
+    print(json.dumps({'n': n, 'seconds': seconds, 'peak_bytes': peak}), flush=True)
+    if time.perf_counter() - started > payload['size_budget']:
+        break
+'''
+
+class EmpiricalError(Exception):
+    pass
+
+def _argument_kinds(function):
+    kinds = []
+    for arg in function.args.args:
+        if arg.arg in ('self', 'cls'):
+            continue
+        annotation = ast.unparse(arg.annotation) if arg.annotation is not None else ''
+        name = arg.arg.lower()
+        if annotation == 'int' or name in INT_NAMES:
+            kinds.append('int')
+        elif annotation == 'str' or name in ('s', 'text', 'string', 'word'):
+            kinds.append('str')
+        elif 'sorted' in name:
+            kinds.append('sorted')
+        else:
+            kinds.append('list')
+    return kinds
+
+def measurable_functions(tree):
+    # Top-level functions with only plain positional parameters
+    found = {}
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        args = node.args
+        if args.vararg or args.kwarg or args.kwonlyargs or args.posonlyargs or args.defaults:
+            continue
+        kinds = _argument_kinds(node)
+        if kinds:
+            found[node.name] = kinds
+    return found
+
+def run_scaling(code, function, kinds, inputs=None, sizes=None, timeout=20,
+                memory_mb=512, min_time=0.02, size_budget=2.0):
+    # Returns the (n, seconds, peak_bytes) rows collected before the time
+    # budget ran out; sizes that take too long end the run early.
+    payload = json.dumps({
+        'code': code, 'function': function, 'kinds': kinds, 'inputs': inputs,
+        'sizes': sizes or DEFAULT_SIZES, 'memory_mb': memory_mb,
+        'min_time': min_time, 'size_budget': size_budget,
+    })
+    env = {'PYTHONHASHSEED': '0', 'PATH': os.environ.get('PATH', '')}
+    timed_out = False
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            proc = subprocess.run(
+                [sys.executable, '-s', '-c', RUNNER], input=payload, capture_output=True,
+                text=True, timeout=timeout, cwd=workdir, env=env
+            )
+            stdout, stderr, failed = proc.stdout, proc.stderr, proc.returncode != 0
+        except subprocess.TimeoutExpired as e:
+            stdout = e.stdout.decode() if isinstance(e.stdout, bytes) else (e.stdout or '')
+            stderr, failed, timed_out = '', False, True
+
+    rows = []
+    for line in stdout.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and 'n' in record:
+            rows.append((record['n'], record['seconds'], record['peak_bytes']))
+    if failed and len(rows) < 4:
+        lines = stderr.strip().splitlines()
+        raise EmpiricalError(lines[-1] if lines else 'Sandboxed run failed')
+    if len(rows) < 4:
+        raise EmpiricalError('Timed out before enough sizes were measured' if timed_out
+                             else 'Not enough measurements to fit a model')
+    return rows
+
+def fit_complexity(sizes, values):
+    # Least squares of value = a + b * f(n) for every model. The best model
+    # has the smallest residual; simpler models win near-ties so noise on a
+    # flat curve is not read as growth.
+    n = np.asarray(sizes, dtype=float)
+    y = np.asarray(values, dtype=float)
+    total = float(np.sum((y - y.mean()) ** 2)) or 1e-30
+    fits = []
+    for label, model in MODELS:
+        column = model(n)
+        if not np.all(np.isfinite(column)):
+            continue
+        # Scaled to [0, 1] so the huge exponential column stays well conditioned
+        if column.max() > 0:
+            column = column / column.max()
+        design = np.column_stack([np.ones_like(n), column])
+        coefficients, _, _, _ = np.linalg.lstsq(design, y, rcond=None)
+        if label != MODELS[0][0] and coefficients[1] <= 0:
+            continue
+        residual = float(np.sum((design @ coefficients - y) ** 2))
+        fits.append((label, residual, 1 - residual / total))
+    best_residual = min(residual for _, residual, _ in fits)
+    tolerance = best_residual * 1.1 + total * 1e-3
+    for label, residual, r_squared in fits:
+        if residual <= tolerance:
+            return {'class': label, 'r_squared': round(max(r_squared, 0.0), 4)}
+
+def empirical_complexity(code, function, inputs=None, **limits):
+    # {'function', 'sizes', 'time': {'class', 'r_squared'}, 'space': {...}}
+    kinds = measurable_functions(ast.parse(code)).get(function)
+    if kinds is None and inputs is None:
+        raise EmpiricalError(f'{function} is not a top-level function with plain parameters')
+    rows = run_scaling(code, function, kinds or [], inputs, **limits)
+    sizes = [n for n, _, _ in rows]
+    return {
+        'function': function,
+        'sizes': sizes,
+        'time': fit_complexity(sizes, [seconds for _, seconds, _ in rows]),
+        'space': fit_complexity(sizes, [peak for _, _, peak in rows]),
+    }
+
+def empirical_report(code, **limits):
+    # Measures every measurable top-level function, one sandbox run each
+    results = []
+    for name in measurable_functions(ast.parse(code)):
+        try:
+            results.append(empirical_complexity(code, name, **limits))
+        except EmpiricalError as e:
+            results.append({'function': name, 'error': str(e)})
+    return results
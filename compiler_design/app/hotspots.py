@@ -0,0 +1,197 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# ---------------- Line Hotspots ----------------
+# Runs a Python submission (and an optional entry call) in a sandboxed
+# subprocess under a line tracer and reports, per line of the submission,
+# how often it ran and how much time was spent on it. Time is exclusive:
+# a line that calls another submission function is not charged for the
+# callee's lines, but is charged for library calls it makes. Times include
+# the tracer's own overhead, so they are meant to compare lines, not to be
+# read as absolute durations.
+
+RUNNER = r'''
+import contextlib, io, json, signal, sys, time
+payload = json.loads(sys.stdin.read())
+try:
+    import resource
+    limit = payload['memory_mb'] * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+except (ImportError, ValueError, OSError):
+    pass
+
+FILENAME = '<submission>'
+code = compile(payload['code'], FILENAME, 'exec')
+entry = compile(payload['entry'], '<entry>', 'eval') if payload['entry'] else None
+
+class BudgetExceeded(BaseException):
+    pass
+
+class LineClock:
+    # Charges the time since the previous event to the line that was running
+    def __init__(self):
+        self.hits = {}
+        self.seconds = {}
+        self.stack = []
+        self.current = None
+        self.last = time.perf_counter()
+
+    def _charge(self):
+        now = time.perf_counter()
+        if self.current is not None:
+            self.seconds[self.current] = self.seconds.get(self.current, 0.0) + now - self.last
+        self.last = now
+
+    def enter(self, line):
+        self._charge()
+        self.stack.append(self.current)
+        self.current = line
+
+    def line(self, line):
+        self._charge()
+        self.hits[line] = self.hits.get(line, 0) + 1
+        self.current = line
+
+    def leave(self):
+        self._charge()
+        self.current = self.stack.pop() if self.stack else None
+
+clock = LineClock()
+
+def start_settrace():
+    def local(frame, event, arg):
+        if event == 'line':
+            clock.line(frame.f_lineno)
+        elif event == 'return':
+            clock.leave()
+        return local
+
+    def calls(frame, event, arg):
+        if frame.f_code.co_filename != FILENAME:
+            return None
+        clock.enter(frame.f_lineno)
+        return local
+
+    sys.settrace(calls)
+    return lambda: sys.settrace(None)
+
+def start_monitoring():
+    # Python 3.12+: events for library code are switched off where they occur
+    monitoring = sys.monitoring
+    tool = monitoring.PROFILER_ID
+    monitoring.use_tool_id(tool, 'line-hotspots')
+    events = monitoring.events
+    ours = lambda code: code.co_filename == FILENAME
+
+    def on_start(code, offset):
+        if not ours(code):
+            return monitoring.DISABLE
+        clock.enter(code.co_firstlineno)
+
+    def on_line(code, line):
+        if not ours(code):
+            return monitoring.DISABLE
+        clock.line(line)
+
+    def on_leave(code, offset, value):
+        if not ours(code):
+            return monitoring.DISABLE
+        clock.leave()
+
+    def on_unwind(code, offset, exception):
+        if ours(code):
+            clock.leave()
+
+    for event, callback in ((events.PY_START, on_start), (events.PY_RESUME, on_start),
+                            (events.LINE, on_line), (events.PY_RETURN, on_leave),
+                            (events.PY_YIELD, on_leave), (events.PY_UNWIND, on_unwind)):
+        monitoring.register_callback(tool, event, callback)
+    monitoring.set_events(tool, events.PY_START | events.PY_RESUME | events.LINE |
+                          events.PY_RETURN | events.PY_YIELD | events.PY_UNWIND)
+
+    def stop():
+        monitoring.set_events(tool, 0)
+        monitoring.free_tool_id(tool)
+    return stop
+
+def over_budget(signum, frame):
+    raise BudgetExceeded()
+
+out = io.StringIO()
+error = None
+truncated = False
+signal.signal(signal.SIGALRM, over_budget)
+signal.setitimer(signal.ITIMER_REAL, payload['budget'])
+stop = start_monitoring() if hasattr(sys, 'monitoring') else start_settrace()
+started = time.perf_counter()
+try:
+    with contextlib.redirect_stdout(out):
+        namespace = {'__name__': '__main__'}
+        exec(code, namespace)
+        if entry is not None:
+            eval(entry, namespace)
+except BudgetExceeded:
+    truncated = True
+except Exception as e:
+    error = f'{type(e).__name__}: {e}'
+finally:
+    stop()
+    signal.setitimer(signal.ITIMER_REAL, 0)
+total = time.perf_counter() - started
+sys.stdout.write('\n' + json.dumps({
+    'lines': {line: [clock.hits.get(line, 0), clock.seconds.get(line, 0.0)]
+              for line in set(clock.hits) | set(clock.seconds) if line},
+    'total_seconds': total, 'truncated': truncated, 'error': error,
+    'stdout': out.getvalue()[-payload['max_output']:],
+}))
+'''
+
+class HotspotError(Exception):
+    pass
+
+def profile_lines(code, entry=None, budget=5.0, memory_mb=512, grace=5.0, max_output=2000):
+    # {'lines': [{'line', 'hits', 'seconds', 'share'}], 'total_seconds',
+    #  'truncated', 'error', 'stdout'}. A run that hits the budget is stopped
+    # and reports the lines it got through, with truncated set.
+    payload = json.dumps({'code': code, 'entry': entry, 'budget': budget,
+                          'memory_mb': memory_mb, 'max_output': max_output})
+    env = {'PYTHONHASHSEED': '0', 'PATH': os.environ.get('PATH', '')}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            proc = subprocess.run(
+                [sys.executable, '-s', '-c', RUNNER], input=payload, capture_output=True,
+                text=True, timeout=budget + grace, cwd=workdir, env=env
+            )
+        except subprocess.TimeoutExpired:
+            raise HotspotError(f'Did not stop within {budget + grace}s')
+    try:
+        record = json.loads(proc.stdout.rsplit('\n', 1)[-1])
+    except ValueError:
+        lines = proc.stderr.strip().splitlines()
+        raise HotspotError(lines[-1] if lines else f'Exited with status {proc.returncode}')
+
+    spent = sum(seconds for _, seconds in record['lines'].values()) or 1.0
+    record['lines'] = [
+        {'line': int(line), 'hits': hits, 'seconds': round(seconds, 6), 'share': round(seconds / spent, 4)}
+        for line, (hits, seconds) in sorted(record['lines'].items(), key=lambda item: int(item[0]))
+    ]
+    return record
+
+def line_heat(profile):
+    # {line: share of the traced time}, for add_line_numbers
+    return {row['line']: row['share'] for row in profile['lines']}
+
+def hottest_lines(profile, findings=(), limit=5, min_share=0.01):
+    # The lines that took the most time, each with the optimizer findings
+    # whose line range covers it
+    rows = sorted(profile['lines'], key=lambda row: row['seconds'], reverse=True)
+    hottest = []
+    for row in rows[:limit]:
+        if row['share'] < min_share:
+            break
+        related = [f for f in findings if f['line'] <= row['line'] <= f['end_line']]
+        hottest.append(dict(row, findings=related))
+    return hottest
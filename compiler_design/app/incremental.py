@@ -0,0 +1,477 @@
+import ast
+import hashlib
+import re
+from cache import ResultCache, cache_key
+from context import AnalysisContext
+from instrumentation import stage
+from analyzer import (combine_python_logic, cpp_java_logic_facts, cpp_java_syntax_facts,
+                      format_cpp_java_logic, format_cpp_java_syntax, python_logic_facts)
+from complexity import analyze_cpp_java, analyze_python, combine_reports, complexity_report_ctx
+from lexer import lex
+from optimizer import (DEFAULT_PYTHON_PASSES, complexity_changes, optimize_python_tree, rewrite_cpp_java_line,
+                       tree_to_source)
+from passes import (IMMUTABLE_CONSTANTS, ModuleFacts, PassReport, PassStats, bound_names, calls_introspection,
+                    import_position, is_constant, module_imports)
+from pipeline import ANALYZER_VERSION, PipelineTimeout, add_python_optimization, function_rows, run_pipeline
+
+# ---------------- Incremental Analysis ----------------
+# A file is cut into top-level units (Python definitions and the module code
+# between them, C++/Java brace blocks) and every unit is analyzed on its own
+# and cached under the hash of its text, so after an edit only the units
+# that changed are parsed and analyzed again. File-level verdicts are then
+# recombined from the per-unit facts. Whenever a cut turns out not to be
+# clean (a unit does not parse, or its braces do not balance) the whole
+# file goes through run_pipeline instead. The Python optimizer works unit by
+# unit as well: the facts its passes need about the rest of the module are
+# merged from small per-unit summaries, and a unit is only optimized again
+# when its text or the facts it depends on change. When a pass changes a
+# binding that another unit can see, the file is optimized whole.
+
+class IncrementalPipeline:
+    # Same arguments and results as run_pipeline, so it can be handed to
+    # run_cached_pipeline as the compute function
+    def __init__(self, max_units=4096):
+        # Unit records hold reports and sets rather than JSON, and are only read
+        self.units = ResultCache(max_entries=max_units, shared=True)
+
+    def __call__(self, code, language):
+        results = None
+        if code.strip():
+            if language == 'Python':
+                results = self._python(code)
+            elif language in ('C++', 'Java'):
+                results = self._cpp_java(code, language)
+        return results if results is not None else run_pipeline(code, language)
+
+    def _unit(self, text, tag, analyze):
+        key = cache_key(text, tag, ANALYZER_VERSION)
+        record = self.units.get(key)
+        if record is None:
+            with stage('unit'):
+                record = analyze()
+            self.units.put(key, record)
+        return record
+
+    # ---- Python ----
+    def _python(self, code):
+        lines = code.split('\n')
+        parts = []
+        with stage('split'):
+            units = split_python_units(lines)
+        texts = []
+        for start, end in units:
+            text = '\n'.join(lines[start:end])
+            record = self._unit(text, 'Python', lambda: analyze_python_unit(text))
+            if not record['parsed']:
+                return None
+            parts.append((start, record))
+            texts.append(text)
+
+        with stage('combine'):
+            logic = combine_python_logic([record['logic'] for _, record in parts])
+            report = combine_reports([(start, record['complexity']) for start, record in parts])
+        results = {
+            'syntax': 'No syntax errors detected.',
+            'logic': '\n'.join(logic) if logic else 'No logical errors detected',
+            'time_complexity': report.time,
+            'space_complexity': report.space,
+            'functions': function_rows(report),
+            'optimization_passes': None,
+            'complexity_changes': [],
+        }
+        # A string at the top of a later unit is dead code in the file but
+        # would pass for the unit's docstring, so such files are optimized whole
+        whole = any(record['summary']['leading_string'] for _, record in parts[1:])
+        if not whole:
+            try:
+                with stage('optimize'):
+                    whole = not self._optimize_python(parts, texts, report, results)
+            except (PipelineTimeout, MemoryError):
+                raise
+            except Exception as e:
+                results['optimized_code'] = f"Error during optimization: {e}"
+        if whole:
+            ctx = AnalysisContext(code, 'Python')
+            ctx.cached('complexity', lambda ctx: report)
+            add_python_optimization(ctx, results)
+        return results
+
+    def _optimize_python(self, parts, texts, report, results):
+        # False if the units cannot be optimized one by one (see below)
+        counts, importers, introspecting, mentions = {}, {}, 0, {}
+        for n, (_, record) in enumerate(parts):
+            summary = record['summary']
+            for name, times in summary['counts'].items():
+                counts[name] = counts.get(name, 0) + times
+            for name, module in summary['imports'].items():
+                importers.setdefault(name, []).append((n, module))
+            introspecting += summary['introspects']
+            for name in summary['names']:
+                mentions[name] = mentions.get(name, 0) + 1
+
+        constants = {}
+        optimized = []
+        fresh = []
+        for n, ((start, record), text) in enumerate(zip(parts, texts)):
+            # The other units' share of the facts this unit can see is part
+            # of its key, so editing one unit only re-optimizes the units
+            # that mention what it changed; its own share is worked out again
+            # after every pass that changes it
+            summary = record['summary']
+            names = summary['names'] | MODULE_FACT_NAMES
+            rest_counts = {name: counts[name] - summary['counts'].get(name, 0) for name in names if name in counts}
+            rest_counts = {name: times for name, times in rest_counts.items() if times}
+            rest_imports = {}
+            for name in names & importers.keys():
+                for unit, module in importers[name]:
+                    if unit != n:
+                        rest_imports[name] = module
+            rest_introspects = introspecting > summary['introspects']
+            seen = {name: value for name, value in constants.items() if name in names}
+            facts_key = repr((
+                n == 0, rest_introspects, sorted(rest_counts.items()), sorted(rest_imports.items()),
+                sorted((name, type(value).__name__, repr(value)) for name, value in seen.items()),
+            ))
+            tag = f"Python-optimized:{hashlib.sha256(facts_key.encode('utf-8')).hexdigest()}"
+            rest = (rest_counts, rest_imports, rest_introspects, seen)
+            computed = []
+
+            def optimize():
+                computed.append(True)
+                return optimize_python_unit(text, rest, n == 0)
+            unit = self._unit(text, tag, optimize)
+            optimized.append((start, unit))
+            fresh.append(bool(computed))
+            constants.update(unit['constants'])
+
+        # Every unit was optimized with the others' facts as they were before
+        # their passes ran. The passes only ask whether a name is bound not
+        # at all, once or more often; if a pass changed that, or an import,
+        # for a name another unit can see, the units no longer add up to the file.
+        totals = dict(counts)
+        changed = set()
+        for (_, record), (_, unit) in zip(parts, optimized):
+            summary = record['summary']
+            if unit['imports'] != summary['imports'] or unit['introspects'] != summary['introspects']:
+                return False
+            for name in summary['counts'].keys() | unit['counts'].keys():
+                difference = unit['counts'].get(name, 0) - summary['counts'].get(name, 0)
+                if difference and (name in MODULE_FACT_NAMES or mentions.get(name, 0) > (name in summary['names'])):
+                    totals[name] = totals.get(name, 0) + difference
+                    changed.add(name)
+        if any(min(counts.get(name, 0), 2) != min(totals[name], 2) for name in changed):
+            return False
+
+        # Imports a pass asked for go where the whole-file optimizer puts
+        # them: after the first unit's docstring and __future__ imports
+        added = sorted({name for _, unit in optimized for name in unit['added_imports']})
+        pieces = []
+        for n, (_, unit) in enumerate(optimized):
+            pieces.extend(unit['pieces'][:1])
+            if n == 0:
+                pieces.extend((f'import {name}', False) for name in added)
+            pieces.extend(unit['pieces'][1:])
+        source = ''
+        for text, definition in pieces:
+            if text:
+                source += ('\n\n' if definition else '\n') + text if source else text
+        results['optimized_code'] = source + '\n'
+
+        stats = [PassStats(pass_class.name) for pass_class in DEFAULT_PYTHON_PASSES]
+        findings = []
+        for (start, unit), computed_now in zip(optimized, fresh):
+            unit_report = unit['report']
+            for stat, unit_stat in zip(stats, unit_report.stats):
+                stat.changes += unit_stat.changes
+                # Time is only spent on the units optimized in this run
+                if computed_now:
+                    stat.seconds += unit_stat.seconds
+            findings.extend(shift_finding(f, start) for f in unit_report.findings)
+        iterations = max(unit['report'].iterations for _, unit in optimized)
+        converged = all(unit['report'].converged for _, unit in optimized)
+        results['optimization_passes'] = PassReport(stats, iterations, converged, findings).as_dict()
+        after = combine_reports([(start, unit['complexity']) for start, unit in optimized])
+        results['complexity_changes'] = complexity_changes(report, after)
+        return True
+
+    # ---- C++/Java ----
+    def _cpp_java(self, code, language):
+        lines = code.split('\n')
+        with stage('split'):
+            ends = brace_line_ends(code, language)
+            if ends is None:
+                return None
+            units = split_brace_units(lines, ends, 0, len(lines), 0)
+        parts = []
+        optimized = []
+        previous = None
+        for n, (start, end) in enumerate(units):
+            pieces = self._pieces(lines, ends, start, end, language, previous)
+            if pieces is None:
+                return None
+            for offset, record in pieces:
+                # Only the last unit may leave a brace open
+                if not record['balanced'] and n < len(units) - 1:
+                    return None
+                parts.append((offset, record))
+                optimized.extend(record['optimized'])
+                previous = record['previous']
+
+        with stage('combine'):
+            syntax = format_cpp_java_syntax(merge_facts([(o, r['syntax']) for o, r in parts]), language)
+            logic = format_cpp_java_logic(merge_facts([(o, r['logic']) for o, r in parts]), language)
+            report = combine_reports([(o, r['complexity']) for o, r in parts])
+        return {
+            'syntax': '\n'.join(syntax) if syntax else 'No syntax errors detected.',
+            'logic': '\n'.join(logic) if logic else 'No logical errors detected',
+            'time_complexity': report.time,
+            'space_complexity': report.space,
+            'functions': function_rows(report),
+            'optimization_passes': None,
+            'complexity_changes': [],
+            'optimized_code': '\n'.join(optimized),
+        }
+
+    def _piece(self, piece_lines, keep, language, previous):
+        text = '\n'.join(piece_lines)
+        tag = f'{language}:{keep[0]}:{keep[1]}:{previous}'
+        return self._unit(text, tag, lambda: analyze_cpp_java_unit(text, language, keep, previous))
+
+    def _pieces(self, lines, ends, start, end, language, previous):
+        # (line offset, record) for one top-level unit. A class or namespace
+        # is cut once more into its members, each re-wrapped in a copy of
+        # the container's header so names and block kinds come out the same.
+        whole = lines[start:end]
+        opened = container_opening(ends, start, end)
+        members = split_brace_units(lines, ends, opened + 1, end, 1) if opened is not None else []
+        if len(members) < 2:
+            return [(start, self._piece(whole, (0, len(whole)), language, previous))]
+
+        head = lines[start:opened + 1]
+        record = self._piece(head + ['}'], (0, len(head)), language, previous)
+        wrapper = record['wrapper']
+        if wrapper is None:
+            return [(start, self._piece(whole, (0, len(whole)), language, previous))]
+        pieces = [(start, record)]
+        for n, (first, stop) in enumerate(members):
+            body = lines[first:stop]
+            closing = [] if n == len(members) - 1 else ['}']
+            previous = record['previous']
+            record = self._piece([wrapper] + body + closing, (1, len(body) + 1), language, previous)
+            # Wrapped lines are one further down than in the file
+            pieces.append((first - 1, record))
+        return pieces
+
+
+# ---------------- Python Units ----------------
+DEFINITION_START = re.compile(r'(?:async[ \t]+def|def|class)\b')
+
+def split_python_units(lines):
+    # (first, end) line index ranges. A unit is a top-level definition with
+    # its decorators, or the module code up to the next definition. Only
+    # column 0 is looked at, so the cut is cheap; a cut inside a multi-line
+    # string or bracket makes a unit fail to parse and the caller falls back.
+    units = []
+    start = 0
+    kind = 'code'
+    for i, line in enumerate(lines):
+        if line.startswith('@'):
+            if kind != 'decorated':
+                start = _cut(units, start, i)
+                kind = 'decorated'
+        elif DEFINITION_START.match(line):
+            if kind != 'decorated':
+                start = _cut(units, start, i)
+            kind = 'definition'
+        elif line[:1] not in ('', ' ', '\t', '#', ')', ']', '}') and kind == 'definition':
+            start = _cut(units, start, i)
+            kind = 'code'
+    _cut(units, start, len(lines))
+    return units
+
+def _cut(units, start, i):
+    if i > start:
+        units.append((start, i))
+        return i
+    return start
+
+def analyze_python_unit(text):
+    ctx = AnalysisContext(text, 'Python')
+    if ctx.syntax_error is not None:
+        return {'parsed': False}
+    return {'parsed': True, 'logic': python_logic_facts(ctx), 'complexity': complexity_report_ctx(ctx),
+            'summary': python_unit_summary(ctx.tree)}
+
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+# Names the passes look up in the module's binding counts whether or not a
+# unit mentions them
+MODULE_FACT_NAMES = frozenset({'functools', 'enumerate'})
+
+def python_unit_summary(tree):
+    # This unit's share of the ModuleFacts, and the names it can see of them
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    names.update(stmt.name for stmt in tree.body if isinstance(stmt, DEFINITIONS))
+    first = tree.body[0] if tree.body else None
+    return {
+        'counts': bound_names(tree),
+        'imports': module_imports(tree),
+        'introspects': calls_introspection(tree),
+        'names': frozenset(names),
+        'leading_string': (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+                           and isinstance(first.value.value, str)),
+    }
+
+def shift_finding(finding, offset):
+    # Every line of a unit's finding moves to its place in the file
+    shifted = dict(finding, line=finding['line'] + offset, end_line=finding['end_line'] + offset)
+    if 'refs' in finding:
+        shifted['refs'] = {name: line + offset for name, line in finding['refs'].items()}
+    return shifted
+
+def optimize_python_unit(text, rest, first):
+    # The unit's optimized source as (text, starts with a definition) pieces,
+    # cut after the docstring and __future__ imports of the first unit, plus
+    # the module constants it leaves for the units after it and its final
+    # share of the module facts. rest: (counts, imports, introspects,
+    # constants) of the other units.
+    tree = ast.parse(text)
+    facts = ModuleFacts.around(tree, *rest)
+    tree, report = optimize_python_tree(tree, facts=facts)
+    body = tree.body
+    cut = import_position(tree) if first else 0
+    pieces = []
+    for statements in ((body[:cut], body[cut:]) if first else (body,)):
+        source = tree_to_source(ast.Module(body=statements, type_ignores=[]))[:-1]
+        pieces.append((source, bool(statements) and isinstance(statements[0], DEFINITIONS)))
+    constants = [(stmt.targets[0].id, stmt.value.value) for stmt in body
+                 if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name)
+                 and is_constant(stmt.value) and isinstance(stmt.value.value, IMMUTABLE_CONSTANTS)]
+    return {
+        'pieces': pieces,
+        'constants': constants,
+        'report': report,
+        'added_imports': list(facts.added_imports),
+        'complexity': analyze_python(tree),
+        'counts': bound_names(tree),
+        'imports': module_imports(tree),
+        'introspects': calls_introspection(tree),
+    }
+
+
+# ---------------- C++/Java Units ----------------
+# Only what changes the brace depth is matched: comments, literals, numbers
+# (for C++14 digit separators), directives, brackets and line ends.
+BRACE_SCAN = r'''
+    //[^\n]*
+  | /\*.*?(?:\*/|\Z)
+  | "(?:[^"\\\n]|\\[^\n])*"?
+  | '(?:[^'\\\n]|\\[^\n])*'?
+  | (?<![\w$])(?:\d|\.\d)(?:[eEpP][+-]|[\w.'])*
+  | [{}()\[\]\n]
+'''
+DIRECTIVE_SCAN = r'''
+  | ^[ \t]*\#[^\n]*(?:(?<=\\)\n[^\n]*)*
+'''
+BRACE_PATTERNS = {
+    'C++': re.compile(BRACE_SCAN + DIRECTIVE_SCAN, re.VERBOSE | re.DOTALL | re.MULTILINE),
+    'Java': re.compile(BRACE_SCAN, re.VERBOSE | re.DOTALL | re.MULTILINE),
+}
+DO_WHILE_TAIL = re.compile(r'\s*while\b')
+
+def brace_line_ends(code, language):
+    # Per line: (brace depth at its end, bracket depth at its end, lowest
+    # depth a '}' on it closed to). The depth is None for lines that end
+    # inside a block comment or directive. None if a brace closes too much.
+    ends = []
+    depth = brackets = 0
+    low = None
+    for match in BRACE_PATTERNS[language].finditer(code):
+        text = match.group()
+        if text == '\n':
+            ends.append((depth, brackets, low))
+            low = None
+        elif text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth < 0:
+                return None
+            low = depth if low is None else min(low, depth)
+        elif text in ('(', '['):
+            brackets += 1
+        elif text in (')', ']'):
+            brackets = max(0, brackets - 1)
+        elif '\n' in text:
+            for _ in range(text.count('\n')):
+                ends.append((None, brackets, low))
+                low = None
+    ends.append((depth, brackets, low))
+    return ends
+
+def split_brace_units(lines, ends, first, end, depth):
+    # Cuts after every line that closes a block back down to depth, unless
+    # the next statement continues it (do { ... } while (...);)
+    units = []
+    start = first
+    for i in range(first, end - 1):
+        line_depth, brackets, low = ends[i]
+        if line_depth == depth and brackets == 0 and low == depth and not _continues(lines, i + 1, end):
+            start = _cut(units, start, i + 1)
+    _cut(units, start, end)
+    return units
+
+def _continues(lines, i, end):
+    while i < end and not lines[i].strip():
+        i += 1
+    return i < end and DO_WHILE_TAIL.match(lines[i]) is not None
+
+def container_opening(ends, start, end):
+    # Line that opens the unit's only top-level block, if the block is
+    # opened on a line of its own and closed on the unit's last line
+    for i in range(start, end):
+        line_depth, brackets, _ = ends[i]
+        if line_depth != 0:
+            if line_depth == 1 and brackets == 0 and ends[end - 1][0] == 0:
+                return i
+            return None
+    return None
+
+CONTAINER_KINDS = ('class', 'namespace', 'extern')
+
+def analyze_cpp_java_unit(text, language, keep, previous):
+    # keep: the (first, end) lines that belong to the file, the rest is the
+    # wrapper around a class member. previous: last token before the unit,
+    # which the optimizer's rewrites look at.
+    lexed = lex(text, language)
+    optimized = []
+    for tokens in lexed.lines[keep[0]:keep[1]]:
+        tokens, previous = rewrite_cpp_java_line(tokens, language, previous)
+        # Remove empty lines
+        if tokens:
+            optimized.append(''.join(t.text for t in tokens))
+
+    # A head piece ends in the container's '{'; members get wrapped in its header
+    wrapper = None
+    blocks = [b for b in lexed.root.children if not b.implicit]
+    if blocks and blocks[-1].kind in CONTAINER_KINDS and (blocks[-1].kind != 'class' or blocks[-1].name):
+        wrapper = ' '.join(t.text for t in blocks[-1].header) + ' {'
+    return {
+        'balanced': not lexed.brace_errors,
+        'syntax': cpp_java_syntax_facts(lexed, language),
+        'logic': cpp_java_logic_facts(lexed.tokens),
+        'complexity': analyze_cpp_java(lexed),
+        'optimized': optimized,
+        'previous': previous,
+        'wrapper': wrapper,
+    }
+
+def merge_facts(parts):
+    # Line lists are shifted by each unit's offset, flags are or-ed
+    merged = {}
+    for offset, facts in parts:
+        for name, value in facts.items():
+            if isinstance(value, list):
+                merged.setdefault(name, []).extend(line + offset for line in value)
+            else:
+                merged[name] = merged.get(name, False) or value
+    return merged
@@ -0,0 +1,215 @@
+import io
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# ---------------- Stage Instrumentation ----------------
+# Pipeline stages, rules and passes are wrapped in stage(name). Outside of
+# record_stages() that costs one context variable lookup; inside, every
+# stage gets its wall time, CPU time and (optionally) peak traced allocation
+# added to the active recorder, nested stages under "parent/child" names.
+
+_recorder = ContextVar('stage_recorder', default=None)
+
+class StageRecorder:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = {}
+        self.profile = None
+        self._open = []
+
+    def as_list(self):
+        return [
+            {'stage': name, 'calls': s['calls'], 'wall_seconds': round(s['wall'], 6),
+             'cpu_seconds': round(s['cpu'], 6), 'peak_bytes': s['peak'] if self.memory else None}
+            for name, s in self.stages.items()
+        ]
+
+    def profile_summary(self, limit=25):
+        if self.profile is None:
+            return ''
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def dump_profile(self, path):
+        if self.profile is not None:
+            self.profile.dump_stats(path)
+
+    # ---- Stage frames ----
+    def _enter(self, name):
+        # Stages directly under the recorder's "total" keep their plain name
+        path = f'{self._open[-1]["path"]}/{name}' if len(self._open) > 1 else name
+        frame = {'path': path, 'peak': 0, 'base': 0}
+        # Registered on entry so parents are listed before their children
+        self.stages.setdefault(path, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': 0})
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # tracemalloc has a single peak, so the parent keeps what it saw
+            # so far and the peak is restarted for the child
+            if self._open:
+                parent = self._open[-1]
+                parent['peak'] = max(parent['peak'], peak - parent['base'])
+            tracemalloc.reset_peak()
+            frame['base'] = current
+        self._open.append(frame)
+        frame['cpu'] = time.thread_time()
+        frame['wall'] = time.perf_counter()
+        return frame
+
+    def _leave(self, frame):
+        wall = time.perf_counter() - frame['wall']
+        cpu = time.thread_time() - frame['cpu']
+        self._open.pop()
+        peak = 0
+        if self.memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1] - frame['base'])
+            if self._open:
+                parent = self._open[-1]
+                parent['peak'] = max(parent['peak'], peak + frame['base'] - parent['base'])
+            tracemalloc.reset_peak()
+        totals = self.stages[frame['path']]
+        totals['calls'] += 1
+        totals['wall'] += wall
+        totals['cpu'] += cpu
+        totals['peak'] = max(totals['peak'], peak)
+
+
+@contextmanager
+def stage(name):
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    frame = recorder._enter(name)
+    try:
+        yield
+    finally:
+        recorder._leave(frame)
+
+@contextmanager
+def record_stages(memory=False, profile=False):
+    # Collects the stages run inside the block. memory=True traces
+    # allocations (slow); profile=True also runs cProfile over the block.
+    recorder = StageRecorder(memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _recorder.set(recorder)
+    if profile:
+        # cProfile and pstats are only imported when a profile is asked for
+        import cProfile
+        recorder.profile = cProfile.Profile()
+        recorder.profile.enable()
+    try:
+        with stage('total'):
+            yield recorder
+    finally:
+        if recorder.profile is not None:
+            recorder.profile.disable()
+        _recorder.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+# ---------------- Prometheus Metrics ----------------
+# A small registry in the text exposition format. Workers send their stage
+# lists back with their results and the serving process observes them, so
+# one registry covers the whole pool.
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(2 ** k for k in range(10, 31, 2))
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        # Buckets are cumulative: every bound at or above the value counts it
+        entry = self.values.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.values.items():
+            for bound, bucket in zip(self.buckets, counts):
+                yield f'{self.name}_bucket', labels + (('le', _format_value(bound)),), bucket
+            yield f'{self.name}_bucket', labels + (('le', '+Inf'),), count
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter('code_analyzer_requests_total', 'Requests by endpoint and status')
+        self.request_seconds = Histogram('code_analyzer_request_seconds', 'Request latency', SECONDS_BUCKETS)
+        self.stage_calls = Counter('code_analyzer_stage_calls_total', 'Times a stage ran')
+        self.stage_cpu = Counter('code_analyzer_stage_cpu_seconds_total', 'CPU time spent per stage')
+        self.stage_seconds = Histogram('code_analyzer_stage_seconds', 'Wall time per stage', SECONDS_BUCKETS)
+        self.stage_peak = Histogram('code_analyzer_stage_peak_bytes', 'Peak traced allocation per stage',
+                                    BYTES_BUCKETS)
+        self.metrics = [self.requests, self.request_seconds, self.stage_calls, self.stage_cpu,
+                        self.stage_seconds, self.stage_peak]
+
+    def observe_request(self, endpoint, status, seconds):
+        with self._lock:
+            self.requests.inc((('endpoint', endpoint), ('status', status)))
+            self.request_seconds.observe((('endpoint', endpoint),), seconds)
+
+    def observe_stages(self, stages):
+        # stages: StageRecorder.as_list() from any process
+        with self._lock:
+            for record in stages:
+                labels = (('stage', record['stage']),)
+                self.stage_calls.inc(labels, record['calls'])
+                self.stage_cpu.inc(labels, record['cpu_seconds'])
+                self.stage_seconds.observe(labels, record['wall_seconds'])
+                if record['peak_bytes'] is not None:
+                    self.stage_peak.observe(labels, record['peak_bytes'])
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if labels
+                                 else f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(value)
@@ -0,0 +1,321 @@
+import re
+from collections import namedtuple
+
+# ---------------- C++/Java Lexer ----------------
+# A single left-to-right scan that understands comments, string/char
+# literals and preprocessor lines, followed by a brace tracker that turns the
+# token stream into a tree of blocks (functions, loops, classes, ...). The
+# syntax, logic, complexity and optimizer passes for C++ and Java all work on
+# this one result instead of rescanning the raw text with regexes.
+
+Token = namedtuple('Token', 'kind text line')
+
+# Every alternative is anchored on its first character and never needs to
+# backtrack into a previous token, so scanning is linear in the input size.
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<comment>//.*|/\*.*?(?:\*/|$))
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<unterminated>["'].*)
+  | (?P<number>(?:\d|\.\d)(?:[eEpP][+-]|[\w.'])*)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<op><<=|>>=|->|\+\+|--|<<|&&|\|\||::|\.\.\.|[-+*/%&|^!=<>]=|[-+*/%&|^!=<>~?:.])
+  | (?P<punct>[{}()\[\];,#@])
+  | (?P<other>.)
+''', re.VERBOSE)
+
+BLOCK_COMMENT_END = re.compile(r'\*/')
+
+# Tokens that carry no code
+TRIVIA = ('space', 'comment')
+
+LOOP_KINDS = ('for', 'while', 'do')
+CONTROL_KEYWORDS = ('for', 'while', 'if', 'switch', 'catch', 'synchronized')
+BLOCK_KEYWORDS = ('else', 'do', 'try', 'finally', 'namespace', 'static', 'extern')
+TYPE_KEYWORDS = ('class', 'struct', 'interface', 'enum', 'union')
+SPECIFIERS = ('const', 'override', 'final', 'noexcept', 'throws', 'volatile', 'mutable')
+
+def lex_lines(lines, language):
+    # Yields (line number, tokens of that line). Block comments and
+    # preprocessor continuations are carried over from one line to the next.
+    in_comment = False
+    in_directive = False
+    for lineno, line in enumerate(lines, 1):
+        tokens = []
+        pos = 0
+        if in_comment:
+            match = BLOCK_COMMENT_END.search(line)
+            if match is None:
+                if line:
+                    tokens.append(Token('comment', line, lineno))
+                yield lineno, tokens
+                continue
+            pos = match.end()
+            tokens.append(Token('comment', line[:pos], lineno))
+            in_comment = False
+        elif in_directive or (language == 'C++' and line.lstrip().startswith('#')):
+            indent = len(line) - len(line.lstrip())
+            if indent:
+                tokens.append(Token('space', line[:indent], lineno))
+            tokens.append(Token('preprocessor', line[indent:], lineno))
+            in_directive = line.endswith('\\')
+            yield lineno, tokens
+            continue
+
+        for match in TOKEN_PATTERN.finditer(line, pos):
+            kind = match.lastgroup
+            text = match.group()
+            if kind == 'comment' and text.startswith('/*') and (len(text) < 4 or not text.endswith('*/')):
+                in_comment = True
+            tokens.append(Token(kind, text, lineno))
+        yield lineno, tokens
+
+
+class Block:
+    def __init__(self, kind, header, line, start, parent, name=None, implicit=False):
+        self.kind = kind
+        self.header = header
+        self.line = line
+        self.start = start
+        self.end = None
+        self.end_line = None
+        self.parent = parent
+        self.name = name
+        self.implicit = implicit
+        self.children = []
+        if parent is not None:
+            parent.children.append(self)
+
+    def is_loop(self):
+        return self.kind in LOOP_KINDS
+
+    def walk(self):
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            yield block
+            stack.extend(reversed(block.children))
+
+    def __repr__(self):
+        return f'<Block {self.kind} {self.name or ""} line {self.line}>'
+
+
+def classify_header(header, nested_in_parens):
+    # Returns (kind, name) for the tokens in front of a '{'
+    if nested_in_parens:
+        return 'lambda', None
+    if not header:
+        return 'block', None
+    header = _strip_annotations(header)
+    if not header:
+        return 'block', None
+    texts = [t.text for t in header]
+    first = texts[0]
+    if first == 'else':
+        if len(texts) > 1 and texts[1] in CONTROL_KEYWORDS:
+            return texts[1], None
+        return 'else', None
+    # 'static' opens a block of its own only as a Java static initializer;
+    # in front of anything else it is a specifier of a declaration
+    if first in CONTROL_KEYWORDS or (first in BLOCK_KEYWORDS and (first != 'static' or len(texts) == 1)):
+        return first, None
+    if '=' in texts or texts[-1] in ('=', ',', '(', 'return'):
+        return 'initializer', None
+    if 'new' in texts:
+        return 'class', None
+
+    depth = 0
+    paren = None
+    for i, text in enumerate(texts):
+        if text in ('(', '['):
+            if depth == 0 and paren is None and text == '(':
+                paren = i
+            depth += 1
+        elif text in (')', ']'):
+            depth -= 1
+        elif depth == 0 and paren is None and text in TYPE_KEYWORDS:
+            name = texts[i + 1] if i + 1 < len(texts) and header[i + 1].kind == 'ident' else None
+            return 'class', name
+
+    if paren is not None and paren > 0 and header[paren - 1].kind == 'ident':
+        # Anything after the parameter list must be specifiers, a member
+        # initializer list (C++) or a throws clause (Java)
+        close = _matching_paren(texts, paren)
+        trailing = texts[close + 1:] if close is not None else None
+        if trailing is not None and (not trailing or trailing[0] in SPECIFIERS or trailing[0] == ':' or trailing[0] == '->'):
+            return 'function', texts[paren - 1]
+    return 'block', None
+
+def _strip_annotations(header):
+    # Java annotations (@Override, @SuppressWarnings("x")) in front of a
+    # declaration say nothing about what kind of block follows
+    i = 0
+    while i + 1 < len(header) and header[i].text == '@':
+        i += 2
+        if i < len(header) and header[i].text == '(':
+            close = _matching_paren([t.text for t in header], i)
+            i = len(header) if close is None else close + 1
+    return header[i:]
+
+def _matching_paren(texts, open_index):
+    depth = 0
+    for i in range(open_index, len(texts)):
+        if texts[i] == '(':
+            depth += 1
+        elif texts[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+class BlockBuilder:
+    # Brace tracker fed one significant token at a time. Loops without braces
+    # ("for (...) x++;") become implicit blocks that close at the end of their
+    # statement, so loop nesting is right either way.
+    def __init__(self, keep_closed=True):
+        self.root = Block('root', [], 1, 0, None)
+        self.stack = [self.root]
+        self.errors = []
+        self.keep_closed = keep_closed
+        self.index = 0
+        self._header = []
+        self._paren_depth = 0
+        self._pending_control = None
+        self._last_closed = None
+        self._prev = None
+
+    def feed(self, token):
+        text = token.text
+        kind = token.kind
+        index = self.index
+        self.index += 1
+        if kind == 'preprocessor':
+            self._header = []
+            return
+
+        if self._pending_control is not None:
+            keyword, depth = self._pending_control
+            if self._paren_depth == depth and text != '(' and self._prev is not None and self._prev.text == ')':
+                # Header of a for/while/if just closed
+                self._pending_control = None
+                if text != '{':
+                    if keyword in ('for', 'while'):
+                        block = Block(keyword, self._header, token.line, index, self.stack[-1], implicit=True)
+                        self.stack.append(block)
+                    self._header = []
+
+        if kind == 'ident' and text in CONTROL_KEYWORDS and self._pending_control is None:
+            do_terminator = (
+                text == 'while' and self._prev is not None and self._prev.text == '}' and
+                self._last_closed is not None and self._last_closed.kind == 'do'
+            )
+            if not do_terminator:
+                self._pending_control = (text, self._paren_depth)
+
+        if text == '(' or text == '[':
+            self._paren_depth += 1
+            self._header.append(token)
+        elif text == ')' or text == ']':
+            self._paren_depth = max(0, self._paren_depth - 1)
+            self._header.append(token)
+        elif text == '{':
+            block_kind, name = classify_header(self._header, self._paren_depth > 0)
+            block = Block(block_kind, self._header, token.line, index, self.stack[-1], name)
+            self.stack.append(block)
+            self._header = []
+        elif text == '}':
+            self._close_implicit(token, index)
+            if len(self.stack) == 1:
+                self.errors.append(f'Line {token.line}: Unmatched closing brace')
+            else:
+                self._close(self.stack.pop(), token, index)
+                self._close_implicit(token, index)
+            self._header = []
+        elif text == ';' and self._paren_depth == 0:
+            self._close_implicit(token, index)
+            self._header = []
+        else:
+            self._header.append(token)
+        self._prev = token
+
+    def _close(self, block, token, index):
+        block.end = index
+        block.end_line = token.line
+        self._last_closed = block
+        if not self.keep_closed:
+            block.parent.children.remove(block)
+            block.header = []
+
+    def _close_implicit(self, token, index):
+        while self.stack[-1].implicit:
+            self._close(self.stack.pop(), token, index)
+
+    def finish(self, last_line):
+        while len(self.stack) > 1:
+            block = self.stack.pop()
+            if not block.implicit:
+                self.errors.append(f'Line {block.line}: Unclosed brace')
+            block.end = self.index
+            block.end_line = last_line
+        return self.root
+
+
+class Lexed:
+    def __init__(self, lines, tokens, root, brace_errors):
+        self.lines = lines
+        self.tokens = tokens
+        self.root = root
+        self.brace_errors = brace_errors
+
+    @property
+    def unbalanced_braces(self):
+        return bool(self.brace_errors)
+
+    def has_unterminated_literal(self):
+        return any(t.kind == 'unterminated' for t in self.tokens)
+
+    def functions(self):
+        return [b for b in self.root.walk() if b.kind == 'function']
+
+    def block_tokens(self, block):
+        end = block.end if block.end is not None else len(self.tokens)
+        return self.tokens[block.start:end]
+
+
+def lex(code, language):
+    lines = []
+    tokens = []
+    builder = BlockBuilder()
+    lineno = 0
+    for lineno, line_tokens in lex_lines(code.split('\n'), language):
+        lines.append(line_tokens)
+        for token in line_tokens:
+            if token.kind not in TRIVIA:
+                tokens.append(token)
+                builder.feed(token)
+    root = builder.finish(lineno)
+    return Lexed(lines, tokens, root, builder.errors)
+
+def significant(line_tokens):
+    return [t for t in line_tokens if t.kind not in TRIVIA]
+
+# Placeholders in matches() patterns for "any identifier/number"
+IDENT = object()
+NUMBER = object()
+
+def matches(tokens, i, pattern):
+    # True if the significant tokens starting at i spell out pattern
+    if i + len(pattern) > len(tokens):
+        return False
+    for offset, expected in enumerate(pattern):
+        token = tokens[i + offset]
+        if expected is IDENT:
+            if token.kind != 'ident':
+                return False
+        elif expected is NUMBER:
+            if token.kind != 'number':
+                return False
+        elif token.text != expected:
+            return False
+    return True
@@ -0,0 +1,653 @@
+import ast
+from passes import HASHABLE_ANNOTATIONS, Pass, bound_names, contains
+
+# ---------------- Loop Rewrites ----------------
+# Rewrites that look at a loop together with the statements around it. Each
+# one fires only where it can show the program still does the same thing,
+# and reports what it did as a finding with the lines of the loop.
+
+LOOPS = (ast.For, ast.While)
+NESTED_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+# Assignments to these names are hidden from plain local analysis
+DECLARATIONS = (ast.Global, ast.Nonlocal)
+
+class BlockPass(Pass):
+    # Hands every statement list to rewrite_loop loop by loop, bottom-up.
+    # Class bodies are left alone: comprehensions there cannot see the
+    # class's own names.
+    def __init__(self, facts=None):
+        super().__init__(facts)
+        self.scopes = []
+        # try/with blocks around the current statement (exceptions raised
+        # half way through a loop stay observable inside them)
+        self.guarded = 0
+        self.loop_depth = 0
+        self._scope_facts = {}
+
+    def module_counts(self):
+        # Rewrites only add locals inside functions, so one count per run
+        # stays valid for module-level names
+        return self.module_facts(self.scopes[0]).counts
+
+    def scope_facts(self, scope):
+        # Walked once per scope. A rewrite only ever removes uses of the
+        # names it checked, so the facts stay safe to reuse as long as every
+        # name it introduces goes through bind()
+        facts = self._scope_facts.get(id(scope))
+        if facts is None or facts.scope is not scope:
+            facts = self._scope_facts[id(scope)] = ScopeFacts(scope)
+        return facts
+
+    def bind(self, name):
+        # Also in the enclosing scopes, which see nested bindings too
+        for scope in self.scopes:
+            facts = self._scope_facts.get(id(scope))
+            if facts is not None and facts.scope is scope:
+                facts.counts[name] = facts.counts.get(name, 0) + 1
+
+    def visit_scope(self, node):
+        saved = self.guarded, self.loop_depth
+        self.guarded = self.loop_depth = 0
+        self.scopes.append(node)
+        node = self.generic_visit(node)
+        self.scopes.pop()
+        self.guarded, self.loop_depth = saved
+        return node
+
+    visit_Module = visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_scope
+
+    def visit_guarded(self, node):
+        self.guarded += 1
+        node = self.generic_visit(node)
+        self.guarded -= 1
+        return node
+
+    visit_Try = visit_With = visit_AsyncWith = visit_guarded
+    if hasattr(ast, 'TryStar'):
+        visit_TryStar = visit_guarded
+
+    def visit_loop(self, node):
+        self.loop_depth += 1
+        node = self.generic_visit(node)
+        self.loop_depth -= 1
+        return node
+
+    visit_For = visit_AsyncFor = visit_While = visit_loop
+
+    def generic_visit(self, node):
+        node = super().generic_visit(node)
+        scope = self.scopes[-1] if self.scopes else None
+        if scope is None or isinstance(scope, ast.ClassDef):
+            return node
+        for field in ('body', 'orelse', 'finalbody'):
+            block = getattr(node, field, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                setattr(node, field, self.rewrite_block(block, scope))
+        return node
+
+    def rewrite_block(self, block, scope):
+        result = []
+        for stmt in block:
+            if isinstance(stmt, LOOPS):
+                # May replace the statement right before the loop in result
+                result.extend(self.rewrite_loop(stmt, result, scope))
+            else:
+                result.append(stmt)
+        return result
+
+    def rewrite_loop(self, loop, before, scope):
+        return [loop]
+
+# ---------------- Helpers ----------------
+LIST_METHODS = {'append', 'extend', 'insert', 'sort', 'reverse'}
+
+class ScopeFacts:
+    # Everything the loop rewrites ask about a scope, from one walk over it,
+    # so checking a loop costs the size of the loop and not of the scope
+    def __init__(self, scope):
+        self.scope = scope
+        self.counts = bound_names(scope)
+        self.declared = set()
+        # Name nodes by id, "name = value" statements by name and for loops
+        # or comprehensions with a plain name target, all in walk order
+        self.names = {}
+        self.assignments = {}
+        self.iterations = {}
+        # Names with a list method looked up on them
+        self.list_methods = set()
+        # "x in name" / "x not in name" comparisons by name
+        self.memberships = {}
+        self._parents = None
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Name):
+                self.names.setdefault(node.id, []).append(node)
+            elif isinstance(node, DECLARATIONS):
+                self.declared.update(node.names)
+            elif isinstance(node, ast.Attribute):
+                if isinstance(node.value, ast.Name) and node.attr in LIST_METHODS:
+                    self.list_methods.add(node.value.id)
+            elif isinstance(node, ast.Compare):
+                if (len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn))
+                        and isinstance(node.comparators[0], ast.Name)):
+                    self.memberships.setdefault(node.comparators[0].id, []).append(node)
+            elif isinstance(node, (ast.For, ast.comprehension)):
+                if isinstance(node.target, ast.Name):
+                    self.iterations.setdefault(node.target.id, []).append(node)
+            assignment = single_assignment(node)
+            if assignment is not None:
+                self.assignments.setdefault(assignment[0], []).append(node)
+
+    def uses(self, name):
+        return self.names.get(name, [])
+
+    def add_use(self, node, parent):
+        self.names.setdefault(node.id, []).append(node)
+        if self._parents is not None:
+            self._parents[id(node)] = parent
+
+    @property
+    def parents(self):
+        if self._parents is None:
+            self._parents = {}
+            for node in ast.walk(self.scope):
+                for child in ast.iter_child_nodes(node):
+                    self._parents[id(child)] = node
+        return self._parents
+
+def fresh_name(facts, base):
+    name, suffix = base, 1
+    while name in facts.counts or name in facts.names:
+        suffix += 1
+        name = f'{base}_{suffix}'
+    return name
+
+def target_names(target):
+    # Names bound by a for target, or None for anything but plain unpacking
+    if isinstance(target, ast.Name):
+        return {target.id}
+    if isinstance(target, (ast.Tuple, ast.List)):
+        names = set()
+        for element in target.elts:
+            inner = target_names(element)
+            if inner is None:
+                return None
+            names |= inner
+        return names
+    return None
+
+def name_nodes(nodes, name):
+    return [n for node in nodes for n in ast.walk(node) if isinstance(n, ast.Name) and n.id == name]
+
+def single_assignment(stmt):
+    # (name, value) for "name = value", else None
+    if (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and
+            isinstance(stmt.targets[0], ast.Name)):
+        return stmt.targets[0].id, stmt.value
+    return None
+
+def is_call_to(node, name):
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id == name and not node.keywords)
+
+def method_call(obj, attr, args):
+    return ast.Call(
+        func=ast.Attribute(value=ast.Name(id=obj, ctx=ast.Load()), attr=attr, ctx=ast.Load()),
+        args=args, keywords=[],
+    )
+
+class _Replace(ast.NodeTransformer):
+    # Swaps specific node objects for new ones
+    def __init__(self, replacements):
+        self.replacements = replacements
+
+    def visit(self, node):
+        replacement = self.replacements.get(id(node))
+        if replacement is not None:
+            return ast.copy_location(replacement, node)
+        return super().visit(node)
+
+# ---------------- List Comprehensions ----------------
+class ListComprehension(BlockPass):
+    # result = []                        result = [f(x) for x in xs if c(x)]
+    # for x in xs:                  ->
+    #     if c(x): result.append(f(x))
+    name = 'list-comprehension'
+
+    def rewrite_loop(self, loop, before, scope):
+        if self.guarded or not before or not isinstance(loop, ast.For) or loop.orelse or len(loop.body) != 1:
+            return [loop]
+        init = single_assignment(before[-1])
+        if init is None or not (isinstance(init[1], ast.List) and not init[1].elts):
+            return [loop]
+        name = init[0]
+        stmt, condition = loop.body[0], None
+        if isinstance(stmt, ast.If) and not stmt.orelse and len(stmt.body) == 1:
+            condition, stmt = stmt.test, stmt.body[0]
+        value = _appended_value(stmt, name)
+        if value is None:
+            return [loop]
+        parts = [loop.iter, value] + ([condition] if condition is not None else [])
+        # The list must not be looked at while it is being built
+        if name_nodes(parts, name) or contains(parts, (ast.NamedExpr, ast.Yield, ast.YieldFrom, ast.Await)):
+            return [loop]
+        # A comprehension keeps its loop variables to itself, so they must
+        # not be used anywhere else in the scope
+        targets = target_names(loop.target)
+        facts = self.scope_facts(scope)
+        if targets is None or name in targets or targets & facts.declared:
+            return [loop]
+        inside = {id(n) for n in ast.walk(loop)}
+        if any(id(n) not in inside for target in targets for n in facts.uses(target)):
+            return [loop]
+
+        generator = ast.comprehension(target=loop.target, iter=loop.iter,
+                                      ifs=[condition] if condition is not None else [], is_async=0)
+        before[-1] = ast.copy_location(ast.Assign(
+            targets=[ast.Name(id=name, ctx=ast.Store())],
+            value=ast.ListComp(elt=value, generators=[generator]),
+        ), before[-1])
+        self.finding(loop, f"Loop appending to '{name}' rewritten as a list comprehension")
+        return []
+
+def _appended_value(stmt, name):
+    if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)):
+        return None
+    call = stmt.value
+    func = call.func
+    if (isinstance(func, ast.Attribute) and func.attr == 'append' and isinstance(func.value, ast.Name)
+            and func.value.id == name and len(call.args) == 1 and not call.keywords
+            and not isinstance(call.args[0], ast.Starred)):
+        return call.args[0]
+    return None
+
+# ---------------- String Building ----------------
+STR_FUNCTIONS = {'str', 'repr', 'chr', 'format', 'ascii'}
+STR_METHODS = {
+    'format', 'join', 'lower', 'upper', 'strip', 'lstrip', 'rstrip', 'title', 'capitalize',
+    'casefold', 'replace', 'center', 'ljust', 'rjust', 'zfill', 'swapcase', 'expandtabs',
+}
+
+def is_str_expression(node):
+    # Only expressions that always produce a str, so joining can never fail
+    # where += would have worked
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    if isinstance(node, ast.JoinedStr):
+        return True
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id in STR_FUNCTIONS
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        return node.func.attr in STR_METHODS and is_str_expression(node.func.value)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return is_str_expression(node.left) and is_str_expression(node.right)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod):
+        return is_str_expression(node.left)
+    if isinstance(node, ast.IfExp):
+        return is_str_expression(node.body) and is_str_expression(node.orelse)
+    return False
+
+class StringJoin(BlockPass):
+    # s = ''                      s_parts = []
+    # for x in xs:           ->   for x in xs:
+    #     s += str(x)                 s_parts.append(str(x))
+    #                             s = ''.join(s_parts)
+    name = 'string-join'
+
+    def rewrite_loop(self, loop, before, scope):
+        if self.guarded or not before:
+            return [loop]
+        init = single_assignment(before[-1])
+        if init is None or not (isinstance(init[1], ast.Constant) and isinstance(init[1].value, str)):
+            return [loop]
+        name, initial = init
+        facts = self.scope_facts(scope)
+        if name in facts.declared or 'join' in facts.counts:
+            return [loop]
+        additions = [node for node in ast.walk(loop)
+                     if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name)
+                     and node.target.id == name]
+        if not additions:
+            return [loop]
+        # The string must only ever be appended to, with real strings
+        targets = {id(a.target) for a in additions}
+        if any(id(n) not in targets for n in name_nodes([loop], name)):
+            return [loop]
+        if not all(isinstance(a.op, ast.Add) and is_str_expression(a.value) for a in additions):
+            return [loop]
+
+        parts = fresh_name(facts, f'{name}_parts')
+        self.bind(parts)
+        _Replace({
+            id(a): ast.Expr(value=method_call(parts, 'append', [a.value])) for a in additions
+        }).visit(loop)
+        before[-1] = ast.copy_location(ast.Assign(
+            targets=[ast.Name(id=parts, ctx=ast.Store())],
+            value=ast.List(elts=[initial] if initial.value else [], ctx=ast.Load()),
+        ), before[-1])
+        join = ast.Assign(
+            targets=[ast.Name(id=name, ctx=ast.Store())],
+            value=ast.Call(
+                func=ast.Attribute(value=ast.Constant(value=''), attr='join', ctx=ast.Load()),
+                args=[ast.Name(id=parts, ctx=ast.Load())], keywords=[],
+            ),
+        )
+        self.finding(loop, f"String '{name}' built with += in a loop; now collected in '{parts}' and joined once")
+        return [loop, ast.copy_location(join, loop)]
+
+# ---------------- Index Loops ----------------
+SEQUENCE_ANNOTATIONS = {'list', 'tuple', 'str', 'List', 'Tuple', 'Sequence', 'MutableSequence'}
+SEQUENCE_CALLS = {'list', 'tuple', 'sorted', 'str'}
+
+def _is_sequence(facts, name):
+    scope = facts.scope
+    # Dicts also support len() and [i], but enumerate() would walk their keys
+    if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        for arg in scope.args.args + scope.args.posonlyargs + scope.args.kwonlyargs:
+            if arg.arg == name and arg.annotation is not None:
+                annotation = arg.annotation
+                if isinstance(annotation, ast.Subscript):
+                    annotation = annotation.value
+                if isinstance(annotation, ast.Attribute):
+                    return annotation.attr in SEQUENCE_ANNOTATIONS
+                return isinstance(annotation, ast.Name) and annotation.id in SEQUENCE_ANNOTATIONS
+    if name in facts.list_methods:
+        return True
+    for node in facts.assignments.get(name, ()):
+        value = node.value
+        if isinstance(value, (ast.List, ast.Tuple, ast.ListComp)):
+            return True
+        if isinstance(value, ast.Constant) and isinstance(value.value, str):
+            return True
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id in SEQUENCE_CALLS:
+            return True
+    return False
+
+def _only_read_in_place(facts, name):
+    # Every use of the name indexes it, measures it, iterates it, tests
+    # membership or calls a method on it: nothing can hold a second
+    # reference that the loop body might use to change its length
+    parents = facts.parents
+    for node in facts.uses(name):
+        parent = parents.get(id(node))
+        if not isinstance(node.ctx, ast.Load):
+            continue
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            continue
+        if isinstance(parent, ast.Attribute) and parent.value is node:
+            continue
+        if isinstance(parent, ast.Call) and is_call_to(parent, 'len') and parent.args == [node]:
+            continue
+        if isinstance(parent, (ast.For, ast.comprehension)) and parent.iter is node:
+            continue
+        if isinstance(parent, ast.Compare) and node in parent.comparators:
+            continue
+        return False
+    return True
+
+class EnumerateLoop(BlockPass):
+    # for i in range(len(xs)):         for i, x in enumerate(xs):
+    #     use(i, xs[i])           ->       use(i, x)
+    name = 'enumerate'
+
+    def rewrite_loop(self, loop, before, scope):
+        if not (isinstance(loop, ast.For) and isinstance(loop.target, ast.Name)):
+            return [loop]
+        call = loop.iter
+        if not (is_call_to(call, 'range') and len(call.args) == 1 and is_call_to(call.args[0], 'len')
+                and len(call.args[0].args) == 1 and isinstance(call.args[0].args[0], ast.Name)):
+            return [loop]
+        index, sequence = loop.target.id, call.args[0].args[0].id
+        if index == sequence or 'enumerate' in self.module_counts():
+            return [loop]
+        # xs[i] must keep meaning the same element: neither name is rebound,
+        # and xs only appears in the body as xs[i]
+        body_nodes = [n for stmt in loop.body for n in ast.walk(stmt)]
+        if any(isinstance(n, ast.Name) and n.id == index and not isinstance(n.ctx, ast.Load) for n in body_nodes):
+            return [loop]
+        reads = []
+        for node in body_nodes:
+            if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == sequence
+                    and isinstance(node.slice, ast.Name) and node.slice.id == index):
+                if not isinstance(node.ctx, ast.Load):
+                    return [loop]
+                reads.append(node)
+        if not reads or len(name_nodes(loop.body, sequence)) != len(reads):
+            return [loop]
+        facts = self.scope_facts(scope)
+        if sequence in facts.declared or not _is_sequence(facts, sequence):
+            return [loop]
+        if not _only_read_in_place(facts, sequence):
+            return [loop]
+
+        element = fresh_name(facts, _singular(sequence))
+        self.bind(element)
+        replacer = _Replace({id(node): ast.Name(id=element, ctx=ast.Load()) for node in reads})
+        loop.body = [replacer.visit(stmt) for stmt in loop.body]
+        loop.target = ast.Tuple(elts=[ast.Name(id=index, ctx=ast.Store()), ast.Name(id=element, ctx=ast.Store())],
+                                ctx=ast.Store())
+        loop.iter = ast.copy_location(ast.Call(
+            func=ast.Name(id='enumerate', ctx=ast.Load()), args=[ast.Name(id=sequence, ctx=ast.Load())], keywords=[],
+        ), loop.iter)
+        # enumerate(xs) keeps a reference to xs, so later index loops over it
+        # must see this use
+        facts.add_use(loop.iter.args[0], loop.iter)
+        self.finding(loop, f"Index loop over '{sequence}' rewritten with enumerate")
+        return [loop]
+
+def _singular(name):
+    if name.endswith('ies') and len(name) > 3:
+        return name[:-3] + 'y'
+    if name.endswith('s') and not name.endswith('ss') and len(name) > 1:
+        return name[:-1]
+    return f'{name}_item'
+
+# ---------------- Membership Tests ----------------
+# Below this size a linear scan of a tuple is as fast as hashing
+MIN_SET_SIZE = 4
+HASHABLE_CALLS = {'str', 'int', 'float', 'len', 'ord', 'chr', 'repr', 'hash', 'bool', 'abs', 'round', 'id'}
+
+def _hashable(node, facts, seen=None):
+    # Conservative: only values that cannot be lists, dicts or sets
+    if isinstance(node, (ast.Constant, ast.JoinedStr)):
+        return True
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id in HASHABLE_CALLS
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        return node.func.attr in STR_METHODS and _hashable(node.func.value, facts, seen)
+    if isinstance(node, ast.BinOp):
+        return _hashable(node.left, facts, seen) and _hashable(node.right, facts, seen)
+    if isinstance(node, ast.Tuple):
+        return all(_hashable(e, facts, seen) for e in node.elts)
+    if isinstance(node, ast.Name):
+        return _hashable_name(node.id, facts, seen or set())
+    return False
+
+def _hashable_name(name, facts, seen):
+    if name in seen:
+        return True
+    seen.add(name)
+    sources = 0
+    scope = facts.scope
+    if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        for arg in scope.args.args + scope.args.posonlyargs + scope.args.kwonlyargs:
+            if arg.arg == name:
+                annotation = arg.annotation
+                if not (isinstance(annotation, ast.Name) and annotation.id in HASHABLE_ANNOTATIONS):
+                    return False
+                sources += 1
+    understood = set()
+    for node in facts.iterations.get(name, ()):
+        # Iterating a range or a string only ever yields ints or strings
+        iterable = node.iter
+        if not (is_call_to(iterable, 'range') or
+                (isinstance(iterable, ast.Constant) and isinstance(iterable.value, str)) or
+                (isinstance(iterable, ast.Name) and _is_str_name(iterable.id, facts))):
+            return False
+        understood.add(id(node.target))
+        sources += 1
+    for node in facts.assignments.get(name, ()):
+        if not _hashable(node.value, facts, seen):
+            return False
+        understood.add(id(node.targets[0]))
+        sources += 1
+    # Bound some other way (unpacking, with, except, augmented assignment...)
+    if any(not isinstance(n.ctx, ast.Load) and id(n) not in understood for n in facts.uses(name)):
+        return False
+    return sources > 0
+
+def _is_str_name(name, facts):
+    scope = facts.scope
+    if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        for arg in scope.args.args + scope.args.posonlyargs + scope.args.kwonlyargs:
+            if arg.arg == name:
+                return isinstance(arg.annotation, ast.Name) and arg.annotation.id == 'str'
+    values = [node.value for node in facts.assignments.get(name, ())]
+    return bool(values) and all(is_str_expression(v) for v in values)
+
+class SetMembership(BlockPass):
+    # A list or tuple literal that is only ever used for "x in ..." tests
+    # inside a loop becomes a set literal, built once where it was defined
+    name = 'set-membership'
+
+    def rewrite_loop(self, loop, before, scope):
+        if not isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return [loop]
+        facts = None
+        for node in ast.walk(loop):
+            if not (isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn))
+                    and isinstance(node.comparators[0], ast.Name)):
+                continue
+            name = node.comparators[0].id
+            if facts is None:
+                facts = self.scope_facts(scope)
+            if facts.counts.get(name) != 1 or name in facts.declared:
+                continue
+            definition = self._definition(facts, name)
+            if definition is None:
+                continue
+            tests = self._membership_tests(facts, name)
+            if tests is None or not all(_hashable(test.left, facts) for test in tests):
+                continue
+            kind = 'list' if isinstance(definition.value, ast.List) else 'tuple'
+            definition.value = ast.copy_location(ast.Set(elts=definition.value.elts), definition.value)
+            self.finding(loop, f"Membership tests against '{name}' (line {{definition}}) "
+                               f"use a set instead of a {kind}", definition=definition.lineno)
+        return [loop]
+
+    def _definition(self, facts, name):
+        assignments = facts.assignments.get(name)
+        if not assignments:
+            return None
+        node = assignments[0]
+        value = node.value
+        if (isinstance(value, (ast.List, ast.Tuple)) and len(value.elts) >= MIN_SET_SIZE and
+                all(isinstance(e, ast.Constant) for e in value.elts)):
+            return node
+        return None
+
+    def _membership_tests(self, facts, name):
+        # Every read of the name must be the right side of in / not in
+        tests = facts.memberships.get(name, [])
+        comparators = {id(test.comparators[0]) for test in tests}
+        for node in facts.uses(name):
+            if isinstance(node.ctx, ast.Load) and id(node) not in comparators:
+                return None
+        return tests
+
+# ---------------- Loop-Invariant Lookups ----------------
+CONTAINER_METHODS = {
+    'append', 'extend', 'insert', 'pop', 'add', 'discard', 'remove', 'update', 'get', 'setdefault',
+}
+CONTAINER_VALUES = (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+HOISTABLE_BUILTINS = {
+    'len', 'abs', 'min', 'max', 'isinstance', 'int', 'float', 'str', 'round', 'sorted', 'sum', 'ord', 'chr',
+}
+
+class HoistLookups(BlockPass):
+    # Inside a function, method lookups on containers created there, module
+    # attribute lookups (math.sqrt) and builtin lookups (len) in the
+    # outermost loop are done once, before it. Modules are assumed not to be
+    # monkeypatched while the loop runs.
+    name = 'hoist-lookups'
+
+    def rewrite_loop(self, loop, before, scope):
+        if self.loop_depth or not isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return [loop]
+        if contains([loop], NESTED_SCOPES + DECLARATIONS):
+            return [loop]
+        imports = self.module_facts(self.scopes[0]).imports
+        module_counts = self.module_counts()
+        facts = self.scope_facts(scope)
+        local_counts = facts.counts
+        # Names rebound in the loop, or with an attribute assigned there
+        stored = set()
+        for n in ast.walk(loop):
+            if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load):
+                stored.add(n.id)
+            elif isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name) and not isinstance(n.ctx, ast.Load):
+                stored.add(n.value.id)
+
+        lookups = {}
+        for node in ast.walk(loop):
+            if not isinstance(node, ast.Call):
+                continue
+            func = node.func
+            if isinstance(func, ast.Name) and func.id in HOISTABLE_BUILTINS:
+                if func.id in module_counts or func.id in local_counts:
+                    continue
+                key = func.id
+            elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+                obj = func.value.id
+                if obj in stored:
+                    continue
+                if not (self._is_module(imports, module_counts, local_counts, obj) or
+                        (func.attr in CONTAINER_METHODS and self._is_local_container(before, local_counts, obj))):
+                    continue
+                key = (obj, func.attr)
+            else:
+                continue
+            lookups.setdefault(key, []).append(node)
+        # The iterable of a for loop is evaluated once anyway, so lookups
+        # that appear only there (range(len(xs))) gain nothing
+        if isinstance(loop, ast.For):
+            header = {id(n) for n in ast.walk(loop.iter)}
+            lookups = {key: calls for key, calls in lookups.items()
+                       if not all(id(call) in header for call in calls)}
+        if not lookups:
+            return [loop]
+
+        hoisted = []
+        labels = []
+        replacements = {}
+        for key, calls in lookups.items():
+            if isinstance(key, str):
+                local = fresh_name(facts, f'_{key}')
+                value = ast.Name(id=key, ctx=ast.Load())
+                labels.append(f'{local} = {key}')
+            else:
+                local = fresh_name(facts, f'{key[0]}_{key[1]}')
+                value = ast.Attribute(value=ast.Name(id=key[0], ctx=ast.Load()), attr=key[1], ctx=ast.Load())
+                labels.append(f'{local} = {key[0]}.{key[1]}')
+            self.bind(local)
+            hoisted.append(ast.copy_location(ast.Assign(targets=[ast.Name(id=local, ctx=ast.Store())], value=value), loop))
+            for call in calls:
+                replacements[id(call.func)] = ast.Name(id=local, ctx=ast.Load())
+        _Replace(replacements).visit(loop)
+        self.finding(loop, f"Loop-invariant lookups hoisted out of the loop: {', '.join(labels)}")
+        return hoisted + [loop]
+
+    def _is_module(self, imports, module_counts, local_counts, name):
+        return name not in local_counts and module_counts.get(name) == 1 and name in imports
+
+    def _is_local_container(self, before, local_counts, name):
+        if local_counts.get(name) != 1:
+            return False
+        for stmt in before:
+            assignment = single_assignment(stmt)
+            if assignment is not None and assignment[0] == name:
+                value = assignment[1]
+                return isinstance(value, CONTAINER_VALUES) or (
+                    isinstance(value, ast.Call) and isinstance(value.func, ast.Name)
+                    and value.func.id in ('list', 'dict', 'set') and not value.keywords)
+        return False
+
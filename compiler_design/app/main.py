@@ -1,15 +1,104 @@
+import os
+import tempfile
+from functools import partial
 import streamlit as st
-from analyzer import detect_syntax_errors, detect_logical_errors
-from complexity import analyze_time_complexity, analyze_space_complexity
-from optimizer import optimize_code
+from budget import Budget, run_cached_budgeted, run_in_worker
+from cache import ResultCache
+from pipeline import run_cached_pipeline
+from incremental import IncrementalPipeline
+from instrumentation import record_stages, stage
+# The opt-in stages that run the submission (speedup, empirical, vectorize,
+# hotspots) are imported where they are used; empirical pulls in NumPy.
 
-def add_line_numbers(code):
+@st.cache_resource
+def get_result_cache():
+    # One cache per server process, shared by every session. Set
+    # CODE_ANALYZER_CACHE to a file path to keep results across restarts.
+    return ResultCache(
+        path=os.environ.get('CODE_ANALYZER_CACHE'),
+        max_bytes=int(os.environ.get('CODE_ANALYZER_CACHE_MB', '64')) * 1024 * 1024
+    )
+
+@st.cache_resource
+def get_incremental_pipeline():
+    # Per-unit results of every file seen by this process, so re-running
+    # after an edit only analyzes the definitions that changed
+    return IncrementalPipeline()
+
+HEAT_BLOCKS = ' ▏▎▍▌▋▊▉█'
+
+def heat_bar(share, hottest, width=4):
+    # Bar relative to the hottest line, in eighths of a character
+    eighths = round(share / hottest * width * 8) if hottest else 0
+    full, part = divmod(eighths, 8)
+    return ('█' * full + (HEAT_BLOCKS[part] if part else '')).ljust(width)
+
+def add_line_numbers(code, heat=None):
+    # heat: {line number: share of the run time}, shown as a bar and a
+    # percentage between the line number and the code
     if not code:
         return ""
     lines = code.split('\n')
-    numbered_lines = [f"{i+1:3d} | {line}" for i, line in enumerate(lines)]
+    if not heat:
+        numbered_lines = [f"{i+1:3d} | {line}" for i, line in enumerate(lines)]
+        return '\n'.join(numbered_lines)
+    hottest = max(heat.values())
+    numbered_lines = []
+    for i, line in enumerate(lines):
+        share = heat.get(i + 1)
+        cell = f"{heat_bar(share, hottest)} {share:6.1%}" if share is not None else ' ' * 11
+        numbered_lines.append(f"{i+1:3d} {cell} | {line}")
     return '\n'.join(numbered_lines)
 
+def show_findings(findings):
+    for finding in findings:
+        lines = (f"line {finding['line']}" if finding['line'] == finding['end_line']
+                 else f"lines {finding['line']}-{finding['end_line']}")
+        st.write(f"**{finding['rule']}** ({lines}): {finding['message']}")
+
+def show_hotspots(code, profile, findings):
+    from hotspots import hottest_lines, line_heat
+    with st.expander('Line hotspots', expanded=True):
+        if profile['truncated']:
+            st.warning('The time budget ran out; the lines below are what ran before it did.')
+        if profile['error']:
+            st.caption(f"The program stopped with {profile['error']}")
+        if not profile['lines']:
+            st.write('No lines of the submission ran.')
+            return
+        st.code(add_line_numbers(code, line_heat(profile)), language='python')
+        for row in hottest_lines(profile, findings):
+            st.write(f"**line {row['line']}**: {row['share']:.1%} of the time, {row['hits']} runs")
+            for finding in row['findings']:
+                st.caption(f"{finding['rule']} (line {finding['line']}): {finding['message']}")
+
+def show_budget(results):
+    report = results.get('budget')
+    if not report or not (report['exceeded'] or report['cancelled']):
+        return
+    st.warning('Parts of this analysis ran out of their budget; raise the limits in the sidebar '
+               'to get complete results.')
+    for record in report['stages']:
+        if record['status'] != 'ok':
+            st.caption(f"{record['stage']}: {record['status']} ({record['reason']})")
+
+def show_timings(recorder):
+    timings = recorder.as_list()
+    with st.expander('Timing breakdown'):
+        if len(timings) == 1:
+            st.caption('Served from the result cache.')
+        st.table(timings)
+        summary = recorder.profile_summary()
+        if summary:
+            st.text(summary)
+            with tempfile.TemporaryDirectory() as workdir:
+                path = os.path.join(workdir, 'analysis.prof')
+                recorder.dump_profile(path)
+                with open(path, 'rb') as f:
+                    dump = f.read()
+            st.download_button('Download cProfile dump', data=dump, file_name='analysis.prof',
+                               mime='application/octet-stream')
+
 def main():
     st.set_page_config(
         page_title='Code Analyzer',
@@ -26,6 +115,28 @@ def main():
         ['Python', 'C++', 'Java']
     )
 
+    # Measuring speedups executes the submission, so it is opt-in
+    verify = measure = vectorize = hotspots = False
+    entry = ''
+    if language == 'Python':
+        verify = st.sidebar.checkbox('Verify speedups (runs your code)')
+        hotspots = st.sidebar.checkbox('Find hot lines (runs your code)')
+        if verify or hotspots:
+            entry = st.sidebar.text_input('Entry call (optional)', placeholder='main()')
+        measure = st.sidebar.checkbox('Measure complexity empirically (runs your code)')
+        vectorize = st.sidebar.checkbox('Suggest NumPy vectorization')
+    profile = st.sidebar.checkbox('Profile the analysis (cProfile, allocations)')
+    budget = None
+    # Off by default: the worker process starts a fresh interpreter per run
+    # and analyzes the whole file, while without limits the in-process
+    # incremental pipeline only re-analyzes what an edit changed
+    if st.sidebar.checkbox('Limit time and memory per stage',
+                           help='Runs the analysis in a separate process that is stopped when a stage '
+                                'runs out of its budget. Without limits, edits are analyzed incrementally.'):
+        seconds = st.sidebar.number_input('Seconds per stage', min_value=0.5, value=10.0, step=0.5)
+        memory_mb = st.sidebar.number_input('Memory per stage (MB)', min_value=64, value=1024, step=64)
+        budget = Budget(seconds, memory_mb)
+
     # Main content area with line numbers
     code = st.text_area(
         'Enter your code here:',
@@ -44,37 +155,139 @@ def main():
             return
 
         try:
-            # Create columns for different analyses
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.subheader('Syntax Analysis')
-                syntax_result = detect_syntax_errors(code, language)
-                st.info(syntax_result)
-
-                st.subheader('Logical Analysis')
-                logic_result = detect_logical_errors(code, language)
-                st.info(logic_result)
-
-            with col2:
-                st.subheader('Complexity Analysis')
-                time_complexity = analyze_time_complexity(code, language)
-                space_complexity = analyze_space_complexity(code, language)
-                st.info(f'Time Complexity: {time_complexity}')
-                st.info(f'Space Complexity: {space_complexity}')
-
-            # Code Optimization
-            st.subheader('Code Optimization')
-            optimized_code = optimize_code(code, language)
-            st.code(add_line_numbers(optimized_code), language=language.lower())
-
-            # Add download button for optimized code
-            st.download_button(
-                label='Download Optimized Code',
-                data=optimized_code,
-                file_name=f'optimized_code.{language.lower()}',
-                mime='text/plain'
-            )
+            with record_stages(memory=profile, profile=profile) as recorder:
+                # Identical submissions are answered from the cache. Without a
+                # budget, edited ones only re-analyze the units that changed;
+                # with one, the analysis runs in a worker process, which is
+                # killed if Stop is pressed meanwhile.
+                if budget is not None:
+                    status = st.empty()
+
+                    def progress(name, seconds):
+                        status.caption(f'Running the {name} stage ({seconds:.1f}s)...')
+
+                    results = run_cached_budgeted(get_result_cache(), code, language,
+                                                  partial(run_in_worker, budget=budget, progress=progress))
+                    status.empty()
+                    show_budget(results)
+                else:
+                    results = run_cached_pipeline(get_result_cache(), code, language,
+                                                  compute=get_incremental_pipeline())
+
+                # Create columns for different analyses
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.subheader('Syntax Analysis')
+                    st.info(results['syntax'])
+
+                    st.subheader('Logical Analysis')
+                    st.info(results['logic'])
+
+                with col2:
+                    st.subheader('Complexity Analysis')
+                    st.info(f"Time Complexity: {results['time_complexity']}")
+                    st.info(f"Space Complexity: {results['space_complexity']}")
+
+                    measured = {}
+                    if measure and results['functions']:
+                        from empirical import empirical_report
+                        with st.spinner('Timing functions on growing inputs...'):
+                            with stage('empirical'):
+                                measured = {m['function']: m for m in empirical_report(code)}
+
+                    if results['functions']:
+                        with st.expander('Per-function complexity', expanded=bool(measured)):
+                            for function in results['functions']:
+                                st.write(f"`{function['name']}` (line {function['line']}): "
+                                         f"Time {function['time']}, Space {function['space']}")
+                                if function['recurrence']:
+                                    st.caption(function['recurrence'])
+                                empirical = measured.get(function['name'])
+                                if empirical and 'error' in empirical:
+                                    st.caption(f"Measured: {empirical['error']}")
+                                elif empirical:
+                                    st.caption(
+                                        f"Measured up to n={empirical['sizes'][-1]}: "
+                                        f"Time {empirical['time']['class']} (R²={empirical['time']['r_squared']}), "
+                                        f"Space {empirical['space']['class']} (R²={empirical['space']['r_squared']})"
+                                    )
+
+                # Code Optimization
+                st.subheader('Code Optimization')
+                optimized_code = results['optimized_code']
+                passes = results.get('optimization_passes')
+                changes = results.get('complexity_changes', [])
+                if verify and passes:
+                    from speedup import optimize_python_verified
+                    with st.spinner('Benchmarking optimizations...'):
+                        with stage('speedup verification'):
+                            optimized_code, decisions, report, changes = optimize_python_verified(
+                                code, entry.strip() or None)
+                    # Findings and complexity changes of the passes that were kept
+                    passes = report.as_dict()
+                    with st.expander('Speedup verification'):
+                        st.table(decisions)
+                st.code(add_line_numbers(optimized_code), language=language.lower())
+
+                for change in changes:
+                    st.success(f"`{change['name']}` (line {change['line']}): "
+                               f"Time {change['time_before']} → {change['time_after']}, "
+                               f"Space {change['space_before']} → {change['space_after']}")
+
+                if passes and passes.get('findings'):
+                    with st.expander(f"Performance findings ({len(passes['findings'])})", expanded=True):
+                        show_findings(passes['findings'])
+                if passes:
+                    with st.expander(f"Optimization passes ({passes['iterations']} rounds)"):
+                        st.table(passes['passes'])
+
+                if vectorize and passes:
+                    from vectorize import vectorize_python
+                    with st.spinner('Vectorizing numeric loops...'):
+                        with stage('vectorize'):
+                            vectorized_code, vectorization = vectorize_python(code, entry.strip() or None, verify)
+                    with st.expander('NumPy vectorization', expanded=bool(vectorization['findings'])):
+                        if not vectorization['findings']:
+                            st.write('No vectorizable loops found.')
+                        else:
+                            show_findings(vectorization['findings'])
+                            speedup = vectorization['speedup']
+                            if speedup and 'median_speedup' in speedup:
+                                st.write(f"Measured: {speedup['median_speedup']}x median speedup, "
+                                         f"{speedup['verdict']}")
+                            elif speedup:
+                                st.write(f"Measured: {speedup['verdict']} ({speedup['error']})")
+                            else:
+                                st.caption('Not measured: turn on "Verify speedups" to run both versions '
+                                           'and keep the vectorized one only if it gives the same results.')
+                            if vectorization['accepted']:
+                                st.code(add_line_numbers(vectorized_code), language='python')
+
+                # Hot lines are matched with the findings whose range covers them
+                if hotspots and passes:
+                    from hotspots import HotspotError, profile_lines
+                    findings = list(passes['findings'])
+                    if vectorize:
+                        findings.extend(vectorization['findings'])
+                    with st.spinner('Running your code under the line tracer...'):
+                        with stage('hotspots'):
+                            try:
+                                profile = profile_lines(code, entry.strip() or None)
+                            except HotspotError as e:
+                                profile = None
+                                st.warning(f'Line profiling failed: {e}')
+                    if profile is not None:
+                        show_hotspots(code, profile, findings)
+
+                # Add download button for optimized code
+                st.download_button(
+                    label='Download Optimized Code',
+                    data=optimized_code,
+                    file_name=f'optimized_code.{language.lower()}',
+                    mime='text/plain'
+                )
+            show_timings(recorder)
         except Exception as e:
             st.error(f'An error occurred during analysis: {str(e)}')
 
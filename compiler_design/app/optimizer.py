@@ -1,174 +1,483 @@
 import ast
-import re
-import astor
+from complexity import analyze_python, complexity_report_ctx
+from context import AnalysisContext
+from instrumentation import stage
+from lexer import TRIVIA, lex_lines
+from loops import EnumerateLoop, HoistLookups, ListComprehension, SetMembership, StringJoin
+from passes import (
+    ConstantFolding, ConstantPropagation, DeadBranchElimination, DeadCodeElimination,
+    HASHABLE_ANNOTATIONS, Pass, PassManager, UnreachableCodeElimination, bound_names, import_position,
+)
 
 def optimize_code(code, language):
-    if language == 'Python':
-        return optimize_python_code(code)
-    elif language == 'C++':
-        return optimize_cpp_code(code)
-    elif language == 'Java':
-        return optimize_java_code(code)
+    return optimize_code_ctx(AnalysisContext(code, language))
+
+def optimize_code_ctx(ctx):
+    if ctx.language == 'Python':
+        return optimize_python_ctx(ctx)
+    elif ctx.language in ('C++', 'Java'):
+        lines = enumerate(ctx.lexed.lines, 1)
+        return '\n'.join(rewrite_cpp_java_lines(lines, ctx.language))
     return "Unsupported language"
 
-def optimize_python_code(code):
+def optimize_python_code(code, passes=None):
+    return optimize_python_ctx(AnalysisContext(code, 'Python'), passes)
+
+def optimize_python_ctx(ctx, passes=None):
     try:
-        tree = ast.parse(code)
-        optimized_tree = PythonOptimizer().visit(tree)
-        return astor.to_source(optimized_tree)
+        return python_optimization_ctx(ctx, passes)[0]
     except Exception as e:
         return f"Error during optimization: {e}"
 
+def python_optimization_ctx(ctx, passes=None):
+    # (optimized source, PassReport, complexity changes). The passes rewrite
+    # the tree in place, so the optimizer takes ownership of the context's
+    # tree; the "before" complexity is taken first.
+    passes = tuple(passes or DEFAULT_PYTHON_PASSES)
+
+    def compute(ctx):
+        before = complexity_report_ctx(ctx)
+        tree, report = optimize_python_tree(ctx.detach_tree(), passes)
+        return tree_to_source(tree), report, complexity_changes(before, analyze_python(tree))
+    return ctx.cached(('python-optimization', passes), compute)
+
+def complexity_changes(before, after):
+    # Functions whose time or space class differs after optimization
+    optimized = {f.name: f for f in after.functions}
+    changes = []
+    for function in before.functions:
+        new = optimized.get(function.name)
+        if new is not None and (new.time, new.space) != (function.time, function.space):
+            changes.append({
+                'name': function.name, 'line': function.lineno,
+                'time_before': function.time, 'time_after': new.time,
+                'space_before': function.space, 'space_after': new.space,
+            })
+    return changes
+
+def tree_to_source(tree):
+    # ast.unparse (Python 3.9+) needs no third-party package; astor is only
+    # imported on older interpreters
+    with stage('to_source'):
+        if hasattr(ast, 'unparse'):
+            return ast.unparse(tree) + '\n'
+        import astor
+        return astor.to_source(tree)
+
+def optimize_python_tree(tree, passes=None, max_iterations=10, facts=None):
+    # facts: ModuleFacts of the whole module when tree is only one part of it
+    manager = PassManager(passes or DEFAULT_PYTHON_PASSES, max_iterations)
+    return manager.run(tree, facts)
+
 def optimize_cpp_code(code):
-    # Basic C++ optimizations
-    optimizations = [
-        # Remove unnecessary semicolons
-        (r';\s*;', ';'),
-        # Remove empty lines
-        (r'^\s*\n', ''),
-        # Remove unnecessary spaces
-        (r'\s+', ' '),
-        # Optimize for loops
-        (r'for\s*\(\s*int\s+i\s*=\s*0\s*;\s*i\s*<\s*n\s*;\s*i\+\+\)', 'for(int i = 0; i < n; ++i)'),
-        # Optimize variable declarations
-        (r'int\s+(\w+)\s*=\s*0\s*;', r'int \1{};'),
-        # Remove redundant parentheses
-        (r'\(\s*([^()]+)\s*\)', r'\1'),
-    ]
-    
-    optimized_code = code
-    for pattern, replacement in optimizations:
-        optimized_code = re.sub(pattern, replacement, optimized_code)
-    
-    return optimized_code
+    return '\n'.join(rewrite_cpp_java_lines(lex_lines(code.split('\n'), 'C++'), 'C++'))
 
 def optimize_java_code(code):
-    # Basic Java optimizations
-    optimizations = [
-        # Remove unnecessary semicolons
-        (r';\s*;', ';'),
+    return '\n'.join(rewrite_cpp_java_lines(lex_lines(code.split('\n'), 'Java'), 'Java'))
+
+# ---------------- C++/Java Token Rewrites ----------------
+# Rewrites work on the lexer's tokens one line at a time, so comments,
+# string contents and the line structure of the input are preserved.
+
+def rewrite_cpp_java_lines(lexed_lines, language):
+    previous = None
+    for lineno, tokens in lexed_lines:
+        tokens, previous = rewrite_cpp_java_line(tokens, language, previous)
         # Remove empty lines
-        (r'^\s*\n', ''),
-        # Remove unnecessary spaces
-        (r'\s+', ' '),
-        # Optimize for loops
-        (r'for\s*\(\s*int\s+i\s*=\s*0\s*;\s*i\s*<\s*n\s*;\s*i\+\+\)', 'for(int i = 0; i < n; ++i)'),
-        # Optimize string concatenation
-        (r'String\s+(\w+)\s*=\s*"([^"]*)"\s*\+\s*"([^"]*)"', r'String \1 = "\2\3"'),
-        # Remove redundant parentheses
-        (r'\(\s*([^()]+)\s*\)', r'\1'),
-    ]
-    
-    optimized_code = code
-    for pattern, replacement in optimizations:
-        optimized_code = re.sub(pattern, replacement, optimized_code)
-    
-    return optimized_code
-
-class PythonOptimizer(ast.NodeTransformer):
-    def visit_For(self, node):
-        # Optimize for loops
-        if isinstance(node.target, ast.Name) and isinstance(node.iter, ast.Call):
-            if isinstance(node.iter.func, ast.Name) and node.iter.func.id == 'range':
-                # Convert range-based for loop to while loop if more efficient
-                if len(node.iter.args) == 1:
-                    return self.optimize_range_loop(node)
-        return node
+        if tokens:
+            yield ''.join(t.text for t in tokens)
 
-    def visit_BinOp(self, node):
-        # Optimize arithmetic operations
-        if isinstance(node.left, ast.Num) and isinstance(node.right, ast.Num):
-            if isinstance(node.op, ast.Add):
-                return ast.Num(n=node.left.n + node.right.n)
-            elif isinstance(node.op, ast.Sub):
-                return ast.Num(n=node.left.n - node.right.n)
-            elif isinstance(node.op, ast.Mult):
-                return ast.Num(n=node.left.n * node.right.n)
-            elif isinstance(node.op, ast.Div):
-                if node.right.n != 0:
-                    return ast.Num(n=node.left.n / node.right.n)
-        return node
+def rewrite_cpp_java_line(tokens, language, previous):
+    # previous is the last significant token text of the lines before
+    code = [i for i, t in enumerate(tokens) if t.kind not in TRIVIA]
+    if not code or tokens[code[0]].kind == 'preprocessor':
+        return _collapse_spaces(tokens, set()), previous
 
-    def visit_Compare(self, node):
-        # Optimize comparisons
-        if len(node.ops) == 1 and len(node.comparators) == 1:
-            if isinstance(node.left, ast.Num) and isinstance(node.comparators[0], ast.Num):
-                op = node.ops[0]
-                left = node.left.n
-                right = node.comparators[0].n
-                
-                if isinstance(op, ast.Eq):
-                    return ast.Constant(value=left == right)
-                elif isinstance(op, ast.NotEq):
-                    return ast.Constant(value=left != right)
-                elif isinstance(op, ast.Lt):
-                    return ast.Constant(value=left < right)
-                elif isinstance(op, ast.LtE):
-                    return ast.Constant(value=left <= right)
-                elif isinstance(op, ast.Gt):
-                    return ast.Constant(value=left > right)
-                elif isinstance(op, ast.GtE):
-                    return ast.Constant(value=left >= right)
-        return node
+    out = list(tokens)
+    drop = set()
+    texts = [tokens[i].text for i in code]
+    pairs = _match_parens(texts)
 
-    def optimize_range_loop(self, node):
-        # Convert simple range loops to while loops
-        if len(node.body) == 1 and isinstance(node.body[0], ast.Assign):
-            # Create a while loop with a counter
-            counter = ast.Name(id='_i', ctx=ast.Store())
-            target = node.target
-            iter_arg = node.iter.args[0]
-            
-            # Create the while loop
-            while_loop = ast.While(
-                test=ast.Compare(
-                    left=counter,
-                    ops=[ast.Lt()],
-                    comparators=[iter_arg]
-                ),
-                body=[
-                    ast.Assign(
-                        targets=[target],
-                        value=counter
-                    ),
-                    ast.AugAssign(
-                        target=counter,
-                        op=ast.Add(),
-                        value=ast.Num(n=1)
-                    )
-                ],
-                orelse=[]
-            )
-            
-            # Add counter initialization
-            return ast.Module(
-                body=[
-                    ast.Assign(
-                        targets=[counter],
-                        value=ast.Num(n=0)
-                    ),
-                    while_loop
-                ]
-            )
-        return node
+    def prev_text(k):
+        return texts[k - 1] if k > 0 else previous
+
+    depth = 0
+    for k, text in enumerate(texts):
+        if text == '(':
+            depth += 1
+        elif text == ')':
+            depth = max(0, depth - 1)
+        # Remove unnecessary semicolons (never inside for(;;))
+        elif text == ';' and depth == 0 and _last_kept(texts, code, drop, k, previous) == ';':
+            drop.add(code[k])
+        # Optimize for loops: i++ -> ++i in the increment clause
+        elif text == 'for' and k + 1 < len(texts) and texts[k + 1] == '(' and k + 1 in pairs:
+            close = pairs[k + 1]
+            semis = [j for j in range(k + 2, close) if texts[j] == ';' and _depth_between(texts, k + 2, j) == 0]
+            if len(semis) == 2 and close - semis[1] == 3:
+                name, step = semis[1] + 1, semis[1] + 2
+                if tokens[code[name]].kind == 'ident' and texts[step] in ('++', '--'):
+                    out[code[name]] = tokens[code[step]]
+                    out[code[step]] = tokens[code[name]]
+        # Optimize variable declarations: int x = 0; -> int x{};
+        elif (language == 'C++' and text == 'int' and depth == 0 and
+              prev_text(k) in (None, ';', '{', '}') and
+              k + 4 < len(texts) and texts[k + 2:k + 5] == ['=', '0', ';'] and
+              tokens[code[k + 1]].kind == 'ident'):
+            for i in range(code[k + 1] + 1, code[k + 4]):
+                drop.add(i)
+            drop.discard(code[k + 2])
+            out[code[k + 2]] = tokens[code[k + 2]]._replace(text='{}')
+        # Optimize string concatenation: "a" + "b" -> "ab"
+        elif (language == 'Java' and _is_string(tokens, code, k, drop) and
+              prev_text(k) not in ('.', '-', '*', '/', '%')):
+            merged = k
+            while (merged + 2 < len(texts) and texts[merged + 1] == '+' and
+                   _is_string(tokens, code, merged + 2, drop) and
+                   (merged + 3 >= len(texts) or texts[merged + 3] not in ('.', '['))):
+                left = out[code[k]]
+                right = tokens[code[merged + 2]]
+                out[code[k]] = left._replace(text=left.text[:-1] + right.text[1:])
+                drop.update(range(code[merged] + 1, code[merged + 2] + 1))
+                merged += 2
+
+    # Remove redundant parentheses: ((x)) -> (x), return (x); -> return x;
+    for open_k, close_k in pairs.items():
+        if code[open_k] in drop or code[close_k] in drop:
+            continue
+        before = prev_text(open_k) if open_k > 0 else None
+        after = texts[close_k + 1] if close_k + 1 < len(texts) else None
+        doubled = before == '(' and after == ')' and pairs.get(open_k - 1) == close_k + 1
+        statement = (before in ('return', '=') and after == ';' and open_k > 0 and
+                     ',' not in texts[open_k + 1:close_k])
+        if doubled or statement:
+            drop.add(code[close_k])
+            if statement and before == 'return' and code[open_k] == code[open_k - 1] + 1:
+                out[code[open_k]] = tokens[code[open_k]]._replace(kind='space', text=' ')
+            else:
+                drop.add(code[open_k])
+
+    kept = [texts[k] for k in range(len(texts)) if code[k] not in drop]
+    if kept:
+        previous = kept[-1]
+    return _collapse_spaces(out, drop), previous
+
+def _collapse_spaces(tokens, drop):
+    # Remove unnecessary spaces, but keep the indentation of the line
+    result = []
+    for i, token in enumerate(tokens):
+        if i in drop:
+            continue
+        if token.kind == 'space':
+            if not result:
+                result.append(token)
+            elif result[-1].kind != 'space':
+                result.append(token._replace(text=' '))
+            continue
+        result.append(token)
+    while result and result[-1].kind == 'space':
+        result.pop()
+    return result
+
+def _match_parens(texts):
+    pairs = {}
+    stack = []
+    for k, text in enumerate(texts):
+        if text == '(':
+            stack.append(k)
+        elif text == ')' and stack:
+            pairs[stack.pop()] = k
+    return pairs
+
+def _depth_between(texts, start, end):
+    depth = 0
+    for text in texts[start:end]:
+        if text == '(':
+            depth += 1
+        elif text == ')':
+            depth -= 1
+    return depth
+
+def _last_kept(texts, code, drop, k, previous):
+    for j in range(k - 1, -1, -1):
+        if code[j] not in drop:
+            return texts[j]
+    return previous
+
+def _is_string(tokens, code, k, drop):
+    token = tokens[code[k]]
+    return code[k] not in drop and token.kind == 'string' and token.text.startswith('"')
 
-    def visit_ListComp(self, node):
-        # Optimize list comprehensions
-        if isinstance(node.elt, ast.Name):
+# ---------------- Recursion Rewrites ----------------
+# Both passes only touch module-level functions whose name is bound exactly
+# once, so a call to that name is known to be a call to the function itself.
+
+# Builtins with no side effects and no access to caller state
+PURE_BUILTINS = {
+    'abs', 'all', 'any', 'bool', 'divmod', 'float', 'frozenset', 'int', 'isinstance',
+    'len', 'max', 'min', 'pow', 'range', 'round', 'str', 'sum', 'tuple',
+}
+# Operators a list, dict or set cannot have with a number on the other side
+NUMERIC_ONLY_OPERATORS = (
+    ast.Sub, ast.Div, ast.FloorDiv, ast.Pow, ast.LShift, ast.RShift, ast.BitAnd, ast.BitOr, ast.BitXor,
+)
+ORDERING_OPERATORS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+# Anything that hides state, escapes the function or makes it a generator
+IMPURE_NODES = (
+    ast.Global, ast.Nonlocal, ast.Yield, ast.YieldFrom, ast.Await, ast.Lambda,
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom,
+    ast.Attribute, ast.Delete, ast.With, ast.AsyncWith,
+)
+
+def _is_number(node):
+    return isinstance(node, ast.Constant) and type(node.value) in (int, float)
+
+def _plain_parameters(func):
+    args = func.args
+    if args.vararg or args.kwarg or args.kwonlyargs or args.posonlyargs:
+        return None
+    return [a.arg for a in args.args]
+
+def _self_calls(func):
+    return [node for node in ast.walk(func)
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == func.name]
+
+def _body_nodes(func):
+    for stmt in func.body:
+        yield from ast.walk(stmt)
+
+def _hashable_parameters(func, params):
+    # A parameter is provably hashable if it is annotated with a hashable
+    # type or used in a way only numbers support (n - 1, n < 2, range(n))
+    counts = bound_names(func)
+    proven = set()
+    for arg in func.args.args:
+        if isinstance(arg.annotation, ast.Name) and arg.annotation.id in HASHABLE_ANNOTATIONS:
+            proven.add(arg.arg)
+    for node in _body_nodes(func):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, NUMERIC_ONLY_OPERATORS):
+            pairs = [(node.left, node.right), (node.right, node.left)]
+        elif isinstance(node, ast.Compare) and all(isinstance(op, ORDERING_OPERATORS) for op in node.ops):
+            operands = [node.left] + node.comparators
+            pairs = list(zip(operands, operands[1:])) + list(zip(operands[1:], operands))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'range':
+            pairs = [(arg, ast.Constant(value=0)) for arg in node.args]
+        else:
+            continue
+        for operand, other in pairs:
+            if isinstance(operand, ast.Name) and _is_number(other):
+                proven.add(operand.id)
+    # A rebound parameter may hold something else by the time it is used
+    return all(p in proven and counts.get(p) == 1 for p in params)
+
+def _is_pure(func, params, module_counts):
+    local_names = set(bound_names(func)) - set(params)
+    allowed = set(params) | local_names | {func.name}
+    builtins = {name for name in PURE_BUILTINS if name not in module_counts}
+    for node in _body_nodes(func):
+        if isinstance(node, IMPURE_NODES):
+            return False
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id not in allowed and node.id not in builtins:
+                return False
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and (node.func.id == func.name or node.func.id in builtins)):
+                return False
+    return True
+
+def _immutable(node, safe, func_name):
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, ast.Name):
+        return node.id in safe
+    if isinstance(node, ast.Compare):
+        return True
+    if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.IfExp, ast.Tuple)):
+        return all(_immutable(child, safe, func_name) for child in ast.iter_child_nodes(node)
+                   if isinstance(child, ast.expr))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id in ('len', 'bool', 'int', 'float', 'str', 'isinstance'):
+            return True
+        if node.func.id == func_name or node.func.id in PURE_BUILTINS:
+            return all(_immutable(arg, safe, func_name) for arg in node.args)
+    return False
+
+def _returns_immutable(func, params):
+    # Cached results are shared between callers, so a memoized function
+    # must never hand out something mutable. Locals count as immutable when
+    # every binding of them is.
+    bindings = {}
+    for node in _body_nodes(func):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    bindings.setdefault(target.id, []).append(node.value)
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)) and isinstance(node.target, ast.Name):
+            bindings.setdefault(node.target.id, []).append(node.value)
+        elif isinstance(node, ast.For) and isinstance(node.target, ast.Name):
+            is_range = (isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name)
+                        and node.iter.func.id == 'range')
+            bindings.setdefault(node.target.id, []).append(ast.Constant(value=0) if is_range else None)
+    # Any other binding form (unpacking, with-as, except-as...) is unknown
+    for name in set(bound_names(func)) - set(params):
+        bindings.setdefault(name, [None])
+    for node in _body_nodes(func):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store) and node.id not in bindings:
+            bindings[node.id] = [None]
+
+    safe = set(params)
+    grew = True
+    while grew:
+        grew = False
+        for name, values in bindings.items():
+            if name not in safe and all(v is not None and _immutable(v, safe | {name}, func.name) for v in values):
+                safe.add(name)
+                grew = True
+    return all(node.value is None or _immutable(node.value, safe, func.name)
+               for node in _body_nodes(func) if isinstance(node, ast.Return))
+
+# Results a memoized function keeps. Bounded, so a long-running program
+# cannot grow the cache without limit; least recently used ones go first.
+MEMO_CACHE_SIZE = 65536
+
+class Memoization(Pass):
+    # Tree recursion (two or more self-calls) in a pure function with
+    # hashable arguments recomputes the same subproblems over and over;
+    # functools.lru_cache turns that into one evaluation per argument tuple.
+    name = 'memoization'
+
+    def visit_Module(self, node):
+        facts = self.module_facts(node)
+        module_counts = facts.counts
+        has_import = facts.imports.get('functools') == 'functools'
+        # "functools" must mean the module, whether imported already or by us
+        if module_counts.get('functools') is not None and not has_import:
             return node
+        memoized = False
+        for stmt in node.body:
+            if isinstance(stmt, ast.FunctionDef) and self._can_memoize(stmt, module_counts):
+                stmt.decorator_list.append(ast.Call(
+                    func=ast.Attribute(value=ast.Name(id='functools', ctx=ast.Load()), attr='lru_cache', ctx=ast.Load()),
+                    args=[], keywords=[ast.keyword(arg='maxsize', value=ast.Constant(value=MEMO_CACHE_SIZE))],
+                ))
+                self.finding(stmt, f"Tree recursion in '{stmt.name}' memoized with "
+                                   f"functools.lru_cache(maxsize={MEMO_CACHE_SIZE}): repeated calls are answered "
+                                   f"from the {MEMO_CACHE_SIZE} most recent results")
+                memoized = True
+        if memoized and not has_import:
+            if facts.partial:
+                # The caller puts it at the top of the whole module
+                facts.added_imports.append('functools')
+            else:
+                node.body.insert(import_position(node), ast.Import(names=[ast.alias(name='functools')]))
         return node
 
-    def visit_DictComp(self, node):
-        # Optimize dictionary comprehensions
-        if isinstance(node.key, ast.Name) and isinstance(node.value, ast.Name):
+    def _can_memoize(self, func, module_counts):
+        if func.decorator_list or module_counts.get(func.name) != 1:
+            return False
+        params = _plain_parameters(func)
+        if not params or len(_self_calls(func)) < 2:
+            return False
+        return (_hashable_parameters(func, params) and _is_pure(func, params, module_counts)
+                and _returns_immutable(func, params))
+
+class _TailCallRewriter(ast.NodeTransformer):
+    def __init__(self, func, params):
+        self.func = func
+        self.params = params
+
+    def visit_Return(self, node):
+        if not (isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name)
+                and node.value.func.id == self.func.name):
             return node
+        args = node.value.args
+        if len(self.params) == 1:
+            target, value = ast.Name(id=self.params[0], ctx=ast.Store()), args[0]
+        else:
+            target = ast.Tuple(elts=[ast.Name(id=p, ctx=ast.Store()) for p in self.params], ctx=ast.Store())
+            value = ast.Tuple(elts=list(args), ctx=ast.Load())
+        return [ast.copy_location(ast.Assign(targets=[target], value=value), node),
+                ast.copy_location(ast.Continue(), node)]
+
+def _always_exits(stmts):
+    last = stmts[-1]
+    if isinstance(last, ast.If):
+        return bool(last.orelse) and _always_exits(last.body) and _always_exits(last.orelse)
+    return isinstance(last, (ast.Return, ast.Raise, ast.Continue))
+
+class TailRecursionElimination(Pass):
+    # "return f(...)" as the only kind of self-call becomes a rebinding of
+    # the parameters and another trip round a "while True" loop, so the
+    # recursion depth limit no longer applies and no frames are pushed.
+    name = 'tail-recursion'
+
+    def visit_Module(self, node):
+        module_counts = self.module_facts(node).counts
+        for stmt in node.body:
+            if isinstance(stmt, ast.FunctionDef) and module_counts.get(stmt.name) == 1:
+                self._rewrite(stmt)
         return node
 
-    def visit_If(self, node):
-        # Optimize if statements
-        if isinstance(node.test, ast.Constant):
-            if node.test.value:
-                return node.body
-            else:
-                return node.orelse
-        return node
\ No newline at end of file
+    def _rewrite(self, func):
+        params = _plain_parameters(func)
+        calls = _self_calls(func)
+        if params is None or not calls or func.decorator_list:
+            return
+        if any(isinstance(n, (ast.Yield, ast.YieldFrom, ast.Await, ast.Lambda, ast.FunctionDef,
+                              ast.AsyncFunctionDef, ast.ClassDef, ast.Global, ast.Nonlocal))
+               for n in _body_nodes(func)):
+            return
+        tail_calls = self._tail_calls(func.body)
+        for call in calls:
+            if id(call) not in tail_calls or call.keywords or len(call.args) != len(params):
+                return
+            if any(isinstance(arg, ast.Starred) for arg in call.args):
+                return
+
+        body = func.body
+        docstring = []
+        if isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+            docstring, body = body[:1], body[1:]
+        rewriter = _TailCallRewriter(func, params)
+        loop_body = []
+        for stmt in body:
+            result = rewriter.visit(stmt)
+            loop_body.extend(result if isinstance(result, list) else [result])
+        if isinstance(loop_body[-1], ast.Continue):
+            loop_body.pop()
+        # Falling off the end of the loop body must still return None
+        elif not _always_exits(loop_body):
+            loop_body.append(ast.Return(value=None))
+        loop = ast.While(test=ast.Constant(value=True), body=loop_body, orelse=[])
+        func.body = docstring + [ast.copy_location(loop, body[0])]
+        self.finding(func, f"Tail recursion in '{func.name}' turned into a loop: no stack frame per call "
+                           f"and no recursion depth limit")
+
+    def _tail_calls(self, stmts):
+        # Tail calls may sit in if/else blocks at any depth, but not inside
+        # loops (continue would bind to them) or try/with (handlers would
+        # see exceptions from the next "call")
+        found = set()
+        for stmt in stmts:
+            if isinstance(stmt, ast.Return) and isinstance(stmt.value, ast.Call):
+                found.add(id(stmt.value))
+            elif isinstance(stmt, ast.If):
+                found |= self._tail_calls(stmt.body) | self._tail_calls(stmt.orelse)
+        return found
+
+DEFAULT_PYTHON_PASSES = [
+    ConstantPropagation,
+    ConstantFolding,
+    DeadBranchElimination,
+    UnreachableCodeElimination,
+    DeadCodeElimination,
+    TailRecursionElimination,
+    Memoization,
+    # String building first, so the append loop it leaves behind can still
+    # become a comprehension before any lookups are hoisted out of it
+    StringJoin,
+    ListComprehension,
+    EnumerateLoop,
+    SetMembership,
+    HoistLookups,
+]
@@ -0,0 +1,493 @@
+import ast
+import operator
+import time
+from instrumentation import stage
+
+# ---------------- Pass Manager ----------------
+# Each pass is a NodeTransformer that recurses through the whole tree and
+# counts what it changed. The manager runs the configured passes in order,
+# over and over, until a full round changes nothing (or a round limit is hit).
+
+class Pass(ast.NodeTransformer):
+    name = 'pass'
+
+    def __init__(self, facts=None):
+        self.changes = 0
+        self.findings = []
+        self._facts = facts
+
+    def module_facts(self, module):
+        # Worked out from the tree, unless the caller passed them in because
+        # the tree is only one part of the module
+        if self._facts is None:
+            self._facts = ModuleFacts.of(module)
+        return self._facts
+
+    def changed(self, count=1):
+        self.changes += count
+
+    def finding(self, node, message, **refs):
+        # A rewrite worth reporting on its own, with the lines it covers.
+        # refs: other lines the message mentions, as {name} fields of it; the
+        # message is only formatted once the lines are final (format_finding)
+        record = {
+            'rule': self.name, 'line': node.lineno,
+            'end_line': getattr(node, 'end_lineno', None) or node.lineno, 'message': message,
+        }
+        if refs:
+            record['refs'] = refs
+        self.findings.append(record)
+        self.changed()
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        # Removing statements must never leave a block empty
+        for field in ('body', 'orelse', 'finalbody'):
+            block = getattr(node, field, None)
+            if block == [] and requires_body(node, field):
+                setattr(node, field, [ast.copy_location(ast.Pass(), node)])
+        return node
+
+def requires_body(node, field):
+    if isinstance(node, ast.Module):
+        return False
+    if field == 'body':
+        return True
+    # A try statement needs handlers or a finally block
+    return isinstance(node, ast.Try) and field == 'finalbody' and not node.handlers
+
+class PassStats:
+    def __init__(self, name):
+        self.name = name
+        self.changes = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {'pass': self.name, 'changes': self.changes, 'seconds': round(self.seconds, 6)}
+
+class PassReport:
+    def __init__(self, stats, iterations, converged, findings=()):
+        self.stats = stats
+        self.iterations = iterations
+        self.converged = converged
+        self.findings = sorted(findings, key=lambda f: (f['line'], f['rule']))
+
+    @property
+    def total_changes(self):
+        return sum(s.changes for s in self.stats)
+
+    def as_dict(self):
+        return {
+            'iterations': self.iterations,
+            'converged': self.converged,
+            'passes': [s.as_dict() for s in self.stats],
+            'findings': [format_finding(f) for f in self.findings],
+        }
+
+def format_finding(finding):
+    refs = finding.get('refs')
+    return dict(finding, message=finding['message'].format(**refs)) if refs else finding
+
+class PassManager:
+    def __init__(self, passes, max_iterations=10):
+        self.passes = list(passes)
+        self.max_iterations = max_iterations
+
+    def run(self, tree, facts=None):
+        stats = [PassStats(p.name) for p in self.passes]
+        findings = []
+        iterations = 0
+        converged = False
+        while iterations < self.max_iterations:
+            iterations += 1
+            round_changes = 0
+            for pass_class, stat in zip(self.passes, stats):
+                instance = pass_class(facts)
+                start = time.perf_counter()
+                with stage(f'pass:{pass_class.name}'):
+                    tree = instance.visit(tree)
+                stat.seconds += time.perf_counter() - start
+                stat.changes += instance.changes
+                findings.extend(instance.findings)
+                round_changes += instance.changes
+                if instance.changes and facts is not None:
+                    facts.refresh(tree)
+            if not round_changes:
+                converged = True
+                break
+        ast.fix_missing_locations(tree)
+        return tree, PassReport(stats, iterations, converged, findings)
+
+# ---------------- Helpers ----------------
+SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+# Statements that can never be dropped without changing what a function is
+# (a generator, or where its names live)
+SCOPE_CHANGING = (ast.Yield, ast.YieldFrom, ast.Global, ast.Nonlocal)
+# Calls that can read or write local variables behind our back
+INTROSPECTION_CALLS = ('locals', 'vars', 'exec', 'eval')
+# Annotations whose values can always be hashed
+HASHABLE_ANNOTATIONS = {'int', 'float', 'complex', 'bool', 'str', 'bytes', 'tuple', 'frozenset'}
+
+def is_constant(node):
+    return isinstance(node, ast.Constant)
+
+def contains(nodes, types):
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, types):
+                return True
+    return False
+
+def bound_names(scope):
+    # How often each name is bound anywhere under scope, counting every form
+    # of binding and global/nonlocal declarations in nested scopes
+    counts = {}
+
+    def bind(name, times=1):
+        counts[name] = counts.get(name, 0) + times
+
+    for node in ast.walk(scope):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bind(node.id)
+        elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            bind(node.target.id)
+        elif isinstance(node, ast.arg):
+            bind(node.arg)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            for name in node.names:
+                bind(name, 2)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node is not scope:
+            bind(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                bind(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bind(node.name)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bind(node.name)
+    return counts
+
+def module_imports(module):
+    # {name: module} for the names a module-level "import" binds to a module
+    imports = {}
+    for stmt in module.body:
+        if isinstance(stmt, ast.Import):
+            for alias in stmt.names:
+                if alias.asname or '.' not in alias.name:
+                    imports[alias.asname or alias.name] = alias.name
+    return imports
+
+def calls_introspection(scope):
+    return any(isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id in INTROSPECTION_CALLS
+               for n in ast.walk(scope))
+
+class ModuleFacts:
+    # What passes need to know about the whole module: how often each name
+    # is bound, which names are imported modules and whether anything calls
+    # locals()/eval() and friends. When the tree is one unit of a bigger
+    # module (incremental.py), the caller passes the facts of the other
+    # units, which the unit's own are added to again whenever a pass changed
+    # it, and the constants module code bound before it; imports a pass
+    # wants at the top of the module are then collected in added_imports.
+    def __init__(self, counts, imports, introspects=None, constants=None, partial=False):
+        self.counts = counts
+        self.imports = imports
+        # None until somebody needs to know
+        self.introspects = introspects
+        self.constants = constants or {}
+        self.partial = partial
+        self.added_imports = []
+        self.rest = None
+
+    @classmethod
+    def of(cls, module):
+        return cls(bound_names(module), module_imports(module))
+
+    @classmethod
+    def around(cls, module, counts, imports, introspects, constants):
+        # Facts of a module of which module is one unit, given those of the others
+        facts = cls({}, {}, constants=constants, partial=True)
+        facts.rest = (counts, imports, introspects)
+        facts.refresh(module)
+        return facts
+
+    def refresh(self, module):
+        # Called after a pass changed module; facts worked out by the passes
+        # themselves are never stale
+        if self.rest is None:
+            return
+        counts, imports, introspects = self.rest
+        self.counts = dict(counts)
+        for name, times in bound_names(module).items():
+            self.counts[name] = self.counts.get(name, 0) + times
+        self.imports = dict(imports)
+        self.imports.update(module_imports(module))
+        self.introspects = introspects or calls_introspection(module)
+
+def import_position(module):
+    # After the docstring and any __future__ imports
+    position = 0
+    for i, stmt in enumerate(module.body):
+        if i == 0 and isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str):
+            position = 1
+        elif isinstance(stmt, ast.ImportFrom) and stmt.module == '__future__':
+            position = i + 1
+        else:
+            break
+    return position
+
+# ---------------- Constant Folding ----------------
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.Pow: operator.pow, ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_, ast.BitAnd: operator.and_, ast.BitXor: operator.xor,
+}
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Invert: operator.invert, ast.Not: operator.not_,
+}
+COMPARE_OPERATORS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Is: operator.is_, ast.IsNot: operator.is_not,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+}
+FOLDABLE_TYPES = (int, float, complex, str, bytes, bool, type(None))
+# Keep folded literals small: 2 ** 10000 is cheaper to compute than to store
+MAX_FOLDED_SIZE = 256
+
+def fold_value(func, *args):
+    try:
+        value = func(*args)
+    except Exception:
+        return None
+    if not isinstance(value, FOLDABLE_TYPES):
+        return None
+    if isinstance(value, (str, bytes)) and len(value) > MAX_FOLDED_SIZE:
+        return None
+    if isinstance(value, int) and value.bit_length() > MAX_FOLDED_SIZE:
+        return None
+    return ast.Constant(value=value)
+
+class ConstantFolding(Pass):
+    name = 'constant-folding'
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if is_constant(node.left) and is_constant(node.right):
+            left, right = node.left.value, node.right.value
+            # Bound the work done at optimization time
+            if isinstance(node.op, (ast.Pow, ast.LShift)) and isinstance(right, int) and abs(right) > MAX_FOLDED_SIZE:
+                return node
+            if isinstance(node.op, ast.Mult) and isinstance(left, (str, bytes)) and isinstance(right, int) and right > MAX_FOLDED_SIZE:
+                return node
+            folded = fold_value(BINARY_OPERATORS[type(node.op)], left, right)
+            if folded is not None:
+                self.changed()
+                return ast.copy_location(folded, node)
+        return node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if is_constant(node.operand):
+            folded = fold_value(UNARY_OPERATORS[type(node.op)], node.operand.value)
+            if folded is not None:
+                self.changed()
+                return ast.copy_location(folded, node)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        operands = [node.left] + node.comparators
+        if not all(is_constant(o) for o in operands):
+            return node
+        # Identity of literals is an implementation detail; leave it alone
+        if any(isinstance(op, (ast.Is, ast.IsNot)) for op in node.ops):
+            return node
+        result = True
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            folded = fold_value(COMPARE_OPERATORS[type(op)], left.value, right.value)
+            if folded is None:
+                return node
+            if not folded.value:
+                result = False
+                break
+        self.changed()
+        return ast.copy_location(ast.Constant(value=result), node)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        # "a and b" is a if a is falsy, else b; "a or b" the other way round
+        stop_on_truthy = isinstance(node.op, ast.Or)
+        values = list(node.values)
+        while len(values) > 1 and is_constant(values[0]):
+            if bool(values[0].value) == stop_on_truthy:
+                self.changed()
+                return values[0]
+            values.pop(0)
+            self.changed()
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+# ---------------- Constant Propagation ----------------
+IMMUTABLE_CONSTANTS = (int, float, complex, str, bytes, bool, type(None))
+
+class ConstantPropagation(Pass):
+    # Replaces reads of a name with its value when the name is bound exactly
+    # once in its scope, to an immutable literal, and the read comes after
+    # that binding in the same block. Module-level names are only propagated
+    # into module-level code, since functions may run after a monkeypatch.
+    name = 'constant-propagation'
+
+    def visit_Module(self, node):
+        facts = self.module_facts(node)
+        if facts.introspects is None:
+            facts.introspects = calls_introspection(node)
+        if not facts.introspects:
+            # Constants of module code that came before this tree
+            earlier = {name: value for name, value in facts.constants.items() if facts.counts.get(name) == 1}
+            self._propagate(node, facts.counts, earlier, into_functions=False)
+        return self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        if not calls_introspection(node):
+            self._propagate(node, None, {}, into_functions=True)
+        return self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _propagate(self, scope, counts, values, into_functions):
+        # One scan for the candidates, then one walk over the block: a name
+        # is replaced in the statements after its binding, which (bound once)
+        # is the only point where its value is set
+        candidates = {}
+        for i, stmt in enumerate(scope.body):
+            if (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and
+                    isinstance(stmt.targets[0], ast.Name) and is_constant(stmt.value) and
+                    isinstance(stmt.value.value, IMMUTABLE_CONSTANTS)):
+                candidates[i] = (stmt.targets[0].id, stmt.value.value)
+        if not candidates and not values:
+            return
+        if counts is None:
+            counts = bound_names(scope)
+        replacer = _NameReplacer(into_functions, values)
+        for i, stmt in enumerate(scope.body):
+            if replacer.values:
+                replacer.visit(stmt)
+            if i in candidates and counts.get(candidates[i][0]) == 1:
+                name, value = candidates[i]
+                replacer.values[name] = value
+        self.changed(replacer.replaced)
+
+class _NameReplacer(ast.NodeTransformer):
+    def __init__(self, into_functions, values):
+        # values: {name: constant} of the bindings seen so far
+        self.values = dict(values)
+        self.into_functions = into_functions
+        self.replaced = 0
+
+    def visit_Name(self, node):
+        if node.id in self.values and isinstance(node.ctx, ast.Load):
+            self.replaced += 1
+            return ast.copy_location(ast.Constant(value=self.values[node.id]), node)
+        return node
+
+    def visit_FunctionDef(self, node):
+        if self.into_functions:
+            return self.generic_visit(node)
+        # Decorators and defaults still run right away
+        node.decorator_list = [self.visit(expr) for expr in node.decorator_list]
+        node.args.defaults = [self.visit(expr) for expr in node.args.defaults]
+        node.args.kw_defaults = [expr and self.visit(expr) for expr in node.args.kw_defaults]
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        return self.generic_visit(node) if self.into_functions else node
+
+# ---------------- Dead Branch Elimination ----------------
+class DeadBranchElimination(Pass):
+    name = 'dead-branch-elimination'
+
+    def visit_If(self, node):
+        self.generic_visit(node)
+        if is_constant(node.test):
+            kept, dropped = (node.body, node.orelse) if node.test.value else (node.orelse, node.body)
+            if contains(dropped, SCOPE_CHANGING):
+                return node
+            self.changed()
+            return kept
+        return node
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        if is_constant(node.test) and not node.test.value and not contains(node.body, SCOPE_CHANGING):
+            self.changed()
+            return node.orelse
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if is_constant(node.test):
+            self.changed()
+            return node.body if node.test.value else node.orelse
+        return node
+
+# ---------------- Unreachable Code Elimination ----------------
+TERMINATORS = (ast.Return, ast.Raise, ast.Continue, ast.Break)
+
+class UnreachableCodeElimination(Pass):
+    # Drops statements that follow a return/raise/continue/break in the same block
+    name = 'unreachable-code-elimination'
+
+    def generic_visit(self, node):
+        for field in ('body', 'orelse', 'finalbody'):
+            block = getattr(node, field, None)
+            if not isinstance(block, list):
+                continue
+            for i, stmt in enumerate(block):
+                if isinstance(stmt, TERMINATORS) and i + 1 < len(block):
+                    dead = block[i + 1:]
+                    if not contains(dead, SCOPE_CHANGING):
+                        setattr(node, field, block[:i + 1])
+                        self.changed(len(dead))
+                    break
+        return super().generic_visit(node)
+
+# ---------------- Dead Code Elimination ----------------
+class DeadCodeElimination(Pass):
+    # Removes statements with no effect: bare literals (other than
+    # docstrings and "...") and redundant "pass"
+    name = 'dead-code-elimination'
+
+    def generic_visit(self, node):
+        for field in ('body', 'orelse', 'finalbody'):
+            block = getattr(node, field, None)
+            if not isinstance(block, list) or not block:
+                continue
+            kept = [
+                stmt for i, stmt in enumerate(block)
+                if not self._is_dead(node, field, i, stmt)
+            ]
+            if not kept and requires_body(node, field):
+                kept = [stmt for stmt in block if isinstance(stmt, ast.Pass)][:1] or block[:1]
+            if len(kept) != len(block):
+                self.changed(len(block) - len(kept))
+                setattr(node, field, kept)
+        return super().generic_visit(node)
+
+    def _is_dead(self, parent, field, index, stmt):
+        if isinstance(stmt, ast.Pass):
+            return True
+        if not (isinstance(stmt, ast.Expr) and is_constant(stmt.value)):
+            return False
+        value = stmt.value.value
+        if value is Ellipsis:
+            return False
+        is_docstring = (
+            index == 0 and field == 'body' and isinstance(value, str) and
+            isinstance(parent, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        )
+        return not is_docstring
@@ -0,0 +1,128 @@
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from context import AnalysisContext
+from analyzer import detect_syntax_errors_ctx, detect_logical_errors_ctx
+from complexity import analyze_time_complexity_ctx, analyze_space_complexity_ctx, complexity_report_ctx
+from optimizer import optimize_code_ctx, python_optimization_ctx
+from instrumentation import stage
+
+# Bump whenever a change alters what the pipeline returns for the same input,
+# so cached results from older versions are not served any more.
+ANALYZER_VERSION = 10
+
+# ---------------- Analysis Pipeline ----------------
+STAGES = ('syntax', 'logic', 'complexity', 'optimize')
+
+def empty_results():
+    return {
+        'syntax': None,
+        'logic': None,
+        'time_complexity': None,
+        'space_complexity': None,
+        'functions': [],
+        'optimization_passes': None,
+        'complexity_changes': [],
+        'optimized_code': None,
+    }
+
+def run_pipeline(code, language):
+    # Everything the UI shows for one submission, as plain JSON-able data
+    ctx = AnalysisContext(code, language)
+    results = empty_results()
+    for name in STAGES:
+        run_stage(name, ctx, results)
+    return results
+
+def run_stage(name, ctx, results):
+    # Fields are filled in as they are computed, so a stage that is stopped
+    # part way (see budget.py) keeps the ones it got to. Parsing/lexing is
+    # lazy and happens in the syntax stage.
+    if name == 'optimize':
+        # The optimizer takes the parsed tree over, so it runs last
+        if ctx.language == 'Python' and ctx.syntax_error is None:
+            add_python_optimization(ctx, results)
+        else:
+            with stage('optimize'):
+                results['optimized_code'] = optimize_code_ctx(ctx)
+        return
+    with stage(name):
+        if name == 'syntax':
+            results['syntax'] = detect_syntax_errors_ctx(ctx)
+        elif name == 'logic':
+            results['logic'] = detect_logical_errors_ctx(ctx)
+        else:
+            complexity_results(ctx, results)
+
+def run_complexity(code, language):
+    # The complexity part of run_pipeline, without running the optimizer
+    return complexity_results(AnalysisContext(code, language))
+
+def complexity_results(ctx, results=None):
+    results = {} if results is None else results
+    results['time_complexity'] = analyze_time_complexity_ctx(ctx)
+    results['space_complexity'] = analyze_space_complexity_ctx(ctx)
+    results['functions'] = []
+    if ctx.language in ('C++', 'Java') or (ctx.language == 'Python' and ctx.syntax_error is None):
+        results['functions'] = function_rows(complexity_report_ctx(ctx))
+    return results
+
+def function_rows(report):
+    return [
+        {'name': f.name, 'line': f.lineno, 'time': f.time, 'space': f.space, 'recurrence': f.derivation}
+        for f in report.functions
+    ]
+
+def add_python_optimization(ctx, results):
+    try:
+        with stage('optimize'):
+            optimized_code, report, changes = python_optimization_ctx(ctx)
+        results['optimized_code'] = optimized_code
+        results['optimization_passes'] = report.as_dict()
+        results['complexity_changes'] = changes
+    except (PipelineTimeout, MemoryError):
+        # Deadlines and memory limits are the caller's to report
+        raise
+    except Exception as e:
+        results['optimized_code'] = f"Error during optimization: {e}"
+
+def run_cached_pipeline(cache, code, language, compute=run_pipeline):
+    if cache is None:
+        return compute(code, language)
+    return cache.get_or_compute(code, language, ANALYZER_VERSION, compute)
+
+# ---------------- Deadlines ----------------
+class PipelineTimeout(Exception):
+    pass
+
+@contextmanager
+def time_limit(seconds, error=PipelineTimeout, message=None):
+    # SIGALRM based: only enforced in the main thread of a POSIX process,
+    # which is where process-pool workers run their tasks. Limits nest: an
+    # inner one never extends the deadline of the one around it, which is
+    # re-armed with what is left of it when the inner block ends.
+    if (not seconds or not hasattr(signal, 'setitimer') or
+            threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    outer = signal.getitimer(signal.ITIMER_REAL)[0]
+    if outer and outer <= seconds:
+        # The enclosing deadline comes first anyway
+        yield
+        return
+
+    def expire(signum, frame):
+        raise error(message or f'Analysis exceeded {seconds}s')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    started = time.monotonic()
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        if outer:
+            # Already past it: fire on the way out
+            signal.setitimer(signal.ITIMER_REAL, max(outer - (time.monotonic() - started), 1e-6))
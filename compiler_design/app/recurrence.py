@@ -0,0 +1,712 @@
+import ast
+import bisect
+import math
+from fractions import Fraction
+
+# ---------------- Recurrences ----------------
+# A recursive function is described, for every path through its body, by
+# the calls it makes to itself and how each one shrinks the input: T(n-c)
+# for n-1 or a slice that drops an element, T(b·n) for n//2, a half slice or
+# a midpoint, a child of a node (tree or graph traversal), or a filtered
+# copy of the input (quicksort's partitions). Together with the work one
+# call does besides recursing, that is a recurrence, solved here by the
+# Master theorem or Akra–Bazzi (divide and conquer), by summing the levels
+# or the characteristic root (subtract and conquer), or as one call per
+# element (traversals). Costs are complexity.py's (exponential base,
+# polynomial degree, log power) tuples; the degree may be fractional here.
+
+CONSTANT = (0, 0, 0)
+LINEAR = (0, 1, 0)
+EPSILON = 1e-9
+# Paths kept per function; beyond that only the most expensive ones are
+MAX_PATHS = 16
+
+SAME = ('same',)
+UNKNOWN = ('unknown',)
+CHILD = ('child',)
+PART = ('part',)
+
+# Library calls that copy a range of their receiver/argument
+SLICE_CALLS = ('copyOfRange', 'subList', 'substr', 'substring')
+
+class _Unsolvable(Exception):
+    pass
+
+class Recurrence:
+    # paths: one list of terms per path through the function. work: cost of
+    # the function's own loops and copies; calls: (name, cost of the loops
+    # around the call) of the helpers it calls, which are only known once
+    # the whole file has been analyzed (see resolve).
+    def __init__(self, paths, work, calls=()):
+        self.paths = paths
+        self.work = work
+        self.calls = list(calls)
+
+    def depth(self):
+        # 'log' when every self-call divides the input, else 'linear'
+        terms = [term for path in self.paths for term in path]
+        return 'log' if terms and all(term[0] == 'div' for term in terms) else 'linear'
+
+    def resolve(self, helpers):
+        # (cost, derivation text) of the most expensive path, None when a
+        # path fits none of the rules. helpers: {function name: cost}.
+        work = self.work
+        for name, around in self.calls:
+            if name in helpers:
+                work = max(work, _times(around, helpers[name]))
+        worst = None
+        # On a tie the recursive path explains the bound better than the base case
+        for path in sorted(self.paths, key=lambda terms: not terms):
+            solved = solve(path, work)
+            if solved is None:
+                return None
+            if worst is None or solved[0] > worst[0]:
+                worst = solved
+        cost, text = worst
+        return cost, text
+
+def solve(terms, work):
+    # (cost, text) of T(n) = terms + work, None when no rule applies
+    if not terms:
+        return work, f'T(n) = Θ({growth(work)})'
+    subs = [term[1] for term in terms if term[0] == 'sub']
+    divs = [term[1] for term in terms if term[0] == 'div']
+    children = sum(term[0] == 'child' for term in terms)
+    split = any(term[0] == 'part' for term in terms)
+    if split:
+        # Partitions of one input: at worst one of them gets all but one
+        # element and the others nothing
+        subs.append(1)
+    if work[0] or (children and (subs or divs)) or (subs and divs):
+        return None
+
+    if children:
+        cost, rule = _times(LINEAR, work), 'one call per element'
+        shape = 'Σ T(child)'
+    elif divs:
+        p = _critical_exponent(divs)
+        degree, logs = work[1], work[2]
+        if abs(degree - p) < EPSILON:
+            cost = (0, degree, logs + 1)
+        elif degree < p:
+            cost = (0, p, 0)
+        else:
+            cost = work
+        rule = 'Master theorem' if len(set(divs)) == 1 else 'Akra–Bazzi'
+        shape = _shape(('div', b) for b in divs)
+    elif len(subs) == 1:
+        cost, rule = _times(LINEAR, work), 'summed over n levels'
+        shape = _shape(('sub', c) for c in subs)
+    else:
+        cost, rule = (round(_characteristic_root(subs), 4), 0, 0), 'characteristic root'
+        shape = _shape(('sub', c) for c in subs)
+    if split:
+        rule += ', worst-case split'
+    return cost, f'T(n) = {shape} + Θ({growth(work)}) → Θ({growth(cost)}) ({rule})'
+
+def _critical_exponent(factors):
+    # p with sum(b^p) = 1 (Akra–Bazzi); log_{1/b} a for a equal parts
+    if len(set(factors)) == 1:
+        p = math.log(len(factors)) / math.log(1 / factors[0])
+    else:
+        low, high = 0.0, 1.0
+        while sum(b ** high for b in factors) > 1:
+            high *= 2
+        for _ in range(60):
+            middle = (low + high) / 2
+            if sum(b ** middle for b in factors) > 1:
+                low = middle
+            else:
+                high = middle
+        p = (low + high) / 2
+    return round(p) if abs(p - round(p)) < EPSILON else p
+
+def _characteristic_root(steps):
+    # r > 1 with sum(r^-c) = 1: T(n) = T(n-1) + T(n-2) grows as 1.618^n
+    low, high = 1.0, 2.0
+    while sum(high ** -c for c in steps) > 1:
+        high *= 2
+    for _ in range(60):
+        middle = (low + high) / 2
+        if sum(middle ** -c for c in steps) > 1:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+def _times(a, b):
+    exponential = a[0] * b[0] if a[0] and b[0] else a[0] + b[0]
+    return (exponential, a[1] + b[1], a[2] + b[2])
+
+def growth(cost):
+    exponential, degree, logs = cost
+    parts = []
+    if exponential:
+        parts.append(f'{exponential:.4g}^n')
+    if degree:
+        parts.append('n' if degree == 1 else f'n^{degree:.3g}')
+    if logs:
+        parts.append('log n' if logs == 1 else f'log^{logs} n')
+    return ' '.join(parts) or '1'
+
+def _shape(terms):
+    counts = {}
+    for term in terms:
+        counts[term] = counts.get(term, 0) + 1
+    shown = []
+    for (kind, value), count in counts.items():
+        if kind == 'sub':
+            call = f'T(n-{value})'
+        else:
+            share = Fraction(value).limit_denominator(64)
+            call = f'T(n/{share.denominator})' if share.numerator == 1 else f'T({share.numerator}n/{share.denominator})'
+        shown.append(call if count == 1 else f'{count}{call}')
+    return ' + '.join(shown)
+
+def _prune(paths):
+    # Keeps the most expensive paths (by their shape alone) once there are many
+    unique = []
+    for path in paths:
+        if path not in unique:
+            unique.append(path)
+    if len(unique) <= MAX_PATHS:
+        return unique
+
+    def weight(path):
+        solved = solve(path[0], CONSTANT)
+        return solved[0] if solved is not None else (math.inf, 0, 0)
+    return sorted(unique, key=weight, reverse=True)[:MAX_PATHS]
+
+# ---- Python ----
+def python_self_calls(node):
+    # Term lists of a recursive FunctionDef, one per path through it, or
+    # None when one of its self-calls does not fit the shapes above
+    try:
+        paths = _PythonSelfCalls(node).sequence(node.body)
+    except _Unsolvable:
+        return None
+    return [terms for terms, _ in paths]
+
+def tail_call_form(node):
+    # A function whose whole body is a "while True" loop that either returns
+    # or rebinds all of its parameters and goes round again is tail
+    # recursion written as a loop (the optimizer's tail-recursion pass
+    # emits exactly that). Returns a copy with each rebinding turned back
+    # into "return f(...)", so the loop gets the recurrence's bound, or None.
+    arguments = node.args
+    if arguments.vararg or arguments.kwonlyargs or arguments.kwarg:
+        return None
+    params = [a.arg for a in arguments.posonlyargs + arguments.args]
+    body = node.body
+    docstring = []
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+        docstring, body = body[:1], body[1:]
+    if not params or len(body) != 1:
+        return None
+    loop = body[0]
+    if not (isinstance(loop, ast.While) and isinstance(loop.test, ast.Constant) and loop.test.value is True
+            and not loop.orelse):
+        return None
+    rebindings = []
+    converted = _tail_calls(loop.body, node.name, params, True, rebindings)
+    if converted is None or not rebindings or not _always_returns(converted):
+        return None
+    # The parameters must change only through those rebindings
+    targets = {id(name) for stmt in rebindings for name in ast.walk(stmt.targets[0])}
+    if any(isinstance(child, ast.Name) and child.id in params and not isinstance(child.ctx, ast.Load)
+           and id(child) not in targets for child in _own_nodes(loop)):
+        return None
+    recursive = ast.FunctionDef(name=node.name, args=arguments, body=docstring + converted,
+                                decorator_list=node.decorator_list, returns=node.returns)
+    return ast.copy_location(recursive, node)
+
+def _tail_calls(statements, name, params, last, rebindings):
+    # The statements with "params = args; continue" (or the rebinding alone
+    # where the loop body ends) turned into "return name(args)", or None
+    # when the loop is left or restarted any other way
+    result = []
+    for i, stmt in enumerate(statements):
+        final = i == len(statements) - 1
+        args = _rebound(stmt, params)
+        if args is not None and (final and last or not final and isinstance(statements[i + 1], ast.Continue)):
+            rebindings.append(stmt)
+            call = ast.copy_location(ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[]), stmt)
+            result.append(ast.copy_location(ast.Return(value=call), stmt))
+            return result
+        if isinstance(stmt, ast.If):
+            body = _tail_calls(stmt.body, name, params, last and final, rebindings)
+            orelse = _tail_calls(stmt.orelse, name, params, last and final, rebindings)
+            if body is None or orelse is None:
+                return None
+            stmt = ast.copy_location(ast.If(test=stmt.test, body=body or [ast.Pass()], orelse=orelse), stmt)
+        elif _leaves_loop(stmt):
+            return None
+        result.append(stmt)
+    return result
+
+def _rebound(stmt, params):
+    # The new parameter values of "a, b = x, y" (or "n = x" for one)
+    if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1):
+        return None
+    target, value = stmt.targets[0], stmt.value
+    if len(params) == 1:
+        return [value] if isinstance(target, ast.Name) and target.id == params[0] else None
+    if (isinstance(target, ast.Tuple) and [getattr(e, 'id', None) for e in target.elts] == params
+            and isinstance(value, ast.Tuple) and len(value.elts) == len(params)
+            and not any(isinstance(e, ast.Starred) for e in value.elts)):
+        return list(value.elts)
+    return None
+
+def _leaves_loop(stmt):
+    # break or continue of the enclosing loop somewhere in stmt
+    stack = [stmt]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.Break, ast.Continue)):
+            return True
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            # Only the else block of an inner loop belongs to the outer one
+            stack.extend(node.orelse)
+        elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(node))
+    return False
+
+def _always_returns(statements):
+    last = statements[-1] if statements else None
+    if isinstance(last, ast.If):
+        return _always_returns(last.body) and _always_returns(last.orelse)
+    return isinstance(last, (ast.Return, ast.Raise))
+
+def _own_nodes(node):
+    # Nodes of a definition, without the bodies of nested definitions
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        yield child
+        if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(child))
+
+def _int_constant(node):
+    if isinstance(node, ast.Constant) and type(node.value) is int and node.value > 0:
+        return node.value
+    return None
+
+def _divisor(node):
+    # Share of the input left by x // c, k * x // c, x / c or x >> k
+    if isinstance(node.op, (ast.FloorDiv, ast.Div)):
+        c = _int_constant(node.right)
+        k = 1
+        left = node.left
+        if isinstance(left, ast.BinOp) and isinstance(left.op, ast.Mult):
+            k = _int_constant(left.left) or _int_constant(left.right) or 1
+        return k / c if c and k < c else None
+    if isinstance(node.op, ast.RShift):
+        k = _int_constant(node.right)
+        return 2.0 ** -k if k else None
+    return None
+
+class _PythonSelfCalls:
+    def __init__(self, node):
+        self.name = node.name
+        arguments = node.args
+        self.params = [a.arg for a in arguments.posonlyargs + arguments.args]
+        self.assigned = {}
+        self.iterated = {}
+        for child in _own_nodes(node):
+            if isinstance(child, ast.Assign) and len(child.targets) == 1 and isinstance(child.targets[0], ast.Name):
+                self.assigned[child.targets[0].id] = child.value
+            elif isinstance(child, ast.AnnAssign) and child.value is not None and isinstance(child.target, ast.Name):
+                self.assigned[child.target.id] = child.value
+            elif isinstance(child, (ast.For, ast.AsyncFor, ast.comprehension)) and isinstance(child.target, ast.Name):
+                self.iterated[child.target.id] = child.iter
+
+    # ---- Paths ----
+    def sequence(self, statements):
+        # (terms, returned) for every path through a statement list
+        paths = [([], False)]
+        for statement in statements:
+            if all(returned for _, returned in paths):
+                break
+            step = self.statement(statement)
+            extended = []
+            for terms, returned in paths:
+                if returned:
+                    extended.append((terms, True))
+                else:
+                    extended.extend((terms + more, ended) for more, ended in step)
+            paths = _prune(extended)
+        return paths
+
+    def statement(self, node):
+        if isinstance(node, ast.If):
+            return [(test + terms, returned)
+                    for test in self.expression(node.test)
+                    for terms, returned in self.sequence(node.body) + self.sequence(node.orelse)]
+        if isinstance(node, ast.Return):
+            return [(terms, True) for terms in (self.expression(node.value) if node.value else [[]])]
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            return [(self.loop(node), False)]
+        if isinstance(node, ast.Try) or type(node).__name__ == 'TryStar':
+            paths = self.sequence(node.body + node.orelse)
+            for handler in node.handlers:
+                paths = paths + self.sequence(handler.body)
+            return self._then(paths, node.finalbody)
+        if isinstance(node, (ast.With, ast.AsyncWith)):
+            entered = [term for item in node.items for term in self.calls(item.context_expr)]
+            return self._then([(entered, False)], node.body)
+        if type(node).__name__ == 'Match':
+            return [(subject + terms, returned)
+                    for subject in self.expression(node.subject)
+                    for case in node.cases
+                    for terms, returned in self.sequence(case.body)]
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return [([], False)]
+        if isinstance(node, (ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign)) and node.value is not None:
+            return [(terms, False) for terms in self.expression(node.value)]
+        return [(self.calls(node), isinstance(node, ast.Raise))]
+
+    def _then(self, paths, statements):
+        rest = self.sequence(statements)
+        return _prune([(terms + more, returned or ended) for terms, returned in paths for more, ended in rest])
+
+    def expression(self, node):
+        # Alternatives of one expression: only a conditional expression has several
+        if isinstance(node, ast.IfExp):
+            return [test + branch
+                    for test in self.expression(node.test)
+                    for branch in self.expression(node.body) + self.expression(node.orelse)]
+        return [self.calls(node)]
+
+    def loop(self, node):
+        # A self-call inside a loop is only understood as a traversal: one
+        # call per child of the current node
+        terms = self.calls(node)
+        if not terms:
+            return []
+        if isinstance(node, ast.While) or any(term != CHILD for term in terms):
+            raise _Unsolvable()
+        return [CHILD]
+
+    def calls(self, node):
+        found = [node] if isinstance(node, ast.Call) else []
+        found.extend(child for child in _own_nodes(node) if isinstance(child, ast.Call))
+        found.sort(key=lambda call: (call.lineno, call.col_offset))
+        terms = []
+        for call in found:
+            arguments = self.arguments(call)
+            if arguments is not None:
+                terms.append(self.term(arguments))
+        return terms
+
+    # ---- Self-calls ----
+    def arguments(self, call):
+        # (parameter, argument) pairs of a self-call, None for other calls
+        params = self.params
+        func = call.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id in ('self', 'cls'):
+            if func.attr != self.name:
+                return None
+            if params and params[0] in ('self', 'cls'):
+                params = params[1:]
+        elif not (isinstance(func, ast.Name) and func.id == self.name):
+            return None
+        pairs = [(param, arg) for param, arg in zip(params, call.args) if not isinstance(arg, ast.Starred)]
+        pairs.extend((kw.arg, kw.value) for kw in call.keywords if kw.arg in params)
+        return pairs
+
+    def term(self, pairs):
+        # The slowest way any argument shrinks decides how the call does
+        kinds = [self.shrink(arg) for _, arg in pairs]
+        subs = [kind for kind in kinds if kind[0] == 'sub']
+        if subs:
+            return min(subs, key=lambda kind: kind[1])
+        if PART in kinds:
+            return PART
+        divs = [kind for kind in kinds if kind[0] == 'div']
+        if divs:
+            return max(divs, key=lambda kind: kind[1])
+        if CHILD in kinds:
+            return CHILD
+        raise _Unsolvable()
+
+    def shrink(self, node, depth=0):
+        if depth > 4:
+            return UNKNOWN
+        if isinstance(node, ast.Constant):
+            return SAME
+        if isinstance(node, ast.Name):
+            if node.id in self.params:
+                return SAME
+            if node.id in self.iterated:
+                iterable = self.iterated[node.id]
+                ranged = (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name) and
+                          iterable.func.id == 'range')
+                return CHILD if self.mentions_param(iterable) and not ranged else UNKNOWN
+            if node.id in self.assigned:
+                return self.shrink(self.assigned[node.id], depth + 1)
+            return UNKNOWN
+        if isinstance(node, ast.BinOp):
+            if isinstance(node.op, (ast.Add, ast.Sub)):
+                step, operand = _int_constant(node.right), node.left
+                if step is None and isinstance(node.op, ast.Add):
+                    step, operand = _int_constant(node.left), node.right
+                if step is not None:
+                    # n - 1, i + 1, mid - 1
+                    inner = self.shrink(operand, depth + 1)
+                    if inner == SAME and self.mentions_param(operand):
+                        return ('sub', step)
+                    return inner if inner[0] == 'div' else UNKNOWN
+            share = _divisor(node)
+            if share is not None and self.mentions_param(node.left):
+                return ('div', share)
+            if isinstance(node.op, ast.Mod) and self.mentions_param(node.left):
+                # Euclid: a % b is below a / 2 every other step
+                return ('div', 0.5)
+            return UNKNOWN
+        if isinstance(node, ast.Subscript) and self.mentions_param(node.value):
+            return self.slice(node.slice, depth) if isinstance(node.slice, ast.Slice) else CHILD
+        if isinstance(node, ast.Attribute) and self.mentions_param(node.value):
+            return CHILD
+        if (isinstance(node, (ast.ListComp, ast.GeneratorExp)) and
+                any(self.mentions_param(generator.iter) for generator in node.generators)):
+            return PART
+        return UNKNOWN
+
+    def slice(self, node, depth):
+        # arr[1:], arr[:-1] drop elements, arr[:mid], arr[mid:] halve
+        dropped = 0
+        for bound, lower in ((node.lower, True), (node.upper, False)):
+            if bound is None:
+                continue
+            if isinstance(bound, ast.UnaryOp) and isinstance(bound.op, ast.USub) and _int_constant(bound.operand):
+                if lower:
+                    return UNKNOWN
+                dropped += bound.operand.value
+            elif _int_constant(bound) and lower:
+                dropped += bound.value
+            else:
+                kind = self.shrink(bound, depth + 1)
+                return ('div', 0.5) if kind[0] == 'div' else UNKNOWN
+        return ('sub', dropped) if dropped else SAME
+
+    def mentions_param(self, node, depth=0):
+        for child in [node, *_own_nodes(node)]:
+            if isinstance(child, ast.Name):
+                if child.id in self.params:
+                    return True
+                if depth < 4 and child.id in self.assigned and self.mentions_param(self.assigned[child.id], depth + 1):
+                    return True
+        return False
+
+# ---- C++/Java ----
+def cpp_java_self_calls(lexed, block):
+    # Term lists of a recursive function block, one per return statement
+    # that recurses (the calls outside return statements are on every
+    # path), or None when a self-call does not fit the shapes above
+    tokens = lexed.tokens
+    end = block.end if block.end is not None else len(tokens)
+    params = _cpp_java_params(block.header, block.name)
+    halves = _halving_locals(tokens, block.start, end)
+    loops = [b for b in block.walk() if b is not block and b.is_loop()]
+    iterated = {}
+    for loop in loops:
+        iterated.update(_range_for(loop.header, params))
+
+    common = []
+    returns = {}
+    for i in range(block.start, end):
+        token = tokens[i]
+        if not (token.text == block.name and i + 1 < end and tokens[i + 1].text == '('):
+            continue
+        before = tokens[i - 1].text if i > block.start else None
+        if before in ('.', '->', '::') and not (i > 1 and tokens[i - 2].text == 'this'):
+            continue
+        arguments = _call_arguments(tokens, i + 1, end)
+        kinds = [_cpp_java_shrink(arg, params, halves, iterated) for arg in arguments]
+        term = _slowest(kinds)
+        if term is None:
+            return None
+        if any(loop.start <= i < (loop.end if loop.end is not None else end) for loop in loops) and term != CHILD:
+            return None
+        statement, branch = _return_branch(tokens, i, block.start)
+        if statement is None:
+            common.append(term)
+        else:
+            returns.setdefault(statement, {}).setdefault(branch, []).append(term)
+
+    paths = [common]
+    for branches in returns.values():
+        condition = branches.pop(0, [])
+        for terms in (branches.values() if branches else [[]]):
+            paths.append(common + condition + terms)
+    return [path for path, _ in _prune([(path, True) for path in paths])]
+
+def _slowest(kinds):
+    subs = [kind for kind in kinds if kind[0] == 'sub']
+    if subs:
+        return min(subs, key=lambda kind: kind[1])
+    divs = [kind for kind in kinds if kind[0] == 'div']
+    if divs:
+        return max(divs, key=lambda kind: kind[1])
+    return CHILD if CHILD in kinds else None
+
+def _cpp_java_params(header, name):
+    texts = [t.text for t in header]
+    for i in range(len(texts) - 1):
+        if texts[i] == name and texts[i + 1] == '(':
+            return [_declared_name(part) for part in _split_top_level(header, i + 2, len(header))]
+    return []
+
+def _declared_name(part):
+    names = []
+    for token in part:
+        if token.text == '=':
+            break
+        if token.kind == 'ident':
+            names.append(token.text)
+    return names[-1] if names else None
+
+def _split_top_level(tokens, start, end):
+    # Comma separated token lists from start up to the ')' closing the list
+    parts, current, depth = [], [], 0
+    for i in range(start, end):
+        text = tokens[i].text
+        if text in ('(', '[', '<', '{'):
+            depth += 1
+        elif text in (')', ']', '>', '}'):
+            if depth == 0:
+                break
+            depth -= 1
+        elif text == ',' and depth == 0:
+            parts.append(current)
+            current = []
+            continue
+        current.append(tokens[i])
+    if current:
+        parts.append(current)
+    return parts
+
+def _call_arguments(tokens, open_index, end):
+    # Like _split_top_level, but '<' and '>' are comparisons here
+    parts, current, depth = [], [], 0
+    for i in range(open_index + 1, end):
+        text = tokens[i].text
+        if text in ('(', '[', '{'):
+            depth += 1
+        elif text in (')', ']', '}'):
+            if depth == 0:
+                break
+            depth -= 1
+        elif text == ',' and depth == 0:
+            parts.append(current)
+            current = []
+            continue
+        current.append(tokens[i])
+    if current:
+        parts.append(current)
+    return parts
+
+def _number(token):
+    if token.kind != 'number':
+        return None
+    try:
+        value = int(token.text.rstrip('uUlL'))
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+def _token_divisor(tokens):
+    # Share of the input left by an expression with a top-level / c or >> k
+    for i in range(len(tokens) - 1):
+        if tokens[i].text == '/' and (_number(tokens[i + 1]) or 0) > 1:
+            return 1 / _number(tokens[i + 1])
+        if i + 2 < len(tokens) and tokens[i].text == '>' and tokens[i + 1].text == '>' and _number(tokens[i + 2]):
+            return 2.0 ** -_number(tokens[i + 2])
+    return None
+
+def _halving_locals(tokens, start, end):
+    # {name: share} of locals assigned a midpoint: mid = lo + (hi - lo) / 2
+    halves = {}
+    for i in range(start, end - 1):
+        if tokens[i].kind == 'ident' and tokens[i + 1].text == '=':
+            j = i + 2
+            while j < end and tokens[j].text != ';':
+                j += 1
+            share = _token_divisor(tokens[i + 2:j])
+            if share is not None:
+                halves[tokens[i].text] = share
+    return halves
+
+def _range_for(header, params):
+    # {loop variable: True} for for (T x : <something of a parameter>)
+    texts = [t.text for t in header]
+    if ':' not in texts or not texts or texts[0] != 'for':
+        return {}
+    colon = texts.index(':')
+    if colon == 0 or header[colon - 1].kind != 'ident':
+        return {}
+    return {texts[colon - 1]: any(text in params for text in texts[colon + 1:])}
+
+def _cpp_java_shrink(arg, params, halves, iterated):
+    texts = [t.text for t in arg]
+    if not arg:
+        return UNKNOWN
+    if len(arg) == 1:
+        text = texts[0]
+        if arg[0].kind == 'number' or text in params:
+            return SAME
+        if text in halves:
+            return ('div', halves[text])
+        if iterated.get(text):
+            return CHILD
+        return UNKNOWN
+    if len(arg) == 3 and texts[1] in ('-', '+'):
+        step, operand = _number(arg[2]), texts[0]
+        if step is None and texts[1] == '+':
+            step, operand = _number(arg[0]), texts[2]
+        if step is not None:
+            if operand in params:
+                return ('sub', step)
+            if operand in halves:
+                return ('div', halves[operand])
+    if any(text in SLICE_CALLS for text in texts):
+        return ('div', 0.5) if any(text in halves for text in texts) or _token_divisor(arg) else ('sub', 1)
+    mentions = any(text in params or text in halves for text in texts)
+    share = _token_divisor(arg)
+    if share is not None and mentions:
+        return ('div', share)
+    if '%' in texts and mentions:
+        return ('div', 0.5)
+    if len(arg) == 3 and texts[0] in params and texts[1] in ('->', '.') and arg[2].kind == 'ident':
+        return CHILD
+    return UNKNOWN
+
+def _return_branch(tokens, i, start):
+    # (index of the return starting the statement, branch of a ?: the call
+    # is in: 0 for the condition, 1 and 2 for the two sides), or (None, 0)
+    depth = 0
+    branch = 0
+    j = i - 1
+    while j >= start:
+        text = tokens[j].text
+        if text in (')', ']'):
+            depth += 1
+        elif text in ('(', '['):
+            # At depth 0 the call is an argument of another one: keep going out
+            depth = max(0, depth - 1)
+        elif depth == 0 and text in (';', '{', '}'):
+            return None, 0
+        elif depth == 0 and text == '?' and branch == 0:
+            branch = 1
+        elif depth == 0 and text == ':' and branch == 0:
+            branch = 2
+        elif text == 'return':
+            return j, branch
+        j -= 1
+    return None, 0
+
+def loop_depths(loops):
+    # depth(index): how many of the loops contain a token index
+    starts = sorted(loop.start for loop in loops)
+    ends = sorted(loop.end for loop in loops if loop.end is not None)
+    return lambda index: bisect.bisect_right(starts, index) - bisect.bisect_right(ends, index)
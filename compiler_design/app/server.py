@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http import HTTPStatus
+from budget import STAGE_FIELDS, Budget, run_budgeted, run_cached_budgeted
+from cache import ResultCache
+from cli import language_for
+from instrumentation import MetricsRegistry, record_stages
+from pipeline import PipelineTimeout, run_cached_pipeline, run_complexity, time_limit
+
+# ---------------- HTTP Analysis Service ----------------
+# python app/server.py [--host HOST] [--port PORT] [-j WORKERS]
+#
+#   POST /analyze     {"code", "language", "timeout"?, "budget"?}
+#                     full pipeline results
+#   POST /optimize    same body                           optimized code and pass report
+#   POST /complexity  same body                           time/space verdicts
+#   POST /batch       {"files": [{"code", "language"? , "path"?}, ...],
+#                      "endpoint"?, "timeout"?, "budget"?}
+#                     one JSON line per file, streamed as each one finishes
+#   GET  /health      pool load
+#   GET  /metrics     Prometheus counters and histograms per endpoint and stage
+#
+# Every result carries a "timings" list (wall time, CPU time per pipeline
+# stage and pass). "profile": true in a request also records peak
+# allocations and returns a cProfile summary; with --profile-dir the raw
+# .prof dump is kept there as well.
+#
+# "budget": {"seconds"?, "memory_mb"?, "stages"?: {stage: {...}}} sets time
+# and memory limits per pipeline stage (syntax, logic, complexity,
+# optimize). A stage that runs out of its budget does not fail the request:
+# its fields say "Budget exceeded", the stages after it still run, and the
+# result carries a "budget" report of what happened in every stage.
+#
+# Analyses run in a bounded process pool, one per worker at a time. A
+# bounded number of requests may wait for a worker; beyond that the service
+# answers 503 right away. Every analysis has a deadline, enforced inside the
+# worker and, should a worker stop responding, by replacing the pool.
+
+LANGUAGES = ('Python', 'C++', 'Java')
+ENDPOINTS = ('analyze', 'optimize', 'complexity')
+OPTIMIZE_FIELDS = ('optimized_code', 'optimization_passes', 'complexity_changes')
+STATUS_CODES = {'ok': HTTPStatus.OK, 'timeout': HTTPStatus.GATEWAY_TIMEOUT, 'error': HTTPStatus.INTERNAL_SERVER_ERROR}
+MAX_BODY = 16 * 1024 * 1024
+
+# ---- Worker side ----
+_worker_cache = None
+
+def _init_worker(cache_path):
+    global _worker_cache
+    # Ctrl-C is handled by the server process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_cache = ResultCache(path=cache_path)
+
+def run_endpoint(endpoint, code, language, timeout, profile=False, profile_dir=None, budget=None):
+    start = time.perf_counter()
+    recorder = None
+    try:
+        with record_stages(memory=profile, profile=profile) as recorder, time_limit(timeout):
+            if budget is not None:
+                budget = Budget.from_dict(budget)
+            if endpoint == 'complexity' and budget is not None:
+                result = run_budgeted(code, language, budget, stages=('complexity',))
+                result = {field: result[field] for field in (*STAGE_FIELDS['complexity'], 'budget')}
+            elif endpoint == 'complexity':
+                result = run_complexity(code, language)
+            else:
+                if budget is not None:
+                    result = run_cached_budgeted(_worker_cache, code, language,
+                                                 partial(run_budgeted, budget=budget))
+                else:
+                    result = run_cached_pipeline(_worker_cache, code, language)
+                if endpoint == 'optimize':
+                    fields = OPTIMIZE_FIELDS + (('budget',) if 'budget' in result else ())
+                    result = {field: result.get(field) for field in fields}
+        result = {'status': 'ok', **result}
+    except PipelineTimeout as e:
+        result = {'status': 'timeout', 'error': str(e)}
+    except Exception as e:
+        result = {'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    if recorder is not None:
+        result['timings'] = recorder.as_list()
+        if profile:
+            result['profile'] = recorder.profile_summary()
+            if profile_dir:
+                path = os.path.join(profile_dir, f'{uuid.uuid4().hex}.prof')
+                recorder.dump_profile(path)
+                result['profile_path'] = path
+    return result
+
+# ---- Pool ----
+class WorkerPool:
+    def __init__(self, workers, max_queue, cache_path=None, grace=5.0, profile_dir=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cache_path = cache_path
+        # Time a worker gets past its own deadline before it is given up on
+        self.grace = grace
+        self.profile_dir = profile_dir
+        self.running = 0
+        self.waiting = 0
+        self.restarts = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.cache_path,))
+
+    def busy(self):
+        return self.waiting >= self.max_queue
+
+    async def run(self, endpoint, code, language, timeout, profile=False, budget=None):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await self._submit(endpoint, code, language, timeout, profile, budget)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def _submit(self, endpoint, code, language, timeout, profile, budget):
+        loop = asyncio.get_running_loop()
+        # A second attempt only happens when another request's worker took
+        # the pool down with it
+        for _ in range(2):
+            pool = self._pool
+            future = loop.run_in_executor(pool, run_endpoint, endpoint, code, language, timeout,
+                                          profile, self.profile_dir, budget)
+            try:
+                return await asyncio.wait_for(future, timeout + self.grace)
+            except asyncio.TimeoutError:
+                # The worker is stuck somewhere the alarm cannot reach it
+                self._recycle(pool)
+                return {'status': 'timeout', 'error': f'Analysis exceeded {timeout}s'}
+            except BrokenProcessPool:
+                self._recycle(pool)
+        return {'status': 'error', 'error': 'Worker process crashed'}
+
+    def _recycle(self, pool):
+        if pool is not self._pool:
+            return
+        self.restarts += 1
+        self._pool = self._new_pool()
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def health(self):
+        return {'workers': self.workers, 'running': self.running, 'waiting': self.waiting,
+                'max_queue': self.max_queue, 'restarts': self.restarts}
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# ---- HTTP ----
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def read_request(reader):
+    # (method, path, body) of one HTTP/1.1 request, None on a closed connection
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED, 'Send the body with a Content-Length')
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+    if length > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'Body larger than {MAX_BODY} bytes')
+    body = await reader.readexactly(length) if length > 0 else b''
+    return method, target.split('?', 1)[0], body
+
+def response_head(status, headers):
+    lines = [f'HTTP/1.1 {status.value} {status.phrase}']
+    lines.extend(f'{name}: {value}' for name, value in headers)
+    lines.append('Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+async def send_json(writer, status, payload, headers=()):
+    await send_body(writer, status, 'application/json', json.dumps(payload).encode('utf-8'), headers)
+
+async def send_body(writer, status, content_type, body, headers=()):
+    head = response_head(status, [('Content-Type', content_type), ('Content-Length', len(body)), *headers])
+    writer.write(head + body)
+    await writer.drain()
+
+def parse_json(body):
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Body is not valid JSON')
+    if not isinstance(payload, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Body must be a JSON object')
+    return payload
+
+def source_item(item, path=None):
+    # (code, language) of one submission, or an error message
+    if not isinstance(item, dict) or not isinstance(item.get('code'), str):
+        return None, None, '"code" must be a string'
+    language = item.get('language') or (language_for(path) if path else None)
+    if language not in LANGUAGES:
+        return None, None, f'"language" must be one of {", ".join(LANGUAGES)}'
+    return item['code'], language, None
+
+
+class AnalysisServer:
+    def __init__(self, pool, default_timeout=30.0, max_timeout=120.0):
+        self.pool = pool
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.metrics = MetricsRegistry()
+
+    def deadline(self, payload):
+        try:
+            timeout = float(payload.get('timeout', self.default_timeout))
+        except (TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, '"timeout" must be a number')
+        if timeout <= 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, '"timeout" must be positive')
+        return min(timeout, self.max_timeout)
+
+    def budget(self, payload):
+        # Checked here so that a bad budget is a 400, not a worker error
+        if payload.get('budget') is None:
+            return None
+        try:
+            return Budget.from_dict(payload['budget']).as_dict()
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'"budget": {e}')
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                request = await read_request(reader)
+                if request is not None:
+                    await self.dispatch(writer, *request)
+            except HTTPError as e:
+                await send_json(writer, e.status, {'error': str(e)})
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                await send_json(writer, HTTPStatus.BAD_REQUEST, {'error': 'Incomplete request'})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, writer, method, path, body):
+        name = path.strip('/')
+        if name in ('health', 'metrics'):
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, 'Use GET')
+            if name == 'health':
+                await send_json(writer, HTTPStatus.OK, {'status': 'ok', **self.pool.health()})
+            else:
+                await send_body(writer, HTTPStatus.OK, 'text/plain; version=0.0.4',
+                                self.metrics.render().encode('utf-8'))
+            return
+        if name not in ENDPOINTS and name != 'batch':
+            raise HTTPError(HTTPStatus.NOT_FOUND, f'No endpoint {path}')
+        if method != 'POST':
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, 'Use POST')
+        # Backpressure: turn work away instead of queueing without bound
+        if self.pool.busy():
+            await send_json(writer, HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'Server busy'},
+                            [('Retry-After', 1)])
+            return
+
+        payload = parse_json(body)
+        timeout = self.deadline(payload)
+        profile = bool(payload.get('profile'))
+        budget = self.budget(payload)
+        start = time.perf_counter()
+        if name == 'batch':
+            await self.batch(writer, payload, timeout, profile, budget)
+            self.metrics.observe_request(name, 'ok', time.perf_counter() - start)
+            return
+        code, language, error = source_item(payload)
+        if error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, error)
+        result = await self.pool.run(name, code, language, timeout, profile, budget)
+        self.metrics.observe_stages(result.get('timings', ()))
+        self.metrics.observe_request(name, result['status'], time.perf_counter() - start)
+        await send_json(writer, STATUS_CODES[result['status']], result)
+
+    async def batch(self, writer, payload, timeout, profile, budget=None):
+        files = payload.get('files')
+        endpoint = payload.get('endpoint', 'analyze')
+        if not isinstance(files, list):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, '"files" must be a list')
+        if endpoint not in ENDPOINTS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'"endpoint" must be one of {", ".join(ENDPOINTS)}')
+
+        writer.write(response_head(HTTPStatus.OK, [('Content-Type', 'application/x-ndjson'),
+                                                   ('Transfer-Encoding', 'chunked')]))
+        # At most one file per worker of this batch is in flight; the next
+        # one is only started once a result has been written out, so a slow
+        # reader holds back its own batch and nobody else's
+        pending = set()
+        items = iter(enumerate(files))
+        try:
+            while True:
+                for index, item in items:
+                    task = self.batch_item(index, item, endpoint, timeout, profile, budget)
+                    pending.add(asyncio.ensure_future(task))
+                    if len(pending) >= self.pool.workers:
+                        break
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    line = (json.dumps(task.result()) + '\n').encode('utf-8')
+                    writer.write(b'%x\r\n%s\r\n' % (len(line), line))
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def batch_item(self, index, item, endpoint, timeout, profile, budget=None):
+        path = item.get('path') if isinstance(item, dict) else None
+        record = {'index': index, 'path': path}
+        code, language, error = source_item(item, path)
+        record['language'] = language
+        if error:
+            record.update(status='error', error=error)
+            return record
+        record.update(await self.pool.run(endpoint, code, language, timeout, profile, budget))
+        self.metrics.observe_stages(record.get('timings', ()))
+        return record
+
+async def serve(host, port, workers, max_queue, cache_path, default_timeout, max_timeout,
+                profile_dir=None):
+    pool = WorkerPool(workers, max_queue, cache_path, profile_dir=profile_dir)
+    app = AnalysisServer(pool, default_timeout, max_timeout)
+    server = await asyncio.start_server(app.handle, host, port)
+    address = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+    print(f'Serving on {address} with {workers} workers', file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        pool.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the analyzer over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--max-queue', type=int, default=64, help='Requests that may wait for a worker')
+    parser.add_argument('--timeout', type=float, default=30, help='Default per-analysis deadline in seconds')
+    parser.add_argument('--max-timeout', type=float, default=120, help='Largest deadline a request may ask for')
+    parser.add_argument('--cache', default=None, help='SQLite file for the shared result cache')
+    parser.add_argument('--profile-dir', default=None, help='Keep cProfile dumps of profiled requests here')
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    try:
+        if args.profile_dir:
+            os.makedirs(args.profile_dir, exist_ok=True)
+        asyncio.run(serve(args.host, args.port, workers, args.max_queue, args.cache,
+                          args.timeout, args.max_timeout, args.profile_dir))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import ast
+import copy
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from complexity import analyze_python
+from optimizer import DEFAULT_PYTHON_PASSES, complexity_changes, optimize_python_tree, tree_to_source
+from passes import PassReport, PassStats
+
+# ---------------- Speedup Verification ----------------
+# Runs the original and the optimized program in separate, fresh Python
+# processes, checks that they print and compute the same thing, and times
+# them with repeated timeit runs. A rewrite only ships if it is equivalent
+# and not measurably slower.
+
+RUNNER = r'''
+import contextlib, io, json, sys, timeit
+payload = json.loads(sys.stdin.read())
+code = compile(payload['code'], '<submission>', 'exec')
+entry = compile(payload['entry'], '<entry>', 'eval') if payload['entry'] else None
+SIMPLE = (int, float, complex, str, bytes, bool, type(None), list, tuple, dict, set, frozenset)
+
+def run():
+    namespace = {'__name__': '__main__'}
+    exec(code, namespace)
+    result = eval(entry, namespace) if entry is not None else None
+    return namespace, result
+
+out = io.StringIO()
+with contextlib.redirect_stdout(out):
+    namespace, result = run()
+state = {k: repr(v) for k, v in namespace.items() if not k.startswith('__') and isinstance(v, SIMPLE)}
+
+timer = timeit.Timer(run)
+with contextlib.redirect_stdout(io.StringIO()):
+    number = payload['number'] or timer.autorange()[0]
+    samples = [t / number for t in timer.repeat(payload['repeat'], number)]
+sys.stdout.write('\n' + json.dumps({
+    'stdout': out.getvalue(), 'state': state, 'result': repr(result), 'samples': samples,
+}))
+'''
+
+class BenchmarkError(Exception):
+    pass
+
+def run_isolated(code, entry=None, repeat=5, number=0, timeout=30):
+    # Fixed hash seed so set/dict reprs compare equal between processes
+    env = {'PYTHONHASHSEED': '0', 'PATH': os.environ.get('PATH', '')}
+    payload = json.dumps({'code': code, 'entry': entry, 'repeat': repeat, 'number': number})
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            proc = subprocess.run(
+                [sys.executable, '-s', '-c', RUNNER], input=payload, capture_output=True,
+                text=True, timeout=timeout, cwd=workdir, env=env
+            )
+        except subprocess.TimeoutExpired:
+            raise BenchmarkError(f'Timed out after {timeout}s')
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        raise BenchmarkError(lines[-1] if lines else f'Exited with status {proc.returncode}')
+    return json.loads(proc.stdout.rsplit('\n', 1)[-1])
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def bootstrap_interval(baseline, candidate, iterations=1000, confidence=0.95, seed=0):
+    # Confidence interval of median(baseline) / median(candidate)
+    rng = random.Random(seed)
+    ratios = []
+    for _ in range(iterations):
+        b = statistics.median(rng.choices(baseline, k=len(baseline)))
+        c = statistics.median(rng.choices(candidate, k=len(candidate)))
+        ratios.append(b / c if c else float('inf'))
+    tail = (1 - confidence) / 2
+    return percentile(ratios, tail), percentile(ratios, 1 - tail)
+
+class SpeedupResult:
+    def __init__(self, equivalent, baseline, candidate, mismatch=None):
+        self.equivalent = equivalent
+        self.mismatch = mismatch
+        self.baseline = baseline
+        self.candidate = candidate
+        ratios = [b / c for b, c in zip(baseline, candidate) if c]
+        self.median = statistics.median(baseline) / statistics.median(candidate)
+        self.p95 = percentile(ratios, 0.95) if ratios else self.median
+        self.ci_low, self.ci_high = bootstrap_interval(baseline, candidate)
+
+    @property
+    def verdict(self):
+        if not self.equivalent:
+            return 'not equivalent'
+        if self.ci_low > 1:
+            return 'faster'
+        if self.ci_high < 1:
+            return 'slower'
+        return 'no significant change'
+
+    @property
+    def accepted(self):
+        return self.equivalent and self.verdict != 'slower' and self.median >= 1
+
+    def as_dict(self):
+        return {
+            'equivalent': self.equivalent,
+            'mismatch': self.mismatch,
+            'median_speedup': round(self.median, 3),
+            'p95_speedup': round(self.p95, 3),
+            'ci_low': round(self.ci_low, 3),
+            'ci_high': round(self.ci_high, 3),
+            'verdict': self.verdict,
+            'accepted': self.accepted,
+        }
+
+def measure_speedup(original, optimized, entry=None, rounds=3, repeat=5, timeout=30):
+    # Alternate the two programs across rounds so drift hits both equally
+    baseline, candidate = [], []
+    reference = other = None
+    for _ in range(rounds):
+        first = run_isolated(original, entry, repeat, timeout=timeout)
+        second = run_isolated(optimized, entry, repeat, timeout=timeout)
+        reference = reference or first
+        other = other or second
+        baseline.extend(first['samples'])
+        candidate.extend(second['samples'])
+
+    mismatch = None
+    for field in ('stdout', 'result', 'state'):
+        if reference[field] != other[field]:
+            mismatch = field
+            break
+    return SpeedupResult(mismatch is None, baseline, candidate, mismatch)
+
+def optimize_python_verified(code, entry=None, passes=None, **measure_options):
+    # Applies the passes one at a time and keeps each only if it measurably
+    # does not make the program slower. Returns (code, decisions, report,
+    # complexity changes), where the PassReport and the changes cover the
+    # accepted passes only. Each pass works on a copy of the tree the
+    # accepted ones left, so findings keep the lines of the original code.
+    tree = ast.parse(code)
+    before = analyze_python(tree)
+    current = code
+    decisions = []
+    stats = []
+    findings = []
+    iterations = 0
+    converged = True
+    for pass_class in passes or DEFAULT_PYTHON_PASSES:
+        decision = {'pass': pass_class.name}
+        stats.append(PassStats(pass_class.name))
+        candidate_tree, report = optimize_python_tree(copy.deepcopy(tree), [pass_class])
+        if not report.total_changes:
+            decision['verdict'] = 'no change'
+            decisions.append(decision)
+            continue
+        candidate = tree_to_source(candidate_tree)
+        try:
+            result = measure_speedup(current, candidate, entry, **measure_options)
+        except BenchmarkError as e:
+            decision.update(verdict='benchmark failed', error=str(e), accepted=False)
+            decisions.append(decision)
+            continue
+        decision.update(result.as_dict())
+        decisions.append(decision)
+        if result.accepted:
+            current, tree = candidate, candidate_tree
+            stats[-1] = report.stats[0]
+            findings.extend(report.findings)
+            iterations = max(iterations, report.iterations)
+            converged = converged and report.converged
+    report = PassReport(stats, iterations, converged, findings)
+    return current, decisions, report, complexity_changes(before, analyze_python(tree))
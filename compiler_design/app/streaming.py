@@ -0,0 +1,102 @@
+import codecs
+import os
+from analyzer import (TOKEN_WINDOW, cpp_java_logic_facts, format_cpp_java_logic, format_cpp_java_syntax,
+                      missing_return_type, missing_semicolon, syntax_token_facts)
+from instrumentation import stage
+from lexer import TRIVIA, BlockBuilder, lex_lines
+from optimizer import rewrite_cpp_java_line
+
+# ---------------- Streaming C++/Java Analysis ----------------
+# For sources too large to hold in memory several times over: the file is
+# read in chunks and goes through the lexer, the brace tracker, the syntax
+# and logic rules and the token rewriter one line at a time, so memory
+# stays flat whatever the file size (apart from the reported line numbers).
+# Syntax and logic verdicts are the same as run_pipeline's. Complexity needs
+# the tokens of whole functions and is not part of this mode.
+
+CHUNK_SIZE = 1 << 16
+
+def read_lines(source, chunk_size=CHUNK_SIZE):
+    # The lines code.split('\n') would give for the whole text. source is a
+    # path or a file-like object opened in text or binary (UTF-8) mode.
+    opened = isinstance(source, (str, os.PathLike))
+    f = open(source, encoding='utf-8', errors='replace') if opened else source
+    decoder = None
+    try:
+        # Pieces of the line that is not complete yet, joined once it is, so
+        # a very long line does not get copied again for every chunk
+        pending = []
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if isinstance(chunk, bytes):
+                decoder = decoder or codecs.getincrementaldecoder('utf-8')(errors='replace')
+                chunk = decoder.decode(chunk)
+            if '\n' not in chunk:
+                pending.append(chunk)
+                continue
+            lines = chunk.split('\n')
+            pending.append(lines[0])
+            lines[0] = ''.join(pending)
+            pending = [lines.pop()]
+            yield from lines
+        if decoder is not None:
+            pending.append(decoder.decode(b'', final=True))
+        yield ''.join(pending)
+    finally:
+        if opened:
+            f.close()
+
+def analyze_stream(source, language, out=None, chunk_size=CHUNK_SIZE):
+    # {'syntax', 'logic', 'lines'}; the optimized code is written to out
+    # (any object with write()) as it is produced. Unlike optimize_code,
+    # empty lines are kept, so line n of the output is line n of the input.
+    if language not in ('C++', 'Java'):
+        raise ValueError(f'Streaming analysis supports C++ and Java, not {language}')
+    builder = BlockBuilder(keep_closed=False)
+    syntax = {'semicolons': [], 'return_types': []}
+    syntax.update(syntax_token_facts([], language))
+    logic = cpp_java_logic_facts([])
+    window = []
+    previous = None
+    lineno = 0
+    with stage('stream'):
+        for lineno, line_tokens in lex_lines(read_lines(source, chunk_size), language):
+            line = missing_semicolon(line_tokens)
+            if line is not None:
+                syntax['semicolons'].append(line)
+
+            code_tokens = [t for t in line_tokens if t.kind not in TRIVIA]
+            for token in code_tokens:
+                builder.feed(token)
+                # A '{' always opens a block; functions are checked as they open
+                if (language == 'C++' and token.text == '{' and builder.stack[-1].kind == 'function' and
+                        missing_return_type(builder.stack[-1])):
+                    syntax['return_types'].append(builder.stack[-1].line)
+            if code_tokens:
+                # Patterns that start on this line may end on a later one,
+                # so the last tokens are looked at again with the next line
+                window = window[1 - TOKEN_WINDOW:] + code_tokens
+                _or_facts(syntax, syntax_token_facts(window, language))
+                _or_facts(logic, cpp_java_logic_facts(window))
+
+            if out is not None:
+                tokens, previous = rewrite_cpp_java_line(line_tokens, language, previous)
+                if lineno > 1:
+                    out.write('\n')
+                out.write(''.join(t.text for t in tokens))
+        builder.finish(lineno)
+    syntax['unbalanced'] = bool(builder.errors)
+
+    syntax_errors = format_cpp_java_syntax(syntax, language)
+    logic_errors = format_cpp_java_logic(logic, language)
+    return {
+        'syntax': '\n'.join(syntax_errors) if syntax_errors else 'No syntax errors detected.',
+        'logic': '\n'.join(logic_errors) if logic_errors else 'No logical errors detected',
+        'lines': lineno,
+    }
+
+def _or_facts(facts, update):
+    for name, value in update.items():
+        facts[name] = facts[name] or value
@@ -0,0 +1,223 @@
+import ast
+
+# ---------------- Scope-aware Def/Use Index ----------------
+# Built in one pass over the tree. Every module, function, lambda, class and
+# comprehension gets a Scope; names are resolved the same way CPython does
+# (local, then enclosing functions skipping class bodies, then global), so
+# "is this binding ever read?" is a set lookup and shadowed names are kept
+# apart.
+
+class Scope:
+    def __init__(self, kind, name, node, parent):
+        self.kind = kind
+        self.name = name
+        self.node = node
+        self.parent = parent
+        self.globals = set()
+        self.nonlocals = set()
+        self.stored = set()
+        self.loaded = set()
+        self.reads = set()
+        self.locals = set()
+
+    def is_read(self, name):
+        return name in self.reads
+
+    def __repr__(self):
+        return f'<Scope {self.kind} {self.name}>'
+
+
+class SymbolTable(ast.NodeVisitor):
+    def __init__(self, tree):
+        self.module = Scope('module', '<module>', tree, None)
+        self.scopes = {tree: self.module}
+        self._current = self.module
+        self._stores = {}
+        self.visit(tree)
+        self._resolve_reads()
+
+    # ---- Queries ----
+    def scope_of(self, node):
+        # Scope owned by a Module/FunctionDef/ClassDef/Lambda/comprehension
+        return self.scopes.get(node)
+
+    def binding_scope(self, name_node):
+        # Scope a stored ast.Name actually binds in (honours global/nonlocal)
+        scope = self._stores.get(name_node)
+        if scope is None:
+            return None
+        return self._lookup(scope, name_node.id, store=True)
+
+    def is_read(self, name_node):
+        scope = self.binding_scope(name_node)
+        return scope is not None and name_node.id in scope.reads
+
+    # ---- Collection ----
+    def _enter(self, kind, name, node):
+        scope = Scope(kind, name, node, self._current)
+        self.scopes[node] = scope
+        self._current = scope
+        return scope
+
+    def _leave(self, scope):
+        self._current = scope.parent
+
+    def _store(self, name, scope=None):
+        (scope or self._current).stored.add(name)
+
+    def _bind_arguments(self, args):
+        for arg in args.posonlyargs + args.args + args.kwonlyargs:
+            self._store(arg.arg)
+        if args.vararg:
+            self._store(args.vararg.arg)
+        if args.kwarg:
+            self._store(args.kwarg.arg)
+
+    def _visit_argument_defaults(self, args):
+        for default in args.defaults:
+            self.visit(default)
+        for default in args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None and arg.annotation is not None:
+                self.visit(arg.annotation)
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_argument_defaults(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        self._store(node.name)
+        scope = self._enter('function', node.name, node)
+        self._bind_arguments(node.args)
+        for stmt in node.body:
+            self.visit(stmt)
+        self._leave(scope)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._visit_argument_defaults(node.args)
+        scope = self._enter('function', '<lambda>', node)
+        self._bind_arguments(node.args)
+        self.visit(node.body)
+        self._leave(scope)
+
+    def visit_ClassDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        for base in node.bases:
+            self.visit(base)
+        for keyword in node.keywords:
+            self.visit(keyword)
+        self._store(node.name)
+        scope = self._enter('class', node.name, node)
+        for stmt in node.body:
+            self.visit(stmt)
+        self._leave(scope)
+
+    def _visit_comprehension(self, node, *elts):
+        # The first iterable is evaluated in the enclosing scope
+        self.visit(node.generators[0].iter)
+        scope = self._enter('comprehension', type(node).__name__, node)
+        for i, generator in enumerate(node.generators):
+            self.visit(generator.target)
+            if i:
+                self.visit(generator.iter)
+            for cond in generator.ifs:
+                self.visit(cond)
+        for elt in elts:
+            self.visit(elt)
+        self._leave(scope)
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, node.elt)
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, node.key, node.value)
+
+    def visit_Global(self, node):
+        self._current.globals.update(node.names)
+
+    def visit_Nonlocal(self, node):
+        self._current.nonlocals.update(node.names)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self._current.loaded.add(node.id)
+        elif isinstance(node.ctx, ast.Store):
+            self._stores[node] = self._current
+            self._store(node.id)
+
+    def visit_AugAssign(self, node):
+        # x += 1 reads x before rebinding it
+        if isinstance(node.target, ast.Name):
+            self._current.loaded.add(node.target.id)
+        self.generic_visit(node)
+
+    def visit_NamedExpr(self, node):
+        # Walrus targets inside comprehensions bind in the enclosing scope
+        scope = self._current
+        while scope.kind == 'comprehension':
+            scope = scope.parent
+        self._stores[node.target] = scope
+        self._store(node.target.id, scope)
+        self.visit(node.value)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.name != '*':
+                self._store(alias.asname or alias.name.split('.')[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self._store(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self._store(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self._store(node.name)
+
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self._store(node.rest)
+        self.generic_visit(node)
+
+    # ---- Resolution ----
+    def _resolve_reads(self):
+        for scope in self.scopes.values():
+            scope.locals = scope.stored - scope.globals - scope.nonlocals
+        for scope in self.scopes.values():
+            for name in scope.loaded:
+                self._lookup(scope, name).reads.add(name)
+
+    def _lookup(self, scope, name, store=False):
+        if name in scope.globals:
+            return self.module
+        if name in scope.locals or (store and name not in scope.nonlocals):
+            return scope
+        parent = scope.parent
+        while parent is not None:
+            if parent.kind == 'class':
+                parent = parent.parent
+                continue
+            if parent is self.module:
+                break
+            if name in parent.globals:
+                return self.module
+            if name in parent.locals:
+                return parent
+            parent = parent.parent
+        return self.module
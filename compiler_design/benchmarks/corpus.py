@@ -0,0 +1,259 @@
+import random
+
+# ---------------- Benchmark Corpus ----------------
+# Deterministic sources for every language, built from small realistic
+# blocks (loops, recursion, string building, classes, binary search) until
+# the requested number of lines is reached, plus adversarial inputs that
+# target the parser, the brace tracker and the lexer's regular expressions.
+
+SIZES = (10, 100, 1000, 10000, 100000)
+
+PYTHON_HEADER = 'import math\n'
+PYTHON_BLOCKS = [
+    '''
+def total_{i}(items, n):
+    result = 0
+    for x in items:
+        for y in range(n):
+            result += x * y
+    return result
+''',
+    '''
+def render_{i}(rows):
+    out = ''
+    for row in rows:
+        out += str(row) + ','
+    return out
+''',
+    '''
+def fib_{i}(n):
+    if n < 2:
+        return n
+    return fib_{i}(n - 1) + fib_{i}(n - 2)
+''',
+    '''
+class Store{i}:
+    def __init__(self):
+        self.items = []
+
+    def evens(self, values):
+        found = []
+        for v in values:
+            if v % 2 == 0:
+                found.append(v)
+        return found
+''',
+    '''
+LIMIT_{i} = {k}
+unused_{i} = LIMIT_{i} * 2
+
+def search_{i}(values, target):
+    lo, hi = 0, len(values) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if values[mid] < target:
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return lo
+''',
+    '''
+def norms_{i}(points):
+    result = []
+    for i in range(len(points)):
+        result.append(math.sqrt(points[i] * points[i] + {k}))
+    if {k} in [1, 2, 3, 5, 8, 13]:
+        return result
+    return result[:{k}]
+''',
+]
+
+CPP_HEADER = '#include <iostream>\n#include <vector>\nusing namespace std;\n'
+CPP_BLOCKS = [
+    '''
+int total_{i}(vector<int>& items, int n) {
+    int result = 0;
+    for (int x = 0; x < items.size(); x++) {
+        for (int y = 0; y < n; y++) {
+            result += items[x] * y;
+        }
+    }
+    return (result);
+}
+''',
+    '''
+int search_{i}(vector<int>& v, int target) {
+    int lo = 0, hi = v.size() - 1;
+    while (lo <= hi) {
+        int mid = (lo + hi) / 2;
+        if (v[mid] < target) lo = mid + 1;
+        else hi = mid - 1;
+    }
+    return lo;
+}
+''',
+    '''
+int fib_{i}(int n) {
+    if (n < 2) return n;
+    return fib_{i}(n - 1) + fib_{i}(n - 2);
+}
+''',
+    '''
+class Store{i} {
+public:
+    vector<int> items;
+    int count() {
+        int c = 0;
+        for (int i = 0; i < items.size(); i++)
+            c += items[i] > {k};
+        return c;
+    }
+};
+''',
+    '''
+void report_{i}(int value) {
+    int unused;
+    cout << "value: " << value << endl;
+    while (value > {k}) value /= 2;;
+}
+''',
+]
+
+JAVA_HEADER = 'import java.util.*;\n\npublic class Corpus {\n'
+JAVA_FOOTER = '}\n'
+JAVA_BLOCKS = [
+    '''
+    int total{i}(int[] items, int n) {
+        int result = 0;
+        for (int x = 0; x < items.length; x++) {
+            for (int y = 0; y < n; y++) {
+                result += items[x] * y;
+            }
+        }
+        return (result);
+    }
+''',
+    '''
+    int search{i}(int[] v, int target) {
+        int lo = 0, hi = v.length - 1;
+        while (lo <= hi) {
+            int mid = (lo + hi) / 2;
+            if (v[mid] < target) lo = mid + 1;
+            else hi = mid - 1;
+        }
+        return lo;
+    }
+''',
+    '''
+    int fib{i}(int n) {
+        if (n < 2) return n;
+        return fib{i}(n - 1) + fib{i}(n - 2);
+    }
+''',
+    '''
+    static class Store{i} {
+        List<Integer> items = new ArrayList<>();
+        String describe() {
+            return "Store" + "{i}" + ": " + items.size();
+        }
+    }
+''',
+    '''
+    void report{i}(String name) {
+        int unused;
+        System.out.println(name.trim() + "{k}");
+    }
+''',
+]
+
+LANGUAGE_PARTS = {
+    'Python': (PYTHON_HEADER, PYTHON_BLOCKS, ''),
+    'C++': (CPP_HEADER, CPP_BLOCKS, ''),
+    'Java': (JAVA_HEADER, JAVA_BLOCKS, JAVA_FOOTER),
+}
+
+def generate(language, lines, seed=0):
+    # Whole blocks are added until the source has at least `lines` lines
+    header, blocks, footer = LANGUAGE_PARTS[language]
+    rng = random.Random(f'{language}:{lines}:{seed}')
+    parts = [header]
+    count = header.count('\n') + footer.count('\n')
+    i = 0
+    while count < lines:
+        # Templates hold C++/Java braces, so placeholders are replaced by hand
+        block = rng.choice(blocks).replace('{i}', str(i)).replace('{k}', str(rng.randrange(1, 100)))
+        parts.append(block)
+        count += block.count('\n')
+        i += 1
+    parts.append(footer)
+    return ''.join(parts)
+
+# ---------------- Adversarial Inputs ----------------
+def deep_nesting(language):
+    if language == 'Python':
+        # The tokenizer allows 100 indentation levels and 200 open brackets
+        body = [f'{"    " * d}for i{d} in range(2):' for d in range(90)]
+        body.append(f'{"    " * 90}total = {"(" * 150}i0{")" * 150}')
+        return 'def nested():\n' + '\n'.join('    ' + line for line in body) + '\n    return total\n'
+    depth = 3000
+    opening = '\n'.join(f'for (int i{d} = 0; i{d} < 2; i{d}++) {{' for d in range(depth))
+    expression = f'int x = {"(" * depth}1{")" * depth};'
+    body = f'{opening}\n{expression}\n{"}" * depth}'
+    if language == 'Java':
+        return f'public class Nested {{\n    void nested() {{\n{body}\n    }}\n}}\n'
+    return f'void nested() {{\n{body}\n}}\n'
+
+def huge_literals(language, items=200000, text_bytes=1 << 20):
+    numbers = ', '.join(str(n % 1000) for n in range(items))
+    text = 'x' * text_bytes
+    if language == 'Python':
+        return f'DATA = [{numbers}]\nTEXT = "{text}"\nTABLE = {{{", ".join(f"{n}: {n}" for n in range(items // 4))}}}\n'
+    if language == 'Java':
+        return (f'public class Literals {{\n    static int[] DATA = {{{numbers}}};\n'
+                f'    static String TEXT = "{text}";\n}}\n')
+    return f'int DATA[] = {{{numbers}}};\nconst char* TEXT = "{text}";\n'
+
+def regex_bait(language, width=50000):
+    # Inputs aimed at the lexer's alternatives: unterminated literals full of
+    # escapes, unclosed block comments, directives padded with whitespace,
+    # runs of quotes and operators, and very long concatenation chains
+    lines = [
+        '"' + '\\"' * width,
+        "'" * (2 * width + 1),
+        'x = ' + '\\' * width,
+        '/*' + ' *' * width,
+        ' * still inside the comment {',
+        '*/ int after_comment = 1;',
+        'int y = ' + ' + '.join(['"ab"'] * (width // 10)) + ';',
+        'System.out.println(' * 1000 + ')' * 1000 + ';',
+        'int ' + ', '.join(f'v{n} = 0' for n in range(width // 10)) + ';',
+        'z' * (width * 4) + ' = 1;',
+        '<' * width + '>' * width,
+    ]
+    if language == 'C++':
+        lines.append('#' + ' ' * width + 'include' + ' ' * width + '<iostream')
+        lines.append('#define LONG \\')
+        lines.extend(['    continued \\'] * 1000)
+        lines.append('    end')
+    body = '\n'.join(lines)
+    if language == 'Java':
+        return f'public class Bait {{\n    void bait() {{\n{body}\n    }}\n}}\n'
+    return f'void bait() {{\n{body}\n}}\n'
+
+ADVERSARIAL = {
+    'deep_nesting': deep_nesting,
+    'huge_literals': huge_literals,
+    'regex_bait': regex_bait,
+}
+
+def corpus(max_lines=SIZES[-1], languages=('Python', 'C++', 'Java'), adversarial=True):
+    # (sample name, language, source) for every size up to max_lines
+    for language in languages:
+        for size in SIZES:
+            if size <= max_lines:
+                yield f'{size}_lines', language, generate(language, size)
+        if adversarial:
+            for name, build in ADVERSARIAL.items():
+                if name == 'regex_bait' and language == 'Python':
+                    continue
+                yield name, language, build(language)
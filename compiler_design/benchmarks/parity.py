@@ -0,0 +1,64 @@
+from incremental import IncrementalPipeline
+from pipeline import run_pipeline
+
+# ---------------- Incremental Parity ----------------
+# IncrementalPipeline must answer exactly what run_pipeline answers for the
+# same file; only the round count and the time spent per pass may differ.
+# Every sample is analyzed both ways, and again incrementally after an edit
+# to its first unit, so cached units are combined with fresh ones.
+
+# Files whose passes change bindings between rounds or across units
+PARITY_CASES = [
+    ('branch_binding', 'Python', '''import math
+
+if True:
+    b = 2
+else:
+    b = 3
+print(b)
+'''),
+    ('cross_unit_binding', 'Python', '''LIMIT = 10
+
+def bounded(x):
+    return min(x, LIMIT)
+
+if False:
+    LIMIT = 20
+print(LIMIT)
+'''),
+    ('shifted_finding', 'Python', '''import math
+
+def count(xs):
+    allowed = ['a', 'b', 'c', 'd', 'e']
+    n = 0
+    for x in xs:
+        if str(x) in allowed:
+            n += 1
+    return n
+'''),
+]
+
+def comparable(results):
+    passes = results['optimization_passes']
+    if passes:
+        passes = {'passes': [{'pass': p['pass'], 'changes': p['changes']} for p in passes['passes']],
+                  'findings': passes['findings']}
+    return dict(results, optimization_passes=passes)
+
+def edited(code, language):
+    comment = '# edited' if language == 'Python' else '// edited'
+    return f'{comment}\n{code}'
+
+def check_parity(samples):
+    # Names of the (name, language, code) samples where the two disagree,
+    # with the fields that differ
+    incremental = IncrementalPipeline()
+    mismatches = []
+    for name, language, code in samples:
+        for label, source in ((name, code), (f'{name} (edited)', edited(code, language))):
+            expected = comparable(run_pipeline(source, language))
+            actual = comparable(incremental(source, language))
+            fields = sorted(field for field in expected if expected[field] != actual.get(field))
+            if fields:
+                mismatches.append({'sample': label, 'language': language, 'fields': fields})
+    return mismatches
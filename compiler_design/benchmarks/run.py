@@ -0,0 +1,340 @@
+import argparse
+import ast
+import gc
+import inspect
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import analyzer
+import complexity
+import optimizer
+from context import AnalysisContext
+from lexer import lex
+from pipeline import ANALYZER_VERSION
+from corpus import SIZES, corpus
+from startup import measure_startup
+from parity import PARITY_CASES, check_parity
+
+# ---------------- Benchmark Runner ----------------
+# Times every public function of analyzer.py, complexity.py and optimizer.py
+# on the generated corpus and records its throughput (lines per second, from
+# the fastest call) and its peak traced allocation. Arguments are rebuilt
+# before every call and outside the timed region, so caches on a context
+# never carry over between calls.
+#
+#   python benchmarks/run.py --output baseline.json
+#   python benchmarks/run.py --baseline baseline.json --threshold 0.25
+#
+# Cold start (import time, time to the first analysis) is measured in fresh
+# interpreters as well, see startup.py.
+#
+# The incremental pipeline is checked against run_pipeline on the samples up
+# to --parity-lines lines (parity.py); any disagreement fails the run.
+#
+# With --baseline the run exits with status 1 when any function got slower
+# or allocates more than the threshold allows, or stopped working on an input.
+
+MODULES = (analyzer, complexity, optimizer)
+ALL = ('Python', 'C++', 'Java')
+PY = ('Python',)
+CJ = ('C++', 'Java')
+# Constant-time helpers run once, on the smallest Python sample
+SMALL = 'small'
+
+class Sample:
+    def __init__(self, name, language, code):
+        self.name = name
+        self.language = language
+        self.code = code
+        self.lines = code.count('\n') + 1
+        self._lexed = None
+        self._tree = None
+
+    def ctx(self):
+        return AnalysisContext(self.code, self.language)
+
+    def tree(self):
+        return ast.parse(self.code)
+
+    @property
+    def lexed(self):
+        # Lexed sources are only read by the analyses, so one is shared
+        if self._lexed is None:
+            self._lexed = lex(self.code, self.language)
+        return self._lexed
+
+    @property
+    def parsed(self):
+        if self._tree is None:
+            self._tree = ast.parse(self.code)
+        return self._tree
+
+    def widest_line(self):
+        return max(self.lexed.lines, key=len)
+
+    def first_block(self):
+        return next(b for b in self.lexed.root.walk() if b.kind != 'root')
+
+    def first_function(self):
+        return next(n for n in ast.walk(self.parsed) if isinstance(n, ast.FunctionDef))
+
+# ---- Cases ----
+# Qualified function name -> (languages, argument builder[, consume]). A
+# public function without a case fails the run, so new ones get benchmarked.
+CASES = {
+    'analyzer.check_cpp_java_logic': (CJ, lambda s: (s.code, s.language)),
+    'analyzer.check_cpp_java_logic_tokens': (CJ, lambda s: (s.lexed.tokens, s.language)),
+    'analyzer.check_cpp_java_syntax': (CJ, lambda s: (s.lexed, s.language)),
+    'analyzer.check_python_logic': (PY, lambda s: (s.tree(),)),
+    'analyzer.check_python_logic_ctx': (PY, lambda s: (s.ctx(),)),
+    'analyzer.combine_python_logic': (PY, lambda s: ([analyzer.python_logic_facts(s.ctx())],)),
+    'analyzer.cpp_java_logic_facts': (CJ, lambda s: (s.lexed.tokens,)),
+    'analyzer.cpp_java_syntax_facts': (CJ, lambda s: (s.lexed, s.language)),
+    'analyzer.detect_logical_errors': (ALL, lambda s: (s.code, s.language)),
+    'analyzer.detect_logical_errors_ctx': (ALL, lambda s: (s.ctx(),)),
+    'analyzer.detect_syntax_errors': (ALL, lambda s: (s.code, s.language)),
+    'analyzer.detect_syntax_errors_ctx': (ALL, lambda s: (s.ctx(),)),
+    'analyzer.format_cpp_java_logic': (CJ, lambda s: (analyzer.cpp_java_logic_facts(s.lexed.tokens), s.language)),
+    'analyzer.format_cpp_java_syntax': (CJ, lambda s: (analyzer.cpp_java_syntax_facts(s.lexed, s.language),
+                                                       s.language)),
+    'analyzer.is_valid_code': (ALL, lambda s: (s.code,)),
+    # A name that never occurs makes it walk the whole tree
+    'analyzer.is_variable_used': (PY, lambda s: (s.tree(), '__not_used__')),
+    'analyzer.missing_return_type': (('C++',), lambda s: (s.first_block(),)),
+    'analyzer.missing_semicolon': (CJ, lambda s: (s.widest_line(),)),
+    'analyzer.python_logic_facts': (PY, lambda s: (s.ctx(),)),
+    'analyzer.syntax_token_facts': (CJ, lambda s: (s.lexed.tokens, s.language)),
+
+    'complexity.add_costs': (SMALL, lambda s: ((0, 2, 1), (0, 1, 2))),
+    'complexity.analyze_cpp_java': (CJ, lambda s: (s.lexed,)),
+    'complexity.analyze_cpp_java_complexity': (CJ, lambda s: (s.code, s.language)),
+    'complexity.analyze_cpp_java_space_complexity': (CJ, lambda s: (s.code, s.language)),
+    'complexity.analyze_python': (PY, lambda s: (s.tree(),)),
+    'complexity.analyze_python_complexity': (PY, lambda s: (s.tree(),)),
+    'complexity.analyze_python_space_complexity': (PY, lambda s: (s.tree(),)),
+    'complexity.analyze_space_complexity': (ALL, lambda s: (s.code, s.language)),
+    'complexity.analyze_space_complexity_ctx': (ALL, lambda s: (s.ctx(),)),
+    'complexity.analyze_time_complexity': (ALL, lambda s: (s.code, s.language)),
+    'complexity.analyze_time_complexity_ctx': (ALL, lambda s: (s.ctx(),)),
+    'complexity.combine_reports': (ALL, lambda s: ([(0, complexity.complexity_report_ctx(s.ctx()))] * 4,)),
+    'complexity.complexity_report_ctx': (ALL, lambda s: (s.ctx(),)),
+    'complexity.format_time_cost': (SMALL, lambda s: ((1, 3, 2),)),
+    'complexity.is_memoized': (SMALL, lambda s: (s.first_function(),)),
+    'complexity.resolve_recurrences': (ALL, lambda s: (complexity.complexity_report_ctx(s.ctx()).functions,)),
+
+    'optimizer.complexity_changes': (PY, lambda s: (complexity.complexity_report_ctx(s.ctx()),
+                                                    complexity.analyze_python(s.tree()))),
+    'optimizer.optimize_code': (ALL, lambda s: (s.code, s.language)),
+    'optimizer.optimize_code_ctx': (ALL, lambda s: (s.ctx(),)),
+    'optimizer.optimize_cpp_code': (('C++',), lambda s: (s.code,)),
+    'optimizer.optimize_java_code': (('Java',), lambda s: (s.code,)),
+    'optimizer.optimize_python_code': (PY, lambda s: (s.code,)),
+    'optimizer.optimize_python_ctx': (PY, lambda s: (s.ctx(),)),
+    'optimizer.optimize_python_tree': (PY, lambda s: (s.tree(),)),
+    'optimizer.python_optimization_ctx': (PY, lambda s: (s.ctx(),)),
+    'optimizer.rewrite_cpp_java_line': (CJ, lambda s: (s.widest_line(), s.language, None)),
+    'optimizer.rewrite_cpp_java_lines': (CJ, lambda s: (enumerate(s.lexed.lines, 1), s.language), True),
+    'optimizer.tree_to_source': (PY, lambda s: (s.tree(),)),
+}
+
+def public_functions():
+    for module in MODULES:
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            if function.__module__ == module.__name__ and not name.startswith('_'):
+                yield f'{module.__name__}.{name}', function
+
+# ---------------- Measurement ----------------
+def measure(function, build, consume, min_time, max_calls, budget):
+    # Fastest of several calls (three at least, unless they already took a
+    # second), then one more call under tracemalloc for the peak. Building
+    # the arguments can cost more than the call, so it counts towards the
+    # case's wall time.
+    best = float('inf')
+    total = 0.0
+    calls = 0
+    began = time.perf_counter()
+    while calls < max_calls:
+        args = build()
+        gc.collect()
+        start = time.perf_counter()
+        result = function(*args)
+        if consume:
+            result = list(result)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        calls += 1
+        if elapsed > budget or (total >= min_time and (calls >= 3 or total >= 1.0)):
+            break
+        if calls >= 3 and time.perf_counter() - began > max(min_time, 2.0):
+            break
+
+    args = build()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        if consume:
+            result = list(result)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, calls, peak
+
+def run(samples, names=None, min_time=0.2, max_calls=50, budget=10.0, log=None):
+    functions = dict(public_functions())
+    uncovered = sorted(set(functions) - set(CASES))
+    results = []
+    skipped = []
+    for name, case in CASES.items():
+        if name not in functions or (names and not any(part in name for part in names)):
+            continue
+        languages, build = case[:2]
+        consume = len(case) > 2 and case[2]
+        # Language -> key of the record that went over budget
+        over_budget = {}
+        for sample in samples:
+            if languages == SMALL:
+                if (sample.language, sample.name) != ('Python', f'{SIZES[0]}_lines'):
+                    continue
+            elif sample.language not in languages:
+                continue
+            key = f'{name}|{sample.language}|{sample.name}'
+            # Sizes grow in order, so once a function is over budget on a
+            # language the larger generated samples are skipped
+            if sample.language in over_budget and sample.name.endswith('_lines'):
+                skipped.append({'key': key, 'after': over_budget[sample.language],
+                                'reason': f'over the {budget}s budget on a smaller sample'})
+                continue
+            record = {'key': key, 'function': name, 'language': sample.language, 'sample': sample.name,
+                      'lines': sample.lines, 'bytes': len(sample.code)}
+            try:
+                seconds, calls, peak = measure(functions[name], lambda: build(sample), consume,
+                                               min_time, max_calls, budget)
+            except Exception as e:
+                record['error'] = f'{type(e).__name__}: {e}'[:200]
+            else:
+                record.update({'seconds': seconds, 'calls': calls, 'peak_bytes': peak,
+                               'lines_per_second': sample.lines / seconds if seconds else None})
+                if seconds > budget:
+                    record['over_budget'] = True
+                    if sample.name.endswith('_lines'):
+                        over_budget[sample.language] = key
+            results.append(record)
+            if log:
+                log(record)
+    return {'results': results, 'skipped': skipped, 'uncovered': uncovered}
+
+# ---------------- Regression Check ----------------
+def compare(baseline, current, threshold, min_seconds=0.0005, min_bytes=65536):
+    # Slower or bigger than baseline * (1 + threshold), ignoring differences
+    # below the absolute floors where timer and allocator noise dominate.
+    # A case the baseline measured but this run skipped because a smaller
+    # sample went over budget is a regression too.
+    before = {r['key']: r for r in baseline['results']}
+    regressions = []
+    for skip in current.get('skipped', []):
+        old = before.get(skip['key'])
+        if old is not None and 'error' not in old:
+            regressions.append({'key': skip['key'], 'metric': 'skipped', 'baseline': old['seconds'],
+                                'current': f"over budget on {skip['after']}"})
+    for record in current['results']:
+        old = before.get(record['key'])
+        if old is None:
+            continue
+        if 'error' in record:
+            if 'error' not in old:
+                regressions.append({'key': record['key'], 'metric': 'error', 'baseline': None,
+                                    'current': record['error']})
+            continue
+        if 'error' in old:
+            continue
+        for metric, floor in (('seconds', min_seconds), ('peak_bytes', min_bytes)):
+            limit = old[metric] * (1 + threshold)
+            if record[metric] > limit and record[metric] - old[metric] > floor:
+                regressions.append({'key': record['key'], 'metric': metric, 'baseline': old[metric],
+                                    'current': record[metric],
+                                    'ratio': round(record[metric] / old[metric], 3) if old[metric] else None})
+    return regressions
+
+def format_record(record):
+    label = f"{record['function']:<45} {record['language']:<6} {record['sample']:<14}"
+    if 'error' in record:
+        return f"{label} ERROR {record['error']}"
+    return (f"{label} {record['seconds'] * 1000:>10.3f} ms {record['lines_per_second'] or 0:>12.0f} lines/s "
+            f"{record['peak_bytes'] / 1024:>10.1f} KiB{' OVER BUDGET' if record.get('over_budget') else ''}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the analyzer, complexity and optimizer functions')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown or memory growth as a fraction (default 0.25)')
+    parser.add_argument('--max-lines', type=int, default=SIZES[-1],
+                        help=f'largest generated sample (one of {", ".join(map(str, SIZES))})')
+    parser.add_argument('--language', action='append', choices=ALL, help='only these languages')
+    parser.add_argument('--function', action='append', help='only functions whose name contains this')
+    parser.add_argument('--no-adversarial', action='store_true', help='skip the adversarial inputs')
+    parser.add_argument('--min-time', type=float, default=0.2, help='time spent per case before stopping')
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help='seconds per call after which larger samples are skipped')
+    parser.add_argument('--startup-repeats', type=int, default=5,
+                        help='fresh interpreters per startup measurement (0 skips them)')
+    parser.add_argument('--parity-lines', type=int, default=1000,
+                        help='largest sample the incremental pipeline is checked on (0 skips the check)')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    samples = [Sample(name, language, code) for name, language, code in
+               corpus(args.max_lines, tuple(args.language or ALL), not args.no_adversarial)]
+    log = None if args.quiet else lambda record: print(format_record(record), flush=True)
+    report = run(samples, args.function, args.min_time, budget=args.budget, log=log)
+    if args.startup_repeats and not args.function:
+        report['results'].extend(measure_startup(args.startup_repeats, log))
+    report['meta'] = {
+        'analyzer_version': ANALYZER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'max_lines': args.max_lines,
+    }
+
+    status = 0
+    if args.parity_lines and not args.function:
+        checked = [(name, language, code) for name, language, code in
+                   corpus(args.parity_lines, tuple(args.language or ALL), False)]
+        checked.extend(case for case in PARITY_CASES if case[1] in (args.language or ALL))
+        report['parity'] = check_parity(checked)
+        for mismatch in report['parity']:
+            print(f"PARITY {mismatch['sample']} {mismatch['language']}: incremental results differ in "
+                  f"{', '.join(mismatch['fields'])}", file=sys.stderr)
+        if report['parity']:
+            status = 1
+    if report['uncovered']:
+        print(f"No benchmark case for: {', '.join(report['uncovered'])}", file=sys.stderr)
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(baseline, report, args.threshold)
+        for regression in report['regressions']:
+            print(f"REGRESSION {regression['key']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+        if report['regressions']:
+            status = 1
+        else:
+            print(f'No regressions beyond {args.threshold:.0%} against {args.baseline}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
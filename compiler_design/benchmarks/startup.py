@@ -0,0 +1,87 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from corpus import generate
+
+# ---------------- Startup Benchmarks ----------------
+# Cold start as an autoscaled container or a fresh batch worker sees it:
+# every measurement runs in a new interpreter. Recorded per entry module
+# are the wall time of the whole process, the time its import takes and,
+# for the pipeline, the time to the first analysis of a small file in every
+# language. Heavy optional packages the import pulled in are listed too.
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+ENTRY_MODULES = ('pipeline', 'incremental', 'streaming', 'cli', 'server', 'main')
+HEAVY_MODULES = ('streamlit', 'numpy', 'astor', 'pstats')
+
+PROBE = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+first = None
+if {analyze}:
+    from pipeline import run_pipeline
+    first = {{}}
+    for language, code in {samples}:
+        start = time.perf_counter()
+        run_pipeline(code, language)
+        first[language] = time.perf_counter() - start
+print(json.dumps({{
+    'import_seconds': imported - started, 'first_analysis': first,
+    'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    'heavy': [m for m in {heavy} if m in sys.modules],
+}}))
+'''
+
+def probe(module, analyze=False, sample_lines=100):
+    samples = [(language, generate(language, sample_lines)) for language in ('Python', 'C++', 'Java')]
+    script = PROBE.format(module=module, analyze=analyze, samples=repr(samples), heavy=repr(HEAVY_MODULES))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=APP_DIR, env=env)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f'Exited with status {proc.returncode}')
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = wall
+    return result
+
+def measure_startup(repeats=5, log=None):
+    # Fastest of `repeats` fresh processes per measurement, in the same
+    # record format as run.py so the regression check covers them
+    records = []
+    for module in ENTRY_MODULES:
+        if module == 'main' and importlib.util.find_spec('streamlit') is None:
+            continue
+        analyze = module == 'pipeline'
+        runs = []
+        error = None
+        for _ in range(repeats):
+            try:
+                runs.append(probe(module, analyze))
+            except RuntimeError as e:
+                error = str(e)
+                break
+        metrics = [('import', 'import_seconds'), ('process', 'process_seconds')]
+        if analyze:
+            metrics += [('first_analysis', language) for language in ('Python', 'C++', 'Java')]
+        for name, field in metrics:
+            language = field if name == 'first_analysis' else '-'
+            record = {'key': f'startup.{name}|{language}|{module}', 'function': f'startup.{name}',
+                      'language': language, 'sample': module, 'lines': None, 'bytes': None}
+            if error is not None:
+                record['error'] = error[:200]
+            else:
+                values = [run['first_analysis'][field] if name == 'first_analysis' else run[field] for run in runs]
+                record.update({'seconds': min(values), 'calls': len(runs),
+                               'peak_bytes': min(run['peak_rss'] for run in runs),
+                               'lines_per_second': None, 'heavy_modules': runs[0]['heavy']})
+            records.append(record)
+            if log:
+                log(record)
+    return records